@@ -0,0 +1,95 @@
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+pytest.importorskip("requests")
+from utils.SEC_fetch import EdgarFetcher, RequestsTransport, ResponseCache  # noqa: E402
+
+
+class NoLimit(object):
+    def acquire(self):
+        pass
+
+
+class StubEdgar(BaseHTTPRequestHandler):
+    """
+        throttles the first request of every path ending with /throttled, 404s paths with "missing", serves everything
+        else with an ETag
+    """
+    requests = list()
+
+    def do_GET(self):
+        StubEdgar.requests.append((self.path, dict(self.headers)))
+        if "missing" in self.path:
+            body = b"<html>Not Found</html>"
+            self.send_response(404)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path.endswith("/throttled") and sum(path == self.path for path, _ in StubEdgar.requests) == 1:
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = f"body of {self.path}".encode()
+        self.send_response(200)
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    StubEdgar.requests = list()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubEdgar)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_retries_throttled_requests_with_user_agent(stub_url):
+    fetcher = EdgarFetcher(transport=RequestsTransport(timeout=5), limiter=NoLimit(), backoff=0, user_agent="tester")
+    response = fetcher.get(f"{stub_url}/throttled", params={'q': 'a b'})
+    assert response.status_code == 200
+    assert response.content == b"body of /throttled?q=a+b"
+    assert [path for path, _ in StubEdgar.requests] == ["/throttled?q=a+b"] * 2
+    assert all(headers['User-Agent'] == "tester" for _, headers in StubEdgar.requests)
+
+
+def test_cache_revalidates_and_serves_archive_without_request(stub_url, tmp_path):
+    fetcher = EdgarFetcher(transport=RequestsTransport(timeout=5), limiter=NoLimit(), backoff=0,
+                           cache=ResponseCache(str(tmp_path)))
+    assert fetcher.get(f"{stub_url}/cgi-bin/browse").content == b"body of /cgi-bin/browse"
+    cached = fetcher.get(f"{stub_url}/cgi-bin/browse")
+    assert cached.from_cache and cached.content == b"body of /cgi-bin/browse"
+    assert StubEdgar.requests[-1][1]['If-None-Match'] == '"v1"'
+    url = f"{stub_url}/Archives/edgar/data/1/0001.txt"
+    with fetcher.open(url, pin=True) as f:
+        path = f.name
+        assert f.read() == b"body of /Archives/edgar/data/1/0001.txt"
+    num_requests = len(StubEdgar.requests)
+    assert fetcher.get(url).content == b"body of /Archives/edgar/data/1/0001.txt"
+    assert len(StubEdgar.requests) == num_requests
+    fetcher.cache.unpin(path)
+    assert fetcher.cache.pinned == dict()
+
+
+def test_open_raises_on_error_page(stub_url, tmp_path):
+    requests = pytest.importorskip("requests")
+    fetcher = EdgarFetcher(transport=RequestsTransport(timeout=5), limiter=NoLimit(), backoff=0,
+                           cache=ResponseCache(str(tmp_path)))
+    with pytest.raises(requests.HTTPError):
+        fetcher.open(f"{stub_url}/Archives/edgar/data/1/missing.txt")
+    # error page isn't cached as the body
+    assert fetcher.cache.lookup(f"{stub_url}/Archives/edgar/data/1/missing.txt") is None
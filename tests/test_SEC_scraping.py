@@ -0,0 +1,263 @@
+import io
+import os
+import json
+import pytest
+
+for module in ("requests", "bs4", "lxml", "pandas"):
+    pytest.importorskip(module)
+from utils import SEC_scraping  # noqa: E402
+
+CIK = 1177609
+FILING_TYPE = "8-K"
+
+ENTRY = """<entry><category label="form type" scheme="https://www.sec.gov/" term="8-K"/>
+<content type="text/xml"><accession-number>{accession_num}</accession-number><act>34</act>
+<file-number>001-00001</file-number><file-number-href>https://www.sec.gov/cgi-bin/browse-edgar?filenum=001-00001
+</file-number-href><filing-date>{filing_date}</filing-date><filing-href>{filing_href}</filing-href>
+<filing-type>8-K</filing-type><form-name>Current report</form-name><size>10 KB</size></content>
+<id>urn:tag:sec.gov,2008:accession-number={accession_num}</id>
+<link href="{filing_href}" rel="alternate" type="text/html"/><summary type="html">8-K</summary>
+<title>8-K - Current report</title><updated>{filing_date}T16:00:00-04:00</updated></entry>
+"""
+
+SUBMISSION = """<SEC-DOCUMENT>{accession_num}.txt : {date}
+<SEC-HEADER>{accession_num}.hdr.sgml : {date}
+ACCESSION NUMBER:		{accession_num}
+ITEM INFORMATION:		Regulation FD Disclosure
+FILED AS OF DATE:		{date}
+</SEC-HEADER>
+<DOCUMENT>
+<TYPE>8-K
+<SEQUENCE>1
+<FILENAME>form8k.htm
+<DESCRIPTION>FORM 8-K
+<TEXT>
+<html><body><p>Filing {accession_num} on climate change risk.</p><hr width="100%"><p>Page two &amp; more.</p>
+</body></html>
+</TEXT>
+</DOCUMENT>
+<DOCUMENT>
+<TYPE>GRAPHIC
+<SEQUENCE>2
+<FILENAME>logo.jpg
+<TEXT>
+begin 644 logo.jpg
+M_]C_X  02D9)1@ ! 0$ 8 !@  #_VP!#  @&!@<&!0@'!P<)"0@*#!0-#0L+
+end
+</TEXT>
+</DOCUMENT>
+<DOCUMENT>
+<TYPE>EX-99.1
+<SEQUENCE>3
+<FILENAME>ex991.htm
+<DESCRIPTION>PRESS RELEASE
+<TEXT>
+<html><body><div>Press release on <b>sustainability</b>.</div></body></html>
+</TEXT>
+</DOCUMENT>
+<DOCUMENT>
+<TYPE>EX-99.2
+<SEQUENCE>4
+<FILENAME>slides.pdf
+<TEXT>
+<PDF>
+begin 644 slides.pdf
+M)5!$1BTQ+C0*)>+CS],*
+end
+</PDF>
+</TEXT>
+</DOCUMENT>
+</SEC-DOCUMENT>
+"""
+
+
+def submission(accession_num: str, filing_date: str = "2020-01-02") -> bytes:
+    return SUBMISSION.format(accession_num=accession_num, date=filing_date.replace("-", "")).encode()
+
+
+def filing_href(accession_num: str) -> str:
+    return f"https://www.sec.gov/Archives/edgar/data/{CIK}/{accession_num.replace('-', '')}/{accession_num}-index.htm"
+
+
+class StubResponse(object):
+    def __init__(self, url, content, status_code=200):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.headers = dict()
+
+
+class StubFetcher(object):
+    """
+        stands in for SEC_fetch.EdgarFetcher: a single page of search results listing filings (newest first), and
+        their submissions; opening a submission of fail raises as EdgarFetcher.open does on a 404
+    """
+
+    def __init__(self, filings: list, fail=()):
+        self.filings = filings
+        self.fail = set(fail)
+        self.opened = list()
+
+    def get(self, url, params=None, headers=None):
+        entries = "".join(ENTRY.format(accession_num=accession_num, filing_date=filing_date,
+                                       filing_href=filing_href(accession_num))
+                          for accession_num, filing_date in self.filings)
+        return StubResponse(url, f"<feed>{entries}</feed>".encode())
+
+    def open(self, url, pin=False):
+        accession_num = os.path.basename(url)[:-len(".txt")]
+        if accession_num in self.fail:
+            raise SEC_scraping.SEC_fetch.requests.HTTPError(f"404 on {url}")
+        self.opened.append(accession_num)
+        return io.BytesIO(submission(accession_num, dict(self.filings)[accession_num]))
+
+
+FILINGS = [("0001-20-000003", "2020-03-01"), ("0001-20-000002", "2020-02-01"), ("0001-20-000001", "2020-01-01")]
+
+
+def test_sync_cik_resumes_from_journal_and_merges(tmp_path):
+    OUTPUT_FILE_PATH = f"{tmp_path}/"
+    output_path = f"{OUTPUT_FILE_PATH}{FILING_TYPE}_{CIK}_20200401.json"
+    journal_path = f"{OUTPUT_FILE_PATH}{FILING_TYPE}_{CIK}.journal.jsonl"
+    manifest_path = f"{OUTPUT_FILE_PATH}{FILING_TYPE}_{CIK}.manifest.json"
+    # filings are fetched oldest first, the second one fails: the first one is checkpointed, nothing is merged
+    fetcher = StubFetcher(FILINGS, fail={"0001-20-000002"})
+    with pytest.raises(SEC_scraping.SEC_fetch.requests.HTTPError):
+        SEC_scraping.sync_cik(CIK, "20200401", FILING_TYPE, OUTPUT_FILE_PATH, fetcher, parser="lxml")
+    assert fetcher.opened == ["0001-20-000001"]
+    assert list(SEC_scraping.read_journal(journal_path)) == ["0001-20-000001"]
+    assert not os.path.exists(output_path)
+
+    # rerun resumes from the failed filing
+    fetcher = StubFetcher(FILINGS)
+    assert SEC_scraping.sync_cik(CIK, "20200401", FILING_TYPE, OUTPUT_FILE_PATH, fetcher, parser="lxml") == 2
+    assert fetcher.opened == ["0001-20-000002", "0001-20-000003"]
+    assert not os.path.exists(journal_path)
+    with open(output_path) as f:
+        filings = json.load(f)
+    assert list(filings) == [accession_num for accession_num, _ in FILINGS]
+    assert "0001-20-000001" in str(filings["0001-20-000001"]['master_dict_filing']['filing_documents'])
+
+    # a later sync only fetches the new filing, and replaces the file of the previous one
+    fetcher = StubFetcher([("0001-20-000004", "2020-04-01")] + FILINGS)
+    assert SEC_scraping.sync_cik(CIK, "20200501", FILING_TYPE, OUTPUT_FILE_PATH, fetcher, parser="lxml") == 1
+    assert fetcher.opened == ["0001-20-000004"]
+    assert not os.path.exists(output_path)
+    with open(f"{OUTPUT_FILE_PATH}{FILING_TYPE}_{CIK}_20200501.json") as f:
+        assert list(json.load(f)) == ["0001-20-000004"] + [accession_num for accession_num, _ in FILINGS]
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    assert manifest['last_sync'] == "20200501" and len(manifest['accessions']) == 4
+
+
+def test_split_submission_skips_binary_documents():
+    parts = list(SEC_scraping.split_submission(io.BytesIO(submission("0001-20-000001")), FILING_TYPE))
+    assert [part for part, _ in parts] == ['sec-header', 'document', 'document']
+    assert b"ITEM INFORMATION" in parts[0][1]
+    assert b"form8k.htm" in parts[1][1] and b"ex991.htm" in parts[2][1]
+    assert not any(b"begin 644" in raw for _, raw in parts)
+
+
+@pytest.mark.parametrize("parser", ["lxml", "html5"])
+def test_parse_submission_same_as_parse_documents(parser):
+    if parser == "html5":
+        pytest.importorskip("html5lib")
+    raw = submission("0001-20-000001")
+    streamed, whole = dict(), dict()
+    SEC_scraping.parse_submission(io.BytesIO(raw), streamed, FILING_TYPE, parser)
+    SEC_scraping.parse_documents(SEC_scraping.BeautifulSoup(raw, 'lxml'), whole, FILING_TYPE, parser)
+    assert json.dumps(streamed) == json.dumps(whole)
+    assert list(streamed['filing_documents']) == ["8-K_1", "EX-99.1_3"]
+    assert streamed['filing_documents']["8-K_1"]['pages_length'] == 2
+
+
+class StubCache(object):
+    """
+        pin counts of SEC_fetch.ResponseCache
+    """
+
+    def __init__(self):
+        self.pinned = dict()
+
+    def unpin(self, path):
+        digest = os.path.basename(path)
+        self.pinned[digest] -= 1
+        if self.pinned[digest] == 0:
+            del self.pinned[digest]
+
+
+class CachingStubFetcher(StubFetcher):
+    """
+        hands submissions over as pinned files on disk, as EdgarFetcher does with a cache
+    """
+
+    def __init__(self, filings: list, cache_dir: str):
+        super(CachingStubFetcher, self).__init__(filings)
+        self.cache = StubCache()
+        self.cache_dir = cache_dir
+
+    def open(self, url, pin=False):
+        path = os.path.join(self.cache_dir, os.path.basename(url))
+        with open(path, 'wb') as f:
+            f.write(super(CachingStubFetcher, self).open(url).read())
+        if pin:
+            self.cache.pinned[os.path.basename(path)] = self.cache.pinned.get(os.path.basename(path), 0) + 1
+        return open(path, 'rb')
+
+
+@pytest.fixture
+def pipeline_dirs(tmp_path, monkeypatch):
+    # failed CIKs are appended to data/Error_CIK.csv of the working directory
+    monkeypatch.chdir(tmp_path)
+    for directory in ("data", "logs/download_filings", "serial", "pipeline", "cache"):
+        os.makedirs(tmp_path / directory)
+    return tmp_path
+
+
+def test_pipeline_same_output_as_download_filings(pipeline_dirs):
+    SEC_scraping.download_filings("20200401", FILING_TYPE, [CIK], f"{pipeline_dirs}/serial/", f"{pipeline_dirs}/logs",
+                                  fetcher=StubFetcher(FILINGS), parser="lxml")
+    fetcher = CachingStubFetcher(FILINGS, f"{pipeline_dirs}/cache")
+    SEC_scraping.download_filings_pipeline("20200401", FILING_TYPE, [CIK], f"{pipeline_dirs}/pipeline/",
+                                           f"{pipeline_dirs}/logs", fetch_workers=2, parse_workers=2,
+                                           fetcher=fetcher, parser="lxml")
+    file_name = f"{FILING_TYPE}_{CIK}_20200401.json"
+    with open(pipeline_dirs / "serial" / file_name) as f, open(pipeline_dirs / "pipeline" / file_name) as g:
+        assert json.load(f) == json.load(g)
+    # every submission was unpinned once parsed
+    assert fetcher.cache.pinned == dict()
+
+
+def test_pipeline_unpins_submission_never_queued(pipeline_dirs, monkeypatch):
+    class FailingStats(SEC_scraping.PipelineStats):
+        def add(self, key, n=1):
+            if key == 'fetched':
+                raise RuntimeError("fetch stage failed")
+            super(FailingStats, self).add(key, n)
+
+    monkeypatch.setattr(SEC_scraping, 'PipelineStats', FailingStats)
+    fetcher = CachingStubFetcher(FILINGS, f"{pipeline_dirs}/cache")
+    SEC_scraping.download_filings_pipeline("20200401", FILING_TYPE, [CIK], f"{pipeline_dirs}/pipeline/",
+                                           f"{pipeline_dirs}/logs", parse_workers=1, fetcher=fetcher, parser="lxml")
+    assert fetcher.cache.pinned == dict()
+    assert not os.listdir(pipeline_dirs / "pipeline")
+    with open(pipeline_dirs / "data" / "Error_CIK.csv") as f:
+        assert f.read().split() == [str(CIK)]
+
+
+def test_iter_filings_filters_dates_and_documents(tmp_path):
+    with open(tmp_path / f"{FILING_TYPE}_{CIK}_20200101.json", 'w') as f:
+        json.dump({'0001-19-000002': {'file_info': {'filing_date': '2019-12-04'}, 'master_dict_filing': {
+                       'filing_documents': {'8-K_1': {'normalized_text': {'1': "cover", '2': "climate change"}},
+                                            'EX-99.1_2': {'normalized_text': {'1': "press release"}},
+                                            'GRAPHIC_3': {'document_filename': "logo.jpg"}}}},
+                   '0001-18-000001': {'file_info': {'filing_date': '2018-05-01'}, 'master_dict_filing': {
+                       'filing_documents': {'8-K_1': {'normalized_text': {'1': "old filing"}}}}}}, f)
+    filings = SEC_scraping.iter_filings([CIK], "20200101", f"{tmp_path}/", FILING_TYPE)
+    # nothing is read until iterated
+    assert not isinstance(filings, (list, dict))
+    assert [(accession_num, text) for _, accession_num, _, text in filings] == [
+        ('0001-19-000002', "cover climate change press release"), ('0001-18-000001', "old filing")]
+    filings = list(SEC_scraping.iter_filings([CIK], "20200101", f"{tmp_path}/", FILING_TYPE, date_from='2019-01-01',
+                                             document_types=['8-K']))
+    assert filings == [(CIK, '0001-19-000002', SEC_scraping.pd.Timestamp('2019-12-04'), "cover climate change")]
@@ -0,0 +1,114 @@
+import json
+import pytest
+
+for module in ("requests", "bs4", "lxml", "pyarrow", "numpy", "scipy", "nltk"):
+    pytest.importorskip(module)
+pd = pytest.importorskip("pandas")
+from utils.backtest_signal import My_Backtest  # noqa: E402
+from utils.filing_catalog import FilingCatalog  # noqa: E402
+from utils.signal_cache import SignalCache  # noqa: E402
+
+TEXTS = ["We assess climate change risks.", "The change of control agreement was amended.",
+         "Our sustainability report covers climate and carbon neutral plans.", "Results of operations."]
+# a CIK with many filings, to be split into ranges of filings with a catalog, and a few small ones
+CIK_TEXTS = {1177609: TEXTS * 6, 320193: TEXTS[:2], 789019: TEXTS[2:], 1018724: []}
+BASKETS = {'A': ['climate change', 'sustainability'], 'B': ['change'], 'C': ['carbon neutral', 'plan']}
+KEY_WORDS = ['climate change', 'carbon neutral', 'change']
+
+
+def filing(filing_date, text):
+    return {'file_info': {'filing_date': filing_date, 'filing_type': '8-K'},
+            'master_dict_filing': {'filing_documents': {'8-K_1': {'pages_length': 1,
+                                                                  'normalized_text': {'1': text}}}}}
+
+
+@pytest.fixture
+def file_paths(tmp_path):
+    res = dict()
+    for CIK, texts in CIK_TEXTS.items():
+        filings = {f"{CIK:010d}-19-{i:06d}": filing(f"2019-{i % 12 + 1:02d}-{i // 12 + 1:02d}", text)
+                   for i, text in enumerate(texts)}
+        res[CIK] = str(tmp_path / f"8-K_{CIK}_20200101.json")
+        with open(res[CIK], 'w') as f:
+            json.dump(filings, f)
+    return res
+
+
+@pytest.fixture
+def catalog_path(tmp_path, file_paths):
+    catalog = FilingCatalog(str(tmp_path / "catalog.sqlite"))
+    catalog.backfill(f"{tmp_path}/", "8-K", "20200101")
+    catalog.close()
+    return str(tmp_path / "catalog.sqlite")
+
+
+def sorted_result(result, model_name_plus):
+    if model_name_plus:
+        return {basket: sorted_result(result[basket], False) for basket in result}
+    return {CIK: sorted(dates) for CIK, dates in result.items()}
+
+
+def CIK_filing_documents(file_paths):
+    for CIK, file_path in file_paths.items():
+        with open(file_path) as f:
+            for accession_num, filing_dict in json.load(f).items():
+                yield CIK, {'filing_date': pd.to_datetime(filing_dict['file_info']['filing_date']),
+                            'filing_text': filing_dict['master_dict_filing']['filing_documents']['8-K_1'][
+                                'normalized_text']['1'], 'accession_num': accession_num}
+
+
+def run_backtest(model_param, model_name_plus, file_paths):
+    my_backtest = My_Backtest(model_name_plus=model_name_plus)
+    my_backtest.set_mwe(model_param)
+    model_name = 'contains_key_words_plus' if model_name_plus else 'contains_key_words'
+    return sorted_result(my_backtest.run_backtest(model_name, model_param, CIK_filing_documents(file_paths)),
+                         model_name_plus)
+
+
+@pytest.mark.parametrize("model_param, model_name_plus", [(KEY_WORDS, False), (BASKETS, True)])
+@pytest.mark.parametrize("with_catalog", [False, True])
+def test_chunked_same_as_run_backtest(file_paths, catalog_path, model_param, model_name_plus, with_catalog):
+    model_name = 'contains_key_words_plus' if model_name_plus else 'contains_key_words'
+    res = My_Backtest(model_name_plus=model_name_plus).run_backtest_chunked(
+        model_name, model_param, list(file_paths.values()), chunk_size=2,
+        catalog_path=catalog_path if with_catalog else None)
+    assert sorted_result(res, model_name_plus) == run_backtest(model_param, model_name_plus, file_paths)
+
+
+@pytest.mark.parametrize("model_param, model_name_plus", [(KEY_WORDS, False), (BASKETS, True)])
+def test_sectors_same_as_run_backtest_per_sector(file_paths, catalog_path, model_param, model_name_plus):
+    model_name = 'contains_key_words_plus' if model_name_plus else 'contains_key_words'
+    sectors = {'Finance': [1177609, 1018724], 'Information': [320193, 789019], 'Utilities': []}
+    res = My_Backtest(model_name_plus=model_name_plus).run_backtest_sectors(
+        model_name, model_param, {sector: [file_paths[CIK] for CIK in CIKs] for sector, CIKs in sectors.items()},
+        chunk_size=2, catalog_path=catalog_path)
+    assert list(res) == list(sectors)
+    for sector, CIKs in sectors.items():
+        expected = run_backtest(model_param, model_name_plus, {CIK: file_paths[CIK] for CIK in CIKs})
+        assert sorted_result(res[sector], model_name_plus) == expected
+
+
+@pytest.mark.parametrize("model_param, model_name_plus", [(KEY_WORDS, False), (BASKETS, True)])
+def test_cached_same_as_run_backtest(tmp_path, file_paths, model_param, model_name_plus):
+    model_name = 'contains_key_words_plus' if model_name_plus else 'contains_key_words'
+    my_backtest = My_Backtest(model_name_plus=model_name_plus)
+    my_backtest.set_mwe(model_param)
+    cache = SignalCache(str(tmp_path / "signal_cache.sqlite"), my_backtest.tokenizer.version)
+    expected = run_backtest(model_param, model_name_plus, file_paths)
+    for _ in range(2):
+        # second run reads every result from cache
+        res = my_backtest.run_backtest_cached(model_name, model_param, CIK_filing_documents(file_paths), cache)
+        assert sorted_result(res, model_name_plus) == expected
+    res = my_backtest.run_backtest_cached(model_name, model_param, CIK_filing_documents(file_paths), cache,
+                                          quantifier='ALL')
+    baskets = model_param if model_name_plus else {model_name: model_param}
+    # multi-word key words of every basket are joined, as contains_key_words_plus does
+    reference = My_Backtest()
+    reference.set_mwe([key_word for key_words in baskets.values() for key_word in key_words])
+    expected = dict()
+    for basket, key_words in baskets.items():
+        for CIK, document in CIK_filing_documents(file_paths):
+            if reference.contains_key_words(key_words, document['filing_text'], 'ALL'):
+                expected.setdefault(basket, dict()).setdefault(CIK, list()).append(document['filing_date'])
+    expected = sorted_result(expected, True)
+    assert sorted_result(res, model_name_plus) == (expected if model_name_plus else expected.get(model_name, {}))
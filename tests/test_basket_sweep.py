@@ -0,0 +1,44 @@
+import json
+import pytest
+
+for module in ("requests", "bs4", "lxml", "pyarrow", "numpy", "scipy", "nltk"):
+    pytest.importorskip(module)
+pd = pytest.importorskip("pandas")
+from utils import basket_sweep  # noqa: E402
+from utils.backtest_signal import My_Backtest  # noqa: E402
+
+FILINGS = [
+    (1177609, '0001-19-000001', '2019-05-01', "We assess climate change risks."),
+    (1177609, '0001-19-000002', '2019-08-01', "The change of control agreement was amended."),
+    (320193, '0002-19-000001', '2019-07-30', "Our sustainability report covers climate and carbon neutral plans."),
+]
+
+
+def test_load_baskets(tmp_path):
+    with open(tmp_path / "baskets.json", 'w') as f:
+        json.dump({1: ['climate change'], 'B': ['carbon neutral', 'plan']}, f)
+    with open(tmp_path / "baskets.csv", 'w') as f:
+        f.write("basket_id,key_word\n1,climate change\nB,carbon neutral\nB,plan\n")
+    assert basket_sweep.load_baskets(str(tmp_path / "baskets.json")) == \
+        basket_sweep.load_baskets(str(tmp_path / "baskets.csv")) == \
+        {'1': ['climate change'], 'B': ['carbon neutral', 'plan']}
+
+
+def test_key_word_combinations():
+    assert basket_sweep.key_word_combinations(['a', 'b', 'c']) == {
+        'a': ['a'], 'b': ['b'], 'c': ['c'], 'a+b': ['a', 'b'], 'a+c': ['a', 'c'], 'b+c': ['b', 'c']}
+
+
+@pytest.mark.parametrize("quantifier", ['ANY', 'ALL'])
+def test_sweep_same_as_contains_key_words(tmp_path, quantifier):
+    baskets = basket_sweep.key_word_combinations(['climate change', 'change', 'climate', 'carbon neutral', 'plan'])
+    basket_counts = basket_sweep.sweep_baskets(baskets, FILINGS, str(tmp_path), quantifier, processes=1)
+    my_backtest = My_Backtest()
+    my_backtest.set_mwe([key_word for key_words in baskets.values() for key_word in key_words])
+    expected = sorted((basket_id, CIK, filing_date) for basket_id, key_words in baskets.items()
+                      for CIK, _, filing_date, text in FILINGS
+                      if my_backtest.contains_key_words(key_words, text, quantifier))
+    signal = pd.read_csv(tmp_path / "signal.csv", dtype={'basket_id': str})
+    assert sorted(zip(signal['basket_id'], signal['CIK'], signal['date'])) == expected
+    assert dict(zip(basket_counts['basket_id'], basket_counts['num_events'])) == \
+        {basket_id: sum(event[0] == basket_id for event in expected) for basket_id in baskets}
@@ -0,0 +1,44 @@
+import pytest
+
+for module in ("requests", "bs4", "lxml", "pyarrow", "pandas", "numpy", "scipy", "nltk"):
+    pytest.importorskip(module)
+from utils.document_term import DocumentTermMatrix  # noqa: E402
+from utils.backtest_signal import My_Backtest  # noqa: E402
+
+FILINGS = [
+    (1177609, '0001-19-000001', '2019-05-01', "We assess climate change risks. Climate change is a risk."),
+    (1177609, '0001-19-000002', '2019-08-01', "The change of control agreement was amended."),
+    (320193, '0002-19-000001', '2019-07-30', "Our sustainability report covers climate and carbon neutral plans."),
+    (320193, '0002-19-000002', '2019-10-30', ""),
+]
+BASKETS = {'A': ['climate change', 'sustainability'], 'B': ['change', 'climate'], 'C': ['carbon neutral', 'plan']}
+
+
+@pytest.fixture(scope="module")
+def dtm():
+    return DocumentTermMatrix(FILINGS, mwes=[key_word for key_words in BASKETS.values() for key_word in key_words
+                                             if " " in key_word], processes=1)
+
+
+def test_counts_of_merged_stream(dtm):
+    counts = dict(zip(dtm.vocab, dtm.matrix[0].toarray().ravel()))
+    assert counts['climate change'] == 2
+    # 'change' and 'climate' only occur inside 'climate change'
+    assert counts.get('change', 0) == 0
+    assert counts.get('climate', 0) == 0
+
+
+@pytest.mark.parametrize("quantifier", ['ANY', 'ALL'])
+def test_same_as_contains_key_words(dtm, quantifier):
+    my_backtest = My_Backtest()
+    my_backtest.set_mwe([key_word for key_words in BASKETS.values() for key_word in key_words])
+    for basket, key_words in BASKETS.items():
+        expected = {(CIK, accession_num) for CIK, accession_num, _, text in FILINGS
+                    if my_backtest.contains_key_words(key_words, text, quantifier)}
+        matched = dtm.filings.iloc[dtm.matching_rows(key_words, quantifier)]
+        assert set(zip(matched['cik'], matched['accession'])) == expected, basket
+
+
+def test_saved_matrix_evaluates_the_same(dtm, tmp_path):
+    dtm.save(str(tmp_path))
+    assert DocumentTermMatrix.load(str(tmp_path)).evaluate_baskets(BASKETS) == dtm.evaluate_baskets(BASKETS)
@@ -0,0 +1,42 @@
+import json
+from utils.filing_catalog import scan_filings, FilingCatalog
+
+
+def filing(filing_date, text):
+    return {'file_info': {'filing_date': filing_date, 'filing_type': '8-K'},
+            'master_dict_filing': {'sec_header_content': {
+                'sec_header_text': "ITEM INFORMATION: Regulation FD Disclosure FILED AS OF DATE: 20200102"}},
+            'text': text}
+
+
+FILINGS = {'0001-20-000001': filing('2020-01-02', "café – {\"quoted\": [1, 2]}"),
+           '0001-20-000002': filing('2020-03-04', "plain"),
+           '0001-20-000003': filing('2020-03-04', "")}
+
+
+def test_scan_filings_offsets_are_byte_ranges():
+    for kwargs in ({}, {'indent': 2}, {'ensure_ascii': False}):
+        raw = json.dumps(FILINGS, **kwargs).encode('utf-8')
+        scanned = list(scan_filings(raw))
+        assert [accession_num for accession_num, _, _, _ in scanned] == list(FILINGS)
+        for accession_num, filing_dict, offset, length in scanned:
+            assert json.loads(raw[offset:offset + length].decode('utf-8')) == FILINGS[accession_num]
+
+
+def test_scan_filings_empty():
+    assert list(scan_filings(b" { } ")) == []
+
+
+def test_catalog_reads_single_filings(tmp_path):
+    file_path = tmp_path / "8-K_1177609_20200101.json"
+    file_path.write_bytes(json.dumps(FILINGS, ensure_ascii=False).encode('utf-8'))
+    catalog = FilingCatalog(str(tmp_path / "catalog.sqlite"))
+    assert catalog.index_file(str(file_path)) == 3
+    assert catalog.count_filings(1177609) == 3
+    rows = catalog.lookup(1177609, '2020-03-04')
+    assert [row[0] for row in rows] == ['0001-20-000002', '0001-20-000003']
+    assert rows[0][3] == "Regulation FD Disclosure"
+    catalog.close()
+    catalog = FilingCatalog(str(tmp_path / "catalog.sqlite"), read_only=True)
+    assert dict(catalog.iter_filings_on(1177609, ['2020-01-02', '2020-03-04 00:00:00'])) == FILINGS
+    catalog.close()
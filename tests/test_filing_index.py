@@ -0,0 +1,71 @@
+import sqlite3
+import pytest
+
+pytest.importorskip("nltk")
+pytest.importorskip("pandas")
+from utils.filing_index import InvertedIndex, PositionalIndex, count_near  # noqa: E402
+
+FILINGS = [
+    (1177609, '0001-19-000001', '2019-05-01', "We assess climate change risks of our operations."),
+    (1177609, '0001-19-000002', '2019-08-01', "The change of control agreement was amended."),
+    (320193, '0002-19-000001', '2019-07-30', "Our sustainability report covers climate change and carbon emissions."),
+]
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / "index.sqlite")
+
+
+def test_evaluate_matches_merged_stream(index_path):
+    index = InvertedIndex(index_path, mwes=['climate change'])
+    assert index.add_filings(FILINGS, processes=1) == 3
+    assert index.add_filings(FILINGS, processes=1) == 0
+    # 'change' inside 'climate change' isn't posted on its own
+    signal = index.evaluate(['change'], mwes=['climate change'])
+    assert {CIK: [str(date.date()) for date in dates] for CIK, dates in signal.items()} == {1177609: ['2019-08-01']}
+    signal = index.evaluate(['climate change', 'sustainability'], quantifier='ALL')
+    assert list(signal) == [320193]
+    assert set(index.evaluate_baskets({'A': ['climate change'], 'B': ['carbon']})) == {'A', 'B'}
+
+
+def test_baskets_of_other_mwes_are_rejected(index_path):
+    index = InvertedIndex(index_path, mwes=['climate change'])
+    index.add_filings(FILINGS, processes=1)
+    with pytest.raises(ValueError):
+        index.evaluate(['carbon emission'])
+    with pytest.raises(ValueError):
+        index.evaluate_baskets({'A': ['climate change'], 'B': ['carbon emission']})
+    # phrases of a PositionalIndex are matched on the unmerged stream
+    positional_index = PositionalIndex(index_path)
+    positional_index.add_filings(FILINGS, processes=1)
+    assert list(positional_index.evaluate(['carbon emission'])) == [320193]
+
+
+def test_index_of_other_tokenizer_is_rejected(index_path):
+    InvertedIndex(index_path)
+    with sqlite3.connect(index_path) as db:
+        db.execute("UPDATE meta SET value = 'other' WHERE key = 'tokenizer_version'")
+    with pytest.raises(ValueError):
+        InvertedIndex(index_path)
+
+
+def test_count_near_excludes_occurrence_itself():
+    assert count_near([3], [3], 5) == 0
+    assert count_near([3, 7], [3, 7], 5) == 2
+    assert count_near([3, 20], [3, 20], 5) == 0
+    assert count_near([3], [8], 5) == count_near([8], [3], 5) == 1
+    assert count_near([3], [9], 5) == 0
+
+
+def test_positional_queries(index_path):
+    index = PositionalIndex(index_path)
+    index.add_filings(FILINGS, processes=1)
+    assert list(index.evaluate(['sustainability NEAR/5 carbon'])) == [320193]
+    assert index.evaluate(['climate NEAR/5 climate']) == {}
+    assert sorted(index.evaluate(['change'])) == [320193, 1177609]
+    assert set(index.evaluate(['climate change'], min_occurrences=1)) == {320193, 1177609}
+    assert index.evaluate(['climate change'], min_occurrences=2) == {}
+    # a term not in the index matches nothing
+    assert index.query_counts('unknown change') == {}
+    assert index.evaluate(['unknown', 'change'], quantifier='ALL') == {}
@@ -0,0 +1,66 @@
+import json
+import pytest
+
+pytest.importorskip("pyarrow")
+pd = pytest.importorskip("pandas")
+from utils import filing_store  # noqa: E402
+
+
+def filing(filing_date, documents):
+    return {'file_info': {'filing_date': filing_date},
+            'master_dict_filing': {'filing_documents': {
+                document: {'pages_length': len(pages), 'normalized_text': {str(i + 1): text for i, text in
+                                                                            enumerate(pages)}}
+                for document, pages in documents.items()}}}
+
+
+FILINGS = {
+    1177609: {'0001-19-000002': filing('2019-12-04', {'8-K_1': ["cover", "climate change"],
+                                                      'EX-99.1_2': ["press release"],
+                                                      'EX-10.1_10': ["agreement"]}),
+              '0001-18-000001': filing('2018-05-01', {'8-K_1': ["old filing"]})},
+    320193: {'0002-19-000001': filing('2019-07-30', {'8-K_1': ["results"]})},
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    for CIK, filings in FILINGS.items():
+        with open(tmp_path / f"8-K_{CIK}_20200101.json", 'w') as f:
+            json.dump(filings, f)
+    STORE_PATH = str(tmp_path / "store")
+    filing_store.convert_json_to_parquet(f"{tmp_path}/", "8-K", "20200101", STORE_PATH)
+    return STORE_PATH
+
+
+def test_conversion_is_rerunnable(store, tmp_path):
+    assert filing_store.stored_accessions(store) == {'0001-19-000002', '0001-18-000001', '0002-19-000001'}
+    num_pages = len(filing_store.read_filing_pages(store, columns=['accession']))
+    filing_store.convert_json_to_parquet(f"{tmp_path}/", "8-K", "20200101", store)
+    assert len(filing_store.read_filing_pages(store, columns=['accession'])) == num_pages == 6
+
+
+def test_read_filing_pages_filters_rows_and_columns(store):
+    df = filing_store.read_filing_pages(store, columns=['cik', 'text'], CIK_list=[1177609], date_from='2019-01-01')
+    assert list(df.columns) == ['cik', 'text']
+    assert set(df['cik']) == {1177609}
+    assert sorted(df['text']) == ["agreement", "climate change", "cover", "press release"]
+
+
+def test_iter_filing_pages_same_as_json(store, tmp_path):
+    res = list(filing_store.iter_filing_pages(store, [320193, 1177609], document_types=['8-K', 'EX-10']))
+    assert [(CIK, accession_num, filing_date) for CIK, accession_num, filing_date, _ in res] == [
+        (320193, '0002-19-000001', pd.Timestamp('2019-07-30')),
+        (1177609, '0001-18-000001', pd.Timestamp('2018-05-01')),
+        (1177609, '0001-19-000002', pd.Timestamp('2019-12-04'))]
+    # documents in order of sequence, EX-99 left out
+    assert res[2][3] == [('8-K_1', '1', "cover"), ('8-K_1', '2', "climate change"), ('EX-10.1_10', '1', "agreement")]
+    pytest.importorskip("bs4")
+    pytest.importorskip("requests")
+    from utils import SEC_scraping
+    from_json = sorted(SEC_scraping.iter_filings([320193, 1177609], "20200101", f"{tmp_path}/", "8-K",
+                                                 date_to='2019-08-01'), key=lambda filing_text: filing_text[1])
+    from_store = sorted(SEC_scraping.iter_filings([320193, 1177609], "20200101", f"{tmp_path}/", "8-K",
+                                                  date_to='2019-08-01', STORE_PATH=store),
+                        key=lambda filing_text: filing_text[1])
+    assert from_store == from_json
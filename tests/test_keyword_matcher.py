@@ -0,0 +1,84 @@
+import random
+import pytest
+from utils.keyword_matcher import KeywordMatcher
+
+BASKETS = {'climate': ['climate change', 'climate', 'carbon neutral'],
+           'change': ['change'],
+           'AI': ['artificial intelligence', 'big data', 'data']}
+
+
+def test_greedy_words_inside_expression_are_not_found():
+    matcher = KeywordMatcher(BASKETS)
+    assert matcher.find("risk of climate change".split()) == {'climate change'}
+    assert matcher.find("climate and change".split()) == {'climate', 'change'}
+    assert matcher.find("big data".split()) == {'big data'}
+
+
+def test_overlapping_finds_nested_key_words():
+    matcher = KeywordMatcher(BASKETS, overlapping=True)
+    assert matcher.find("risk of climate change".split()) == {'climate change', 'climate', 'change'}
+    assert matcher.find("big data".split()) == {'big data', 'data'}
+
+
+def test_match_quantifiers():
+    matcher = KeywordMatcher(BASKETS)
+    tokens = "our carbon neutral plan and big data".split()
+    assert sorted(matcher.match(tokens, 'ANY')) == ['AI', 'climate']
+    assert matcher.match(tokens, 'ALL') == []
+    assert matcher.match("climate change and climate and carbon neutral".split(), 'all') == ['climate']
+    with pytest.raises(ValueError):
+        matcher.match(tokens, 'MOST')
+
+
+def test_term_ids_matches_ids():
+    term_ids = {term: i for i, term in enumerate("big data on climate change carbon".split())}
+    matcher = KeywordMatcher(BASKETS, term_ids=term_ids)
+    ids = [term_ids[term] for term in "big data on climate change".split()]
+    assert matcher.find(ids) == {'big data', 'climate change'}
+    # 'neutral' isn't in term_ids, so 'carbon neutral' can't occur
+    assert matcher.find([term_ids['carbon']]) == set()
+
+
+def test_normalize_compares_baskets():
+    matcher = KeywordMatcher({'A': ('a', 'b')})
+    assert matcher.baskets == KeywordMatcher.normalize({'A': ['a', 'b']})
+
+
+def mwe_tokenize(mwes, tokens):
+    """
+        MWETokenizer.tokenize: at every token, join the longest expression starting there
+    """
+    res = list()
+    i = 0
+    while i < len(tokens):
+        end = None
+        for mwe in mwes:
+            if tuple(tokens[i:i + len(mwe)]) == mwe and (end is None or i + len(mwe) > end):
+                end = i + len(mwe)
+        res.append(" ".join(tokens[i:end]) if end is not None else tokens[i])
+        i = end if end is not None else i + 1
+    return res
+
+
+def random_cases(num_cases=300):
+    random.seed(0)
+    vocab = "a b c d e".split()
+    for _ in range(num_cases):
+        key_words = sorted(set(" ".join(random.choices(vocab, k=random.randint(1, 3))) for _ in range(5)))
+        tokens = random.choices(vocab, k=random.randint(0, 20))
+        yield key_words, tokens, [tuple(key_word.split(" ")) for key_word in key_words if " " in key_word]
+
+
+def test_greedy_same_as_mwe_tokenize():
+    for key_words, tokens, mwes in random_cases():
+        merged = set(mwe_tokenize(mwes, tokens))
+        assert KeywordMatcher({'B': key_words}).find(tokens) == {key_word for key_word in key_words
+                                                                 if key_word in merged}
+
+
+def test_greedy_same_as_nltk_mwe_tokenizer():
+    MWETokenizer = pytest.importorskip("nltk.tokenize").MWETokenizer
+    for key_words, tokens, mwes in random_cases():
+        merged = set(MWETokenizer(mwes, separator=" ").tokenize(tokens))
+        assert KeywordMatcher({'B': key_words}).find(tokens) == {key_word for key_word in key_words
+                                                                 if key_word in merged}
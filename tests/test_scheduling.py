@@ -0,0 +1,41 @@
+import random
+from utils import scheduling
+
+
+def test_split_range_covers_range_contiguously():
+    for n in range(0, 50):
+        for parts in range(1, 12):
+            ranges = scheduling.split_range(n, parts)
+            assert [i for start, stop in ranges for i in range(start, stop)] == list(range(n))
+            assert len(ranges) == min(n, parts)
+            sizes = [stop - start for start, stop in ranges]
+            if sizes:
+                assert max(sizes) - min(sizes) <= 1
+
+
+def test_num_parts_and_target_cost():
+    assert scheduling.num_parts(0, 10) == 1
+    assert scheduling.num_parts(10, 10) == 1
+    assert scheduling.num_parts(11, 10) == 2
+    assert scheduling.target_cost(800, 4) == 50
+    # never below 1, so a task is never split into empty parts
+    assert scheduling.target_cost(3, 8) == 1
+
+
+def test_lpt_chunks_keeps_every_task_once_largest_first():
+    random.seed(0)
+    tasks = [(f"task{i}", random.randint(1, 100)) for i in range(200)]
+    costs = dict(tasks)
+    chunks = scheduling.lpt_chunks(tasks, target=150, chunk_size=8)
+    assert sorted(task for chunk in chunks for task in chunk) == sorted(costs)
+    chunk_costs = [sum(costs[task] for task in chunk) for chunk in chunks]
+    assert chunk_costs == sorted(chunk_costs, reverse=True)
+    for chunk, cost in zip(chunks, chunk_costs):
+        assert len(chunk) <= 8
+        # only a single task may exceed target
+        assert cost <= 150 or len(chunk) == 1
+
+
+def test_lpt_chunks_task_over_target_is_alone():
+    chunks = scheduling.lpt_chunks([('small', 1), ('big', 500), ('other', 2)], target=10, chunk_size=4)
+    assert chunks == [['big'], ['other', 'small']]
@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("nltk")
+np = pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+from utils.tokenizer import Tokenizer  # noqa: E402
+from utils.token_store import TokenStore  # noqa: E402
+
+FILINGS = [
+    (1177609, '0001-19-000002', '2019-12-04', [('8-K_1', '1', "Climate change risks."),
+                                               ('EX-99.1_2', '1', "Farms reduce emissions.")]),
+    (1177609, '0001-18-000001', '2018-05-01', [('8-K_1', '1', "Climate risks.")]),
+    (320193, '0002-19-000001', '2019-07-30', [('8-K_1', '1', "")]),
+]
+
+
+def test_pages_are_stored_as_ids_of_their_tokens(tmp_path):
+    store = TokenStore(str(tmp_path))
+    assert store.add_filings(FILINGS, processes=1, commit_every=1) == 3
+    tokenizer = Tokenizer()
+    for CIK, accession_num, filing_date, pages in FILINGS:
+        stored = store.filing_pages(accession_num)
+        assert list(stored) == [(document, page) for document, page, _ in pages]
+        for document, page, text in pages:
+            assert [store.vocab[i] for i in stored[document, page]] == tokenizer.tokenize(text)
+    assert [store.vocab[i] for i in store.filing_ids('0001-19-000002')] == \
+        tokenizer.tokenize("Climate change risks.") + tokenizer.tokenize("Farms reduce emissions.")
+    assert store.filing_ids('unknown') is None
+    assert store.filings(1177609) == [('0001-18-000001', '2018-05-01'), ('0001-19-000002', '2019-12-04')]
+
+
+def test_store_is_reopened_and_extended(tmp_path):
+    TokenStore(str(tmp_path)).add_filings(FILINGS[:1], processes=1)
+    store = TokenStore(str(tmp_path))
+    assert store.add_filings(FILINGS, processes=1) == 2
+    assert len(store.tokens) == sum(len(Tokenizer().tokenize(text)) for *_, pages in FILINGS for _, _, text in pages)
+    assert [store.vocab[i] for i in store.filing_ids('0001-18-000001')] == ['climate', 'risk']
+
+
+class Dictionary(object):
+    # the part of a gensim Dictionary used by TokenStore
+    token2id = {'risk': 0, 'climate': 1}
+
+
+def test_doc2bow_skips_terms_not_in_dictionary(tmp_path):
+    store = TokenStore(str(tmp_path))
+    store.add_filings(FILINGS, processes=1)
+    dictionary_ids = store.dictionary_ids(Dictionary())
+    assert store.doc2bow(store.filing_ids('0001-19-000002'), dictionary_ids) == [(0, 1), (1, 1)]
@@ -0,0 +1,32 @@
+import pickle
+import pytest
+
+pytest.importorskip("nltk")
+from utils.tokenizer import Tokenizer, tokenize_baseline  # noqa: E402
+
+TEXT = "The Company's 2 new Solar Farms reduce emissions; climate-change risks were disclosed."
+
+
+def test_tokens_are_lowercase_alphabetic_lemmas_without_stop_words():
+    tokens = Tokenizer().tokenize(TEXT)
+    assert tokens == tokenize_baseline(TEXT)
+    assert 'the' not in tokens
+    assert 'farm' in tokens and 'emission' in tokens
+    assert all(token.isalpha() and token.islower() for token in tokens)
+
+
+def test_tokenize_many_same_as_tokenize():
+    tokenizer = Tokenizer()
+    texts = [TEXT, "", "Farms and farms."]
+    assert tokenizer.tokenize_many(texts) == [tokenizer.tokenize(text) for text in texts]
+
+
+def test_fast_splits_on_letters():
+    assert Tokenizer(fast=True).words("e-mail 2020 Risk") == ['e', 'mail', 'risk']
+
+
+def test_version_and_pickle():
+    assert Tokenizer().version == "1"
+    assert Tokenizer(normalize=True, fast=True).version == "1-nfkd-fast"
+    tokenizer = pickle.loads(pickle.dumps(Tokenizer(normalize=True)))
+    assert tokenizer.normalize and tokenizer.tokenize(TEXT) == Tokenizer(normalize=True).tokenize(TEXT)
@@ -0,0 +1,162 @@
+import os
+import pytest
+
+for module in ("nltk", "numpy", "pandas", "gensim"):
+    pytest.importorskip(module)
+from utils import topic_model  # noqa: E402
+
+WORDS = ["climate", "change", "risk", "carbon", "emission", "sustainability", "report", "water", "energy", "board",
+         "director", "agreement", "revenue", "quarter", "market"]
+# documents of more than 10 tokens are kept, terms in fewer than 15 documents are filtered out of the dictionary
+TEXTS = [" ".join(WORDS[(i + j) % len(WORDS)] for j in range(12 + i % 4)) for i in range(30)] + \
+    ["too short to keep", ""]
+
+
+def low_corpus_of(lda):
+    return sorted(" ".join(doc) for doc in lda.low_corpus)
+
+
+def bow_corpus_of(lda):
+    # by term, ids may differ between modes
+    return sorted(sorted((lda.dictionary[term_id], count) for term_id, count in bow) for bow in lda.bow_corpus)
+
+
+@pytest.fixture(scope="module")
+def in_memory():
+    lda = topic_model.my_LDA()
+    lda.text_to_low(TEXTS)
+    lda.low_to_bow()
+    return lda
+
+
+def test_low_corpus_drops_short_documents(in_memory):
+    assert len(in_memory.low_corpus) == 30
+    assert low_corpus_of(in_memory) == sorted(" ".join(topic_model.tokenizer.tokenize(text)) for text in TEXTS[:30])
+
+
+def test_streaming_same_as_in_memory(tmp_path, in_memory):
+    lda = topic_model.my_LDA(corpus_path=str(tmp_path), batch_size=7)
+    lda.text_to_low(iter(TEXTS))
+    assert isinstance(lda.low_corpus, topic_model.LowCorpus)
+    assert lda.low_corpus and len(lda.low_corpus) == len(topic_model.LowCorpus(lda.low_corpus.path)) == 30
+    assert low_corpus_of(lda) == low_corpus_of(in_memory)
+    lda.low_to_bow()
+    assert bow_corpus_of(lda) == bow_corpus_of(in_memory)
+
+
+def test_compact_same_as_in_memory(tmp_path, in_memory):
+    lda = topic_model.my_LDA(corpus_path=str(tmp_path), batch_size=7, compact=True)
+    lda.text_to_low(iter(TEXTS))
+    assert isinstance(lda.low_corpus, topic_model.IdCorpus)
+    assert low_corpus_of(lda) == low_corpus_of(in_memory)
+    dictionary = lda.low_corpus.dictionary()
+    assert dictionary.id2token == {term_id: term for term, term_id in dictionary.token2id.items()}
+    expected = topic_model.Dictionary(lda.low_corpus)
+    assert {dictionary[term_id]: df for term_id, df in dictionary.dfs.items()} == \
+        {expected[term_id]: df for term_id, df in expected.dfs.items()}
+    assert (dictionary.num_docs, dictionary.num_pos, dictionary.num_nnz) == \
+        (expected.num_docs, expected.num_pos, expected.num_nnz)
+    lda.low_to_bow()
+    assert isinstance(lda.bow_corpus, topic_model.corpora.MmCorpus)
+    assert bow_corpus_of(lda) == bow_corpus_of(in_memory)
+
+
+class CountingModel(object):
+    """
+    topic 0 and 1 weighted by counts of term 0 and 1 of a page, records the number of pages of every inference call
+    """
+    num_topics = 2
+
+    def __init__(self):
+        self.calls = list()
+
+    def inference(self, bows):
+        self.calls.append(len(bows))
+        gamma = [[1 + sum(count for term_id, count in bow if term_id == topic) for topic in range(2)] for bow in bows]
+        return topic_model.np.array(gamma, dtype=float), None
+
+
+def test_has_topic_page_infers_batches_until_a_topic_page():
+    even = [(0, 1), (1, 1)]
+    model = CountingModel()
+    assert topic_model.backtest_LDA_multicore.has_topic_page([even] * 40 + [[(0, 20)]] + [even] * 59, model)
+    assert model.calls == [32, 32]
+    model = CountingModel()
+    assert not topic_model.backtest_LDA_multicore.has_topic_page([even] * 100, model)
+    assert model.calls == [32, 32, 32, 4]
+    # 3 / 4 isn't more than the threshold
+    assert not topic_model.backtest_LDA_multicore.has_topic_page([[(0, 2)]], CountingModel(), threshold=0.75)
+    assert topic_model.backtest_LDA_multicore.has_topic_page([[(0, 3)]], CountingModel(), threshold=0.75)
+
+
+FRUITS = "apple banana cherry grape lemon mango melon peach pear plum".split()
+METALS = "copper iron nickel zinc silver gold cobalt platinum aluminum titanium".split()
+
+
+def page(words, num_tokens=60):
+    return " ".join(words[i % len(words)] for i in range(num_tokens))
+
+
+# {cik: {accession: (filing_date, [page text])}}; a filing is a signal if any page of 50 tokens or more is about a
+# single topic
+LDA_FILINGS = {
+    1177609: {'0001-19-000001': ('2019-01-02', [page(FRUITS + METALS), page(FRUITS)]),
+              '0001-19-000002': ('2019-02-01', [page(FRUITS + METALS)]),
+              '0001-19-000003': ('2019-03-01', [page(METALS)])},
+    320193: {'0002-19-000001': ('2019-01-02', [page(FRUITS, 20)]),
+             '0002-19-000002': ('2019-04-01', [page(METALS)])},
+}
+BUY_SIGNAL = {1177609: ['2019-01-02', '2019-02-01'], 320193: ['2019-01-02', '2019-04-01']}
+LDA_SIGNALS = {1177609: ['2019-01-02'], 320193: ['2019-04-01']}
+
+
+@pytest.fixture(scope="module")
+def lda_paths(tmp_path_factory):
+    path = tmp_path_factory.mktemp("lda")
+    documents = [topic_model.tokenizer.tokenize(page(words[i:] + words[:i], 30)) for words in (FRUITS, METALS)
+                 for i in range(10)]
+    dictionary = topic_model.Dictionary(documents)
+    lda_model = topic_model.models.LdaModel([dictionary.doc2bow(document) for document in documents], num_topics=2,
+                                            id2word=dictionary, alpha=0.001, passes=20, random_state=0)
+    (path / "model").mkdir()
+    lda_model.save(str(path / "model" / "topic_model.model"))
+    dictionary.save(str(path / "model" / "dictionary.dict"))
+    (path / "filings").mkdir()
+    for cik, filings in LDA_FILINGS.items():
+        with open(path / "filings" / f"8-K_{cik}_20200101.json", 'w') as f:
+            topic_model.json.dump({a_num: {'file_info': {'filing_date': date}, 'master_dict_filing': {
+                'filing_documents': {'8-K_1': {'normalized_text': {str(i + 1): text for i, text in enumerate(pages)}}}}}
+                for a_num, (date, pages) in filings.items()}, f)
+    (path / "backtest" / "sector").mkdir(parents=True)
+    return {'model': str(path / "model"), 'filings': str(path / "filings"), 'backtest': str(path / "backtest"),
+            'token_store': str(path / "token_store")}
+
+
+def test_backtest_LDA_with_model_path_and_token_store(lda_paths):
+    token_store = topic_model.TokenStore(lda_paths['token_store'], topic_model.tokenizer)
+    token_store.add_filings(((cik, a_num, date, [('8-K_1', str(i + 1), text) for i, text in enumerate(pages)])
+                             for cik, filings in LDA_FILINGS.items() for a_num, (date, pages) in filings.items()),
+                            processes=1)
+    for token_store_path in (None, lda_paths['token_store']):
+        backtest = topic_model.backtest_LDA_multicore(lda_paths['filings'], lda_paths['backtest'], "sector",
+                                                      token_store_path=token_store_path)
+        backtest.backtest_LDA(BUY_SIGNAL, model_path=lda_paths['model'])
+        assert {cik: sorted(dates) for cik, dates in backtest.LDA_signal_dict.items() if dates} == LDA_SIGNALS
+    # map of token store ids is saved next to the model, not into the token store
+    assert os.path.exists(f"{lda_paths['model']}/dictionary_ids.npy")
+    assert not os.path.exists(f"{token_store.path}/dictionary_ids.npy")
+
+
+def test_topic_cache_same_as_backtest_LDA(lda_paths, tmp_path):
+    backtest = topic_model.backtest_LDA_multicore(lda_paths['filings'], lda_paths['backtest'], "sector")
+    cache = topic_model.TopicCache(str(tmp_path), lda_paths['model'])
+    # a cik without a json file fails, filings of the others are still cached
+    backtest.build_topic_cache(dict(BUY_SIGNAL, **{789019: ['2019-01-02']}), lda_paths['model'], cache)
+    cache = topic_model.TopicCache(str(tmp_path), lda_paths['model'])
+    assert cache.scored_dates() == {(cik, date) for cik in LDA_FILINGS for date, _ in LDA_FILINGS[cik].values()
+                                    if date in BUY_SIGNAL[cik]}
+    assert {cik: sorted(dates) for cik, dates in cache.signals(BUY_SIGNAL).items()} == LDA_SIGNALS
+    # only one of the two pages of 0001-19-000001 is about a single topic
+    assert {cik: sorted(dates) for cik, dates in cache.signals(BUY_SIGNAL, rule='majority').items()} == \
+        {320193: ['2019-04-01']}
+    assert cache.signals({1177609: ['2019-01-02']}) == {1177609: ['2019-01-02']}
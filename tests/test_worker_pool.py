@@ -0,0 +1,19 @@
+from utils.worker_pool import worker, ingest
+
+
+def setup(offset):
+    return {'offset': offset}
+
+
+def add_offset(filing):
+    return filing[1], filing[0] + worker['offset']
+
+
+def test_ingest_skips_stored_filings_and_commits():
+    filings = [(i, f"accession-{i}") for i in range(10)]
+    stored, commits = list(), list()
+    num_added = ingest(filings, add_offset, stored.append, lambda: commits.append(len(stored)), setup, (100,),
+                       stored={'accession-3', 'accession-7'}, processes=2, commit_every=3, chunksize=1)
+    assert num_added == 8
+    assert sorted(stored) == sorted((f"accession-{i}", i + 100) for i in range(10) if i not in (3, 7))
+    assert commits == [3, 6, 8]
@@ -0,0 +1,419 @@
+# __author__ = "Cody Wan"
+# __email__ = "codywan71@gmail.com"
+
+import requests
+import random
+import threading
+import time
+import logging
+import hashlib
+import os
+import sqlite3
+import tempfile
+from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
+
+# SEC Edgar's fair access policy: no more than 10 requests per second, with a declared user agent
+# https://www.sec.gov/os/accessing-edgar-data
+EDGAR_MAX_REQUESTS_PER_SECOND = 10
+EDGAR_USER_AGENT = "Cody Wan codywan71@gmail.com"
+# status codes Edgar returns when throttling or temporarily unavailable; worth retrying
+RETRY_STATUS_CODES = (429, 503)
+# filings under Edgar's archive never change once published, no need to revalidate them
+IMMUTABLE_URL_PATTERNS = ("/Archives/edgar/data/",)
+# bytes read at a time when streaming a response body to disk
+CHUNK_SIZE = 1024 * 1024
+
+
+class TokenBucket(object):
+    """
+        thread-safe token bucket, shared by every thread that talks to Edgar
+        args:
+            rate: float; tokens added per second (i.e. sustained requests per second)
+            capacity: int; max number of tokens that can be saved up (i.e. max burst size)
+    """
+
+    def __init__(self, rate=EDGAR_MAX_REQUESTS_PER_SECOND, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+            block until a token is available, then consume it
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            # sleep outside of lock so other threads can refill/check meanwhile
+            time.sleep(wait)
+
+
+class RequestsTransport(object):
+    """
+        default transport, makes blocking GET requests through a shared requests.Session
+        any object with a get(url, headers, stream) method that returns a response-like object (status_code, headers,
+        content, url, and iter_content(chunk_size) if stream) can be used instead, e.g. a transport pointing to a local
+        stub server in tests
+    """
+
+    def __init__(self, pool_size=10, timeout=30):
+        self.timeout = timeout
+        self.session = requests.Session()
+        # keep one connection per worker thread alive, instead of the default 10
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, headers=None, stream=False):
+        return self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+
+
+class CachedResponse(object):
+    """
+        response-like object served from ResponseCache, exposes the same attributes the fetch layer reads from a
+        requests.Response
+    """
+
+    def __init__(self, url, content, headers=None, status_code=200):
+        self.url = url
+        self.content = content
+        self.headers = headers or dict()
+        self.status_code = status_code
+        self.from_cache = True
+
+
+class ResponseCache(object):
+    """
+        content-addressed on-disk cache of Edgar responses, keyed by url
+        response bodies are stored once per sha256 digest under {cache_dir}/objects/, while {cache_dir}/index.sqlite
+        maps every url to its digest along with ETag/Last-Modified for revalidation; when total size of stored bodies
+        exceeds max_size, least recently used urls are evicted; a pinned body (see pin) is kept on disk until unpinned
+        args:
+            cache_dir: str; e.g. "/Users/Data/SEC Edgar Cache/"
+            max_size: int; max number of bytes of stored bodies
+    """
+
+    def __init__(self, cache_dir, max_size=50 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        # connection is shared by every thread of the fetch layer, access is serialized by lock
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries (url TEXT PRIMARY KEY, digest TEXT NOT NULL, "
+                        "size INTEGER NOT NULL, etag TEXT, last_modified TEXT, last_access REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)")
+        self.db.commit()
+        # total size of distinct bodies on disk
+        self.size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM "
+                                    "(SELECT MAX(size) AS size FROM entries GROUP BY digest)").fetchone()[0]
+        # {digest: number of pins}, bodies handed over by path to be read later (e.g. by a parser process)
+        self.pinned = dict()
+        # pinned digests no url refers to anymore, deleted once unpinned
+        self.orphaned = set()
+
+    @staticmethod
+    def is_immutable(url):
+        return any(pattern in url for pattern in IMMUTABLE_URL_PATTERNS)
+
+    def object_path(self, digest):
+        return os.path.join(self.cache_dir, "objects", digest[:2], digest)
+
+    def lookup_entry(self, url):
+        """
+            returns:
+                tuple (digest, etag, last_modified), or None if url is not cached
+        """
+        with self.lock:
+            row = self.db.execute("SELECT digest, etag, last_modified FROM entries WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE entries SET last_access = ? WHERE url = ?", (time.time(), url))
+            self.db.commit()
+        return row
+
+    def open(self, url, pin=False):
+        """
+            args:
+                pin: bool; pin the body (see pin) if url is cached
+            returns:
+                binary file object of url's cached body, or None if url is not cached
+        """
+        row = self.lookup_entry(url)
+        if row is None:
+            return None
+        with self.lock:
+            try:
+                f = open(self.object_path(row[0]), 'rb')
+            except FileNotFoundError:  # evicted by another thread in the meantime
+                return None
+            if pin:
+                self.pin(row[0])
+        return f
+
+    def pin(self, digest):
+        """
+            keep a body on disk even if its url is evicted, until unpin; caller holds lock
+        """
+        self.pinned[digest] = self.pinned.get(digest, 0) + 1
+
+    def unpin(self, path):
+        """
+            release a pin taken by open or store_stream, given path of the body
+        """
+        digest = os.path.basename(path)
+        with self.lock:
+            self.pinned[digest] -= 1
+            if self.pinned[digest] == 0:
+                del self.pinned[digest]
+                if digest in self.orphaned:
+                    self.orphaned.discard(digest)
+                    self.release(digest)
+
+    def lookup(self, url):
+        """
+            returns:
+                CachedResponse, or None if url is not cached
+        """
+        row = self.lookup_entry(url)
+        if row is None:
+            return None
+        digest, etag, last_modified = row
+        try:
+            with open(self.object_path(digest), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:  # evicted by another thread in the meantime
+            return None
+        headers = dict()
+        if etag:
+            headers['ETag'] = etag
+        if last_modified:
+            headers['Last-Modified'] = last_modified
+        return CachedResponse(url, content, headers)
+
+    def store(self, url, response):
+        """
+            store a successful response's body, then evict least recently used urls if cache is over max_size
+        """
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.object_path(digest)
+        with self.lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # write to temporary file first so a killed run never leaves a truncated body behind
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+            self.add_entry(url, digest, len(content), response.headers)
+
+    def store_stream(self, url, response, pin=False):
+        """
+            same as store, but body is streamed to disk chunk by chunk instead of being read in memory
+            args:
+                pin: bool; pin the body (see pin) before anything is evicted
+            returns:
+                str; path of stored body
+        """
+        tmp_dir = os.path.join(self.cache_dir, "objects")
+        sha256 = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=tmp_dir, suffix=".tmp", delete=False) as f:
+            try:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            except Exception:
+                # don't leave partial body behind if connection drops
+                os.remove(f.name)
+                raise
+        digest = sha256.hexdigest()
+        path = self.object_path(digest)
+        with self.lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(f.name, path)
+            if pin:
+                self.pin(digest)
+            self.add_entry(url, digest, size, response.headers)
+        return path
+
+    def add_entry(self, url, digest, size, headers):
+        """
+            point url to a stored body; caller holds lock
+        """
+        old = self.db.execute("SELECT digest FROM entries WHERE url = ?", (url,)).fetchone()
+        new_body = self.db.execute("SELECT 1 FROM entries WHERE digest = ?", (digest,)).fetchone() is None
+        self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                        (url, digest, size, headers.get('ETag'), headers.get('Last-Modified'), time.time()))
+        if new_body:
+            self.size += size
+        if old is not None and old[0] != digest:
+            self.release(old[0])
+        self.evict()
+        self.db.commit()
+
+    def release(self, digest):
+        """
+            delete a body once no url refers to it anymore; caller holds lock
+        """
+        if self.db.execute("SELECT 1 FROM entries WHERE digest = ?", (digest,)).fetchone() is not None:
+            return
+        if digest in self.pinned:
+            self.orphaned.add(digest)
+            return
+        path = self.object_path(digest)
+        try:
+            self.size -= os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """
+            evict least recently used urls until cache is within max_size; caller holds lock
+        """
+        while self.size > self.max_size:
+            pinned = list(self.pinned)
+            row = self.db.execute(f"SELECT url, digest FROM entries WHERE digest NOT IN "
+                                  f"({', '.join('?' * len(pinned))}) ORDER BY last_access LIMIT 1", pinned).fetchone()
+            if row is None:
+                break
+            url, digest = row
+            self.db.execute("DELETE FROM entries WHERE url = ?", (url,))
+            self.release(digest)
+            logging.debug(f"evicted {url} from cache")
+
+
+class EdgarFetcher(object):
+    """
+        fetch layer for SEC Edgar: every request goes through a shared rate limiter and is retried with exponential
+        backoff if Edgar throttles (429) or is unavailable (503)
+        args:
+            transport: object with get(url, headers); defaults to RequestsTransport
+            limiter: TokenBucket; defaults to one pinned to Edgar's 10 requests per second
+            max_retries: int; number of retries before giving up on a url
+            backoff: float; seconds to wait before first retry, doubled on every retry
+            user_agent: str; Edgar rejects requests without a declared user agent
+            cache: ResponseCache; if given, archive urls are served from cache without any request, and other urls
+                (e.g. search pages) are revalidated with ETag/If-Modified-Since
+    """
+
+    def __init__(self, transport=None, limiter=None, max_retries=5, backoff=1.0, user_agent=EDGAR_USER_AGENT,
+                 cache=None):
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.limiter = limiter if limiter is not None else TokenBucket()
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.headers = {'User-Agent': user_agent}
+
+    @staticmethod
+    def build_url(url, params=None):
+        """
+            append query parameters to url, the same way requests does
+        """
+        if not params:
+            return url
+        return url + ("&" if "?" in url else "?") + urlencode(params)
+
+    def get(self, url, params=None, headers=None):
+        """
+            make a rate-limited GET request, retrying on throttling/unavailable responses and connection errors
+            args:
+                url: str
+                params: dict; query parameters
+                headers: dict; extra request headers
+            returns:
+                response object from transport, or CachedResponse
+        """
+        url = self.build_url(url, params)
+        request_headers = {**self.headers, **(headers or {})}
+        cached = self.cache.lookup(url) if self.cache is not None else None
+        if cached is not None:
+            if self.cache.is_immutable(url):
+                return cached
+            # ask Edgar whether cached copy is still current
+            if 'ETag' in cached.headers:
+                request_headers['If-None-Match'] = cached.headers['ETag']
+            if 'Last-Modified' in cached.headers:
+                request_headers['If-Modified-Since'] = cached.headers['Last-Modified']
+        response = self.request(url, request_headers)
+        if cached is not None and response.status_code == 304:
+            return cached
+        if self.cache is not None and response.status_code == 200:
+            self.cache.store(url, response)
+        return response
+
+    def open(self, url, pin=False):
+        """
+            rate-limited GET request whose body is streamed to disk rather than read in memory; meant for large
+            archive files such as full submissions
+            args:
+                pin: bool; if the body is in cache, keep it on disk until cache.unpin(f.name), so its path can be read
+                    after the file is closed
+            returns:
+                binary file object of the body
+            raises:
+                requests.HTTPError; if Edgar doesn't answer 200 (e.g. 404, or 403 of its rate limit page), so an error
+                page is never taken for the body
+        """
+        if self.cache is not None:
+            f = self.cache.open(url, pin)
+            if f is not None:
+                return f
+        response = self.request(url, self.headers, stream=True)
+        if response.status_code != 200:
+            raise requests.HTTPError(f"{response.status_code} on {url}", response=response)
+        if self.cache is not None:
+            return open(self.cache.store_stream(url, response, pin), 'rb')
+        f = tempfile.TemporaryFile()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            f.write(chunk)
+        f.seek(0)
+        return f
+
+    def request(self, url, request_headers, stream=False):
+        """
+            send request through transport, with rate limit and retries
+        """
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                response = self.transport.get(url, headers=request_headers, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning(f"{type(e).__name__} on {url}, retry {attempt + 1}/{self.max_retries}")
+                time.sleep(self.backoff_time(attempt))
+                continue
+            if response.status_code not in RETRY_STATUS_CODES:
+                return response
+            if attempt == self.max_retries:
+                break
+            logging.warning(f"Response status code {response.status_code} on {url}, "
+                            f"retry {attempt + 1}/{self.max_retries}")
+            time.sleep(self.backoff_time(attempt, response.headers.get('Retry-After')))
+        raise requests.HTTPError(f"{response.status_code} on {url} after {self.max_retries} retries",
+                                 response=response)
+
+    def backoff_time(self, attempt, retry_after=None):
+        """
+            seconds to wait before next retry; honor Edgar's Retry-After header if given, otherwise exponential backoff
+            with jitter so that threads throttled at the same time don't retry at the same time
+        """
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return self.backoff * (2 ** attempt) * (1 + random.random())
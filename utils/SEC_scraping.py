@@ -2,19 +2,27 @@
 # __credits__ = ["Alex Reed/https://github.com/areed1192"]
 # __email__ = "codywan71@gmail.com"
 
-import requests
 import re
 import unicodedata
 import json
 import time
 import pandas as pd
-import traceback
 import functools
 import logging
 import os
+import threading
+import queue
+import io
+import lxml.html
+import random
+import difflib
+from lxml import etree
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from glob import glob  # to locate file name with partial wildcard (i.e. omit date in reading permno cik mapper)
-from datetime import datetime
+from utils import SEC_fetch
+from utils import filing_catalog
+from utils import filing_store
 
 
 def slow_down(_func=None, *, rate=0.1):
@@ -86,12 +94,12 @@ def parse_entries(soup, master_dict_xml):
         master_dict_xml[accession_num]['request_info']['last_update'] = entry.find('updated').text
 
 
-def parse_documents(soup, master_dict_filing, FILING_TYPE):
+def parse_sec_header(soup, master_dict_filing):
     """
-        scrape all documents in the filing page (a filing is consisted of multiple documents on SEC Edgar)
+        store a filing's sec-header in text
         args:
-            soup: BeautifulSoup object that has read the filing page as lxml
-            master_dict_filing: master dictionary to store information scraped from all documents
+            soup: BeautifulSoup object that has read the filing page (or its sec-header) as lxml
+            master_dict_filing: master dictionary to store information scraped from the filing
         return:
             None
     """
@@ -110,105 +118,358 @@ def parse_documents(soup, master_dict_filing, FILING_TYPE):
     # BeautifulSoup object) cannot be dumped to a json file
     # master_dict_filing['sec_header_content']['sec_header_code'] = sec_header_code
 
+
+def page_text_html5(page: str) -> str:
+    """
+        text of a page, after repairing it as html5 (slow, pure python html5lib parser)
+    """
+    page_soup = BeautifulSoup(page, "html5")
+    return page_soup.html.body.get_text(" ", strip=True)
+
+
+def page_text_lxml(page: str) -> str:
+    """
+        text of a page, parsed by lxml's C parser; meant to give the same text as page_text_html5, i.e. every string in
+        body stripped and joined by " ", leaving out comments; like get_text of beautifulsoup4 4.9.3 on an html5lib
+        tree, content of script, style and template is kept
+        (see check_text_parity for how close the two are)
+    """
+    try:
+        root = lxml.html.document_fromstring(page)
+    except etree.ParserError:  # empty page
+        return ""
+    body = root.find('body')
+    if body is None:
+        return ""
+    strings = list()
+    for event, element in etree.iterwalk(body, events=('start', 'end')):
+        if event == 'start':
+            # comments and processing instructions don't have a str tag
+            if isinstance(element.tag, str) and element.text:
+                strings.append(element.text)
+        elif element is not body and element.tail:
+            strings.append(element.tail)
+    return " ".join(string.strip() for string in strings if string.strip())
+
+
+# text extraction used by parse_document; "lxml" is an order of magnitude faster than "html5"
+PAGE_TEXT_PARSERS = {'html5': page_text_html5, 'lxml': page_text_lxml}
+
+
+def parse_document(filing_document, master_dict_document, FILING_TYPE, parser="html5"):
+    """
+        scrape a single document of a filing, skip it if it's a supporting document (pdf, jpg etc.)
+        args:
+            filing_document: BeautifulSoup tag of the document
+            master_dict_document: dictionary to store information scraped from every document of a filing
+            parser: str; "html5" or "lxml", how to extract text of every page (see PAGE_TEXT_PARSERS)
+        return:
+            None
+    """
+    # read some parts of document tags
+    try:
+        document_id = filing_document.find('type').find(text=True, recursive=False).strip()
+    except AttributeError:  # e.g. 894253 (CIK)
+        document_id = ""
+    try:
+        document_sequence = filing_document.find('sequence').find(text=True, recursive=False).strip()
+    except AttributeError:
+        document_sequence = ""
+    if (document_id == "") and (document_sequence == ""):
+        return  # skip, if no identifier
+    try:
+        document_filename = filing_document.find('filename').find(text=True, recursive=False).strip()
+    except AttributeError:
+        document_filename = ""
+
+    # skip supporting documents (pdf, jpg etc.)
+    if not ((FILING_TYPE in document_id) or ("EX-" in document_id)):
+        # skip documents not containing FILING_TYPE or EX-
+        # this would exclude some of pdf jpg etc.
+        return
+    file_type = document_filename.split(".")[-1]
+    if file_type != "htm":
+        # exclude rest of pdf jpg documents
+        return
+
+    try:
+        # not always available (e.g. https://www.sec.gov/Archives/edgar/data/43350/000114420410064250
+        # /0001144204-10-064250.txt)
+        document_description = filing_document.find('description').find(text=True, recursive=False).strip()
+    except AttributeError:
+        document_description = ""
+
+    # store document tags
+    master_dict_document[document_id + "_" + document_sequence] = dict()
+    master_dict_document[document_id + "_" + document_sequence]['document_filename'] = document_filename
+    master_dict_document[document_id + "_" + document_sequence]['document_description'] = document_description
+    # store document content in raw html; normally not needed
+    # master_dict_document[document_id+"_"+document_sequence]['document_code'] = filing_document.extract()
+
+    # read all text in the document
+    filing_doc_text = filing_document.find('text').extract()
+    # read all thematic breaks as str, if any (similar to a page break in a document)
+    all_thematic_breaks = [str(thematic_break) for thematic_break in
+                           filing_doc_text.find_all('hr', {'width': '100%'})]
+    try:
+        filing_doc_str = str(filing_doc_text)
+    except RecursionError as e:
+        logging.error(f"ERROR:\ndocument filename: {document_filename}\nRecursionError: filing_doc_str = str("
+                      f"filing_doc_text)")
+        return
+
+    # split documents by thematic breaks
+    if len(all_thematic_breaks) > 0:  # if there is thematic break
+        regex_delimited_pattern = "|".join(map(re.escape, all_thematic_breaks))
+        split_filing_str = re.split(regex_delimited_pattern, filing_doc_str)
+        document_pages = split_filing_str
+    else:
+        document_pages = [filing_doc_str]
+
+    pages_length = len(document_pages)
+    page_text_parser = PAGE_TEXT_PARSERS[parser]
+    normalized_text = dict()
+    for index, page in enumerate(document_pages):  # one-time loop if there is only one page
+        # generate normalized text (extract content in text, remove html/css syntax)
+        page_text = page_text_parser(page)
+        # convert unicode syntax to corresponding text; 
+        # note different encoding error results in different parsed texts; 
+        # we can use 'ignore' to remove special characters (bullet point sign etc.); 
+        # texts are most likely parsed correctly given SEC's strict rules on encoding for filing documents
+        # https://godatadriven.com/blog/handling-encoding-issues-with-unicode-normalisation-in-python/ 
+        page_text_norm = str(unicodedata.normalize('NFKD', page_text).encode(encoding='ascii', errors='ignore'))
+        page_text_norm = page_text_norm.replace(r"\n", " ").replace(r"\t", " ").replace("  ", " ")
+
+        # define page number
+        page_number = index + 1
+        # store normalized text
+        normalized_text[page_number] = page_text_norm
+
+    # add pages length and normalized test to master dictionary
+    master_dict_document[document_id + "_" + document_sequence]['pages_length'] = pages_length
+    master_dict_document[document_id + "_" + document_sequence]['normalized_text'] = normalized_text
+    logging.debug(document_filename)  # logging after processing document_filename complete
+
+
+def parse_documents(soup, master_dict_filing, FILING_TYPE, parser="html5"):
+    """
+        scrape all documents in the filing page (a filing is consisted of multiple documents on SEC Edgar)
+        args:
+            soup: BeautifulSoup object that has read the filing page as lxml
+            master_dict_filing: master dictionary to store information scraped from all documents
+        return:
+            None
+    """
+    parse_sec_header(soup, master_dict_filing)
+
     # make a space holder for saving master_dict_document later (contains text for every document in a filing)
     master_dict_filing['filing_documents'] = None
     # initialize dictionary to store information on each document in a filing
     master_dict_document = dict()
     for filing_document in soup.find_all('document'):
-        # read some parts of document tags
-        try:
-            document_id = filing_document.find('type').find(text=True, recursive=False).strip()
-        except AttributeError:  # e.g. 894253 (CIK)
-            document_id = ""
-        try:
-            document_sequence = filing_document.find('sequence').find(text=True, recursive=False).strip()
-        except AttributeError:
-            document_sequence = ""
-        if (document_id == "") and (document_sequence == ""):
-            continue  # skip, if no identifier
-        try:
-            document_filename = filing_document.find('filename').find(text=True, recursive=False).strip()
-        except AttributeError:
-            document_filename = ""
+        parse_document(filing_document, master_dict_document, FILING_TYPE, parser)
 
-        # skip supporting documents (pdf, jpg etc.)
-        if not ((FILING_TYPE in document_id) or ("EX-" in document_id)):
-            # skip documents not containing FILING_TYPE or EX-
-            # this would exclude some of pdf jpg etc.
-            continue
-        file_type = document_filename.split(".")[-1]
-        if file_type != "htm":
-            # exclude rest of pdf jpg documents
+    master_dict_filing['filing_documents'] = master_dict_document
+
+
+def is_kept_document(document_id: str, document_sequence: str, document_filename: str, FILING_TYPE: str) -> bool:
+    """
+        same rule parse_document uses to skip supporting documents (pdf, jpg, xbrl, graphics etc.)
+    """
+    if (document_id == "") and (document_sequence == ""):
+        return False
+    if not ((FILING_TYPE in document_id) or ("EX-" in document_id)):
+        return False
+    return document_filename.split(".")[-1] == "htm"
+
+
+def split_submission(stream, FILING_TYPE):
+    """
+        split a full submission (.txt) into its sec-header and documents, reading raw bytes line by line; documents
+        parse_document would skip are never buffered, so memory is bounded by the largest document kept
+        args:
+            stream: binary file object, or any iterable of lines in bytes
+            FILING_TYPE: str; e.g. 8-K
+        yields:
+            ('sec-header', bytes), then ('document', bytes) for every kept document, in order of submission
+    """
+    # SGML tags of a submission, see reference/Preparing an EDGAR Filing in Plain Text.pdf
+    document_tag_pattern = re.compile(rb"^\s*<(TYPE|SEQUENCE|FILENAME)>(.*)$", re.IGNORECASE)
+    # None: between documents; 'sec-header'; 'document-header': tags before <TEXT>; 'document': kept; 'skip'
+    state = None
+    buffer = list()
+    document_tags = dict()
+    for line in stream:
+        if state is None:
+            stripped = line.lstrip().upper()
+            if stripped.startswith(b"<SEC-HEADER>"):
+                state, buffer = 'sec-header', list()
+            elif stripped.startswith(b"<DOCUMENT>"):
+                state, buffer, document_tags = 'document-header', list(), dict()
+            else:
+                continue
+        if state == 'skip':
+            if b"</DOCUMENT>" in line or b"</document>" in line:
+                state = None
             continue
+        buffer.append(line)
 
-        try:
-            # not always available (e.g. https://www.sec.gov/Archives/edgar/data/43350/000114420410064250
-            # /0001144204-10-064250.txt)
-            document_description = filing_document.find('description').find(text=True, recursive=False).strip()
-        except AttributeError:
-            document_description = ""
-
-        # store document tags
-        master_dict_document[document_id + "_" + document_sequence] = dict()
-        master_dict_document[document_id + "_" + document_sequence]['document_filename'] = document_filename
-        master_dict_document[document_id + "_" + document_sequence]['document_description'] = document_description
-        # store document content in raw html; normally not needed
-        # master_dict_document[document_id+"_"+document_sequence]['document_code'] = filing_document.extract()
-
-        # read all text in the document
-        filing_doc_text = filing_document.find('text').extract()
-        # read all thematic breaks as str, if any (similar to a page break in a document)
-        all_thematic_breaks = [str(thematic_break) for thematic_break in
-                               filing_doc_text.find_all('hr', {'width': '100%'})]
-        try:
-            filing_doc_str = str(filing_doc_text)
-        except RecursionError as e:
-            logging.error(f"ERROR:\ndocument filename: {document_filename}\nRecursionError: filing_doc_str = str("
-                          f"filing_doc_text)")
+        if state == 'sec-header':
+            if b"</SEC-HEADER>" in line or b"</sec-header>" in line:
+                yield 'sec-header', b"".join(buffer)
+                state, buffer = None, list()
             continue
+        if state == 'document-header':
+            match = document_tag_pattern.match(line)
+            if match:
+                document_tags[match.group(1).upper()] = match.group(2).decode('ascii', errors='ignore').strip()
+            elif line.lstrip().upper().startswith(b"<TEXT>"):
+                # every tag needed to tell if the document is kept comes before its text
+                if is_kept_document(document_tags.get(b"TYPE", ""), document_tags.get(b"SEQUENCE", ""),
+                                    document_tags.get(b"FILENAME", ""), FILING_TYPE):
+                    state = 'document'
+                else:
+                    state, buffer = 'skip', list()
+        if b"</DOCUMENT>" in line or b"</document>" in line:
+            if state == 'document':
+                yield 'document', b"".join(buffer)
+            state, buffer = None, list()
 
-        # split documents by thematic breaks
-        if len(all_thematic_breaks) > 0:  # if there is thematic break
-            regex_delimited_pattern = "|".join(map(re.escape, all_thematic_breaks))
-            split_filing_str = re.split(regex_delimited_pattern, filing_doc_str)
-            document_pages = split_filing_str
-        else:
-            document_pages = [filing_doc_str]
-
-        pages_length = len(document_pages)
-        repaired_pages = dict()
-        normalized_text = dict()
-        for index, page in enumerate(document_pages):  # one-time loop if there is only one page
-            # generate repaired text (parse page in str as html5 to BeautifulSoup object)
-            page_soup = BeautifulSoup(page, "html5")
-            # generate normalized text (extract content in text, remove html/css syntax)
-            page_text = page_soup.html.body.get_text(" ", strip=True)
-            # convert unicode syntax to corresponding text; 
-            # note different encoding error results in different parsed texts; 
-            # we can use 'ignore' to remove special characters (bullet point sign etc.); 
-            # texts are most likely parsed correctly given SEC's strict rules on encoding for filing documents
-            # https://godatadriven.com/blog/handling-encoding-issues-with-unicode-normalisation-in-python/ 
-            page_text_norm = str(unicodedata.normalize('NFKD', page_text).encode(encoding='ascii', errors='ignore'))
-            page_text_norm = page_text_norm.replace(r"\n", " ").replace(r"\t", " ").replace("  ", " ")
-
-            # define page number
-            page_number = index + 1
-            # store normalized text
-            normalized_text[page_number] = page_text_norm
-            # store repaired text
-            repaired_pages[page_number] = page_soup
-
-        # add pages length and normalized test to master dictionary
-        master_dict_document[document_id + "_" + document_sequence]['pages_length'] = pages_length
-        master_dict_document[document_id + "_" + document_sequence]['normalized_text'] = normalized_text
-        logging.debug(document_filename)  # logging after processing document_filename complete
 
+def parse_submission(stream, master_dict_filing, FILING_TYPE, parser="html5"):
+    """
+        streaming version of parse_documents: scrape a full submission (.txt) read from stream, only the sec-header and
+        documents kept by split_submission are parsed as html
+        args:
+            stream: binary file object, or any iterable of lines in bytes
+            master_dict_filing: master dictionary to store information scraped from all documents
+        return:
+            None
+    """
+    master_dict_filing['sec_header_content'] = {'sec_header_text': ""}
+    master_dict_filing['filing_documents'] = None
+    master_dict_document = dict()
+    for part, raw in split_submission(stream, FILING_TYPE):
+        # parse each part on its own, instead of the whole submission as one tree
+        soup = BeautifulSoup(raw, 'lxml')
+        if part == 'sec-header':
+            parse_sec_header(soup, master_dict_filing)
+        else:
+            parse_document(soup.find('document'), master_dict_document, FILING_TYPE, parser)
     master_dict_filing['filing_documents'] = master_dict_document
 
 
-def download_filings(T1: str, FILING_TYPE: str, CIK_list: list, OUTPUT_FILE_PATH: str, LOGGING_FILE_PATH: str):
+def fetch_filing_index(CIK, T1: str, FILING_TYPE: str, fetcher, known: set = None) -> dict:
+    """
+        read every entry of a CIK's SEC Edgar search result (across all of its pages)
+        args:
+            CIK: CIK number (SEC Edgar's stock identifier)
+            T1: str, 'YYYYMMDD'; search filings with timestamp before T1
+            FILING_TYPE: str; type of filing to search, e.g. 8-K
+            fetcher: SEC_fetch.EdgarFetcher
+            known: set; accession numbers already stored, if given, stop reading pages once a page contains any of them
+        returns:
+            dict (master_dict_xml); entries information keyed by accession number
+    """
+    # define endpoint for making web request
+    endpoint = r"https://www.sec.gov/cgi-bin/browse-edgar"
+    # define parameters
+    # note: "dateb" sets the date we want filings prior to,
+    # doesn't look like it has a corresponding "datea"/"date after" parameter
+    param_dict = {'action': 'getcompany',
+                  'CIK': CIK,
+                  'type': FILING_TYPE,
+                  'dateb': T1,
+                  'owner': 'exclude',
+                  'start': "",
+                  'output': 'atom',
+                  'count': '100'}  # 100 is the max
+    # define response
+    response = fetcher.get(endpoint, params=param_dict)
+    # save status code; for logging/debugging purposes
+    logging.info(f"CIK={CIK} Response status code: {response.status_code}")
+    logging.info(f"CIK={CIK} Starting url: {response.url}")
+
+    # initialize BeautifulSoup object to process search result
+    soup = BeautifulSoup(response.content, 'lxml')
+    # initalize master list to store entries information from search result
+    master_dict_xml = dict()
+    # the following loop scrapes each entry in the search result
+    # if its next page tag is non-empty, we read next page until exhauxsted
+    while True:
+        # read current page
+        num_entries = len(master_dict_xml)
+        parse_entries(soup, master_dict_xml)
+        # search result lists filings newest first; once a page reaches filings already stored, every filing on
+        # the following pages is stored as well
+        if known and any(accession_num in known for accession_num in list(master_dict_xml)[num_entries:]):
+            break
+        # read link for next page, if any
+        link = soup.find_all('link', {'rel': 'next'})
+        if link == []:
+            break
+        else:
+            next_page_link = link[0]['href']
+            # request next page; fetcher takes care of Edgar's rate limit
+            response = fetcher.get(next_page_link)
+            soup = BeautifulSoup(response.content, 'lxml')
+    logging.info(f"CIK={CIK} Number of {FILING_TYPE} filings scraped in total: {len(master_dict_xml)}")
+    return master_dict_xml
+
+
+def fetch_filing(filing_href: str, FILING_TYPE: str, fetcher, parser: str = "html5") -> dict:
+    """
+        download and parse a filing's full submission in text format
+        args:
+            filing_href: str; link to the filing's index page, as given by its search result entry
+            FILING_TYPE: str; e.g. 8-K
+            fetcher: SEC_fetch.EdgarFetcher
+            parser: str; "html5" or "lxml", see parse_document
+        returns:
+            dict (master_dict_filing)
+    """
+    # retrieve url to access the filing page on edgar in text format for parsing purposes
+    new_html_text = filing_href.replace("-index.htm", ".txt")
+    # initialize empty dictionary to store filing information
+    master_dict_filing = dict()
+    # store every document information in a filing to master_dict_filing a 8-K filing may have multiple
+    # documents, which include main 8-K text, extension files on taxonomy, etc.
+    # submission is streamed from disk, supporting documents (pdf, jpg etc.) are skipped before any html parsing
+    with fetcher.open(new_html_text) as f:
+        parse_submission(f, master_dict_filing, FILING_TYPE, parser)
+    return master_dict_filing
+
+
+def download_cik(CIK, T1: str, FILING_TYPE: str, fetcher, parser: str = "html5") -> dict:
+    """
+        download and parse every filing of a CIK
+        returns:
+            dict (master_dict_xml); entries information keyed by accession number, with parsed documents of each
+            filing stored under 'master_dict_filing'
+    """
+    master_dict_xml = fetch_filing_index(CIK, T1, FILING_TYPE, fetcher)
+    # iterate through every filing
+    for accession_num in master_dict_xml:
+        logging.debug("accession number: " + accession_num)
+        master_dict_xml[accession_num]['master_dict_filing'] = fetch_filing(
+            master_dict_xml[accession_num]['file_info']['filing_href'], FILING_TYPE, fetcher, parser)
+    return master_dict_xml
+
+
+def default_fetcher(max_workers: int, CACHE_PATH: str = None):
+    """
+        fetcher pinned to Edgar's 10 requests per second, with one connection per worker thread
+    """
+    cache = SEC_fetch.ResponseCache(CACHE_PATH) if CACHE_PATH is not None else None
+    return SEC_fetch.EdgarFetcher(transport=SEC_fetch.RequestsTransport(pool_size=max_workers), cache=cache)
+
+
+def download_filings(T1: str, FILING_TYPE: str, CIK_list: list, OUTPUT_FILE_PATH: str, LOGGING_FILE_PATH: str,
+                     max_workers: int = 8, fetcher=None, CACHE_PATH: str = None, parser: str = "html5",
+                     CATALOG_PATH: str = None):
     """
-        download SEC Filings to local
+        download SEC Filings to local; CIKs are downloaded concurrently, while every request made to Edgar goes
+        through a shared rate limiter (see SEC_fetch.EdgarFetcher)
         ----
         args:
             T1: str, 'YYYYMMDD'; download all filings with timestamp before T1
@@ -216,6 +477,12 @@ def download_filings(T1: str, FILING_TYPE: str, CIK_list: list, OUTPUT_FILE_PATH
             CIK_list: list; list of CIK numbers (SEC Edgar's stock identifier) to download filings for
 
             LOGGING_FILE_PATH: str; file path for saving run-time information
+            max_workers: int; number of CIKs downloaded at the same time
+            fetcher: SEC_fetch.EdgarFetcher; defaults to one pinned to Edgar's 10 requests per second
+            CACHE_PATH: str; if given (and fetcher is not), responses are cached on disk under CACHE_PATH so reruns
+                read filings from disk instead of Edgar
+            parser: str; "html5" or "lxml", how to extract text of every page (see parse_document)
+            CATALOG_PATH: str; if given, every json file written is indexed in filing_catalog.FilingCatalog
         returns:
             None
     """
@@ -224,80 +491,493 @@ def download_filings(T1: str, FILING_TYPE: str, CIK_list: list, OUTPUT_FILE_PATH
                         level=logging.INFO,
                         format='%(levelname)s: %(asctime)s - %(message)s',
                         datefmt='%m/%d/%Y %I:%M:%S')
+    if fetcher is None:
+        fetcher = default_fetcher(max_workers, CACHE_PATH)
+    catalog = filing_catalog.FilingCatalog(CATALOG_PATH) if CATALOG_PATH is not None else None
+    # several threads may fail at the same time
+    error_lock = threading.Lock()
 
-    logging.info(f"\nSTARTING")
-    for CIK in CIK_list:
+    def download_and_save(CIK):
         logging.info(f"Processing CIK={CIK}")
         try:
-            # define endpoint for making web request
-            endpoint = r"https://www.sec.gov/cgi-bin/browse-edgar"
-            # define parameters
-            # note: "dateb" sets the date we want filings prior to, 
-            # doesn't look like it has a corresponding "datea"/"date after" parameter
-            param_dict = {'action': 'getcompany',
-                          'CIK': CIK,
-                          'type': FILING_TYPE,
-                          'dateb': T1,
-                          'owner': 'exclude',
-                          'start': "",
-                          'output': 'atom',
-                          'count': '100'}  # 100 is the max
-            # define response
-            response = requests.get(url=endpoint, params=param_dict)
-            # save status code; for logging/debugging purposes
-            logging.info(f"Response status code: {response.status_code}")
-            logging.info(f"Starting url: {response.url}")
-
-            # initialize BeautifulSoup object to process search result
-            soup = BeautifulSoup(response.content, 'lxml')
-            # initalize master list to store entries information from search result
-            master_dict_xml = dict()
-            # the following loop scrapes each entry in the search result
-            # if its next page tag is non-empty, we read next page until exhauxsted 
-            while True:
-                # read current page
-                parse_entries(soup, master_dict_xml)
-                # read link for next page, if any
-                link = soup.find_all('link', {'rel': 'next'})
-                if link == []:
-                    break
-                else:
-                    next_page_link = link[0]['href']
-                    # request next page
-                    # attemp to limit sec edgar request by putting program to sleep
-                    response = requests.get(url=next_page_link)
-                    time.sleep(0.1)  # sleep for 0.1 seconds
-                    soup = BeautifulSoup(response.content, 'lxml')
-            logging.info(f"Number of {FILING_TYPE} filings scraped in total: {len(master_dict_xml)}")
-
-            # iterate through every filing 
-            for i, accession_num in enumerate(master_dict_xml):
-                # retrieve url to access the filing page on edgar in text format for parsing purposes
-                new_html_text = master_dict_xml[accession_num]['file_info']['filing_href'].replace("-index.htm", ".txt")
-                # read the page as beautifulsoup object
-                response = requests.get(new_html_text)
-                time.sleep(0.1)  # sleep for 0.1 seconds
-                soup = BeautifulSoup(response.content, 'lxml')
-                # initialize empty dictionary to store filing information
-                master_dict_filing = dict()
-                # store every document information in a filing to master_dict_filing a 8-K filing may have multiple
-                # documents, which include main 8-K text, extension files on taxonomy, etc.
-                logging.debug("accession number: " + accession_num)
-                parse_documents(soup, master_dict_filing, FILING_TYPE)
-                # add master_dict_filing to master_dict_xml
-                master_dict_xml[accession_num]['master_dict_filing'] = master_dict_filing
-
+            master_dict_xml = download_cik(CIK, T1, FILING_TYPE, fetcher, parser)
             with open(OUTPUT_FILE_PATH + f"{FILING_TYPE}_{CIK}_{T1}.json", 'w') as fp:
                 json.dump(obj=master_dict_xml, fp=fp, indent=4)
+            if catalog is not None:
+                catalog.index_file(OUTPUT_FILE_PATH + f"{FILING_TYPE}_{CIK}_{T1}.json", CIK)
+        except Exception as e:
+            with error_lock:
+                with open("data/Error_CIK.csv", 'a') as f:
+                    f.write(str(CIK) + "\n")
+            logging.exception(f"ERROR: {CIK}")
 
+    logging.info(f"\nSTARTING")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # consume the iterator so every CIK is waited on; exceptions are handled in download_and_save
+        list(executor.map(download_and_save, CIK_list))
+    if catalog is not None:
+        catalog.close()
+    logging.info(f"FINISHING\n")
+
+
+def read_journal(journal_path: str) -> dict:
+    """
+        read filings checkpointed by sync_cik, in the order they were stored
+        returns:
+            dict; entries information (with parsed documents) keyed by accession number
+    """
+    journal = dict()
+    if not os.path.exists(journal_path):
+        return journal
+    with open(journal_path) as f:
+        for line in f:
+            try:
+                journal.update(json.loads(line))
+            except json.JSONDecodeError:
+                # last line may be cut off if a run was killed while writing it, the filing is fetched again
+                logging.warning(f"skipping incomplete line in {journal_path}")
+    return journal
+
+
+def sync_cik(CIK, T1: str, FILING_TYPE: str, OUTPUT_FILE_PATH: str, fetcher, parser: str = "html5") -> int:
+    """
+        incrementally download a CIK's filings: only filings not yet in its manifest are fetched, and every filing is
+        checkpointed to a journal as soon as it is parsed, so a killed run resumes where it stopped
+        the following files are kept under OUTPUT_FILE_PATH:
+            - {FILING_TYPE}_{CIK}_{T1}.json: all filings, same structure as download_filings' output; the file of the
+              previous sync (with an older T1) is replaced
+            - {FILING_TYPE}_{CIK}.manifest.json: accession numbers and filing dates stored, as of the last complete sync
+            - {FILING_TYPE}_{CIK}.journal.jsonl: filings fetched since the last complete sync, one per line
+        returns:
+            int; number of filings fetched
+    """
+    manifest_path = f"{OUTPUT_FILE_PATH}{FILING_TYPE}_{CIK}.manifest.json"
+    journal_path = f"{OUTPUT_FILE_PATH}{FILING_TYPE}_{CIK}.journal.jsonl"
+    output_path = f"{OUTPUT_FILE_PATH}{FILING_TYPE}_{CIK}_{T1}.json"
+    # file written by the last complete sync (or by download_filings), if any
+    stored_paths = sorted(glob(f"{OUTPUT_FILE_PATH}{FILING_TYPE}_{CIK}_*.json"))
+    stored_path = stored_paths[-1] if stored_paths else None
+
+    # read accession numbers already stored
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    elif stored_path is not None:
+        # first sync after a full download; build manifest from downloaded file
+        with open(stored_path) as f:
+            manifest = {'accessions': {accession_num: filing['file_info']['filing_date']
+                                       for accession_num, filing in json.load(f).items()}}
+    else:
+        manifest = {'accessions': dict()}
+    journal = read_journal(journal_path)
+    known = set(manifest['accessions']) | set(journal)
+
+    master_dict_xml = fetch_filing_index(CIK, T1, FILING_TYPE, fetcher, known=known)
+    new_accessions = [accession_num for accession_num in master_dict_xml if accession_num not in known]
+    logging.info(f"CIK={CIK} {len(new_accessions)} new, {len(journal)} resumed {FILING_TYPE} filing(s)")
+    # fetch oldest first, so filings stored are always every filing up to some date (see fetch_filing_index); a filing
+    # that fails (e.g. fetcher.open raising on a 404) stops the sync before it is checkpointed, the next run resumes
+    # from it
+    with open(journal_path, 'a') as journal_file:
+        for accession_num in reversed(new_accessions):
+            logging.debug("accession number: " + accession_num)
+            master_dict_xml[accession_num]['master_dict_filing'] = fetch_filing(
+                master_dict_xml[accession_num]['file_info']['filing_href'], FILING_TYPE, fetcher, parser)
+            # checkpoint
+            journal_file.write(json.dumps({accession_num: master_dict_xml[accession_num]}) + "\n")
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+            journal[accession_num] = master_dict_xml[accession_num]
+
+    if journal or stored_path != output_path:
+        # merge new filings (newest first) with stored ones
+        merged_dict_xml = dict(list(journal.items())[::-1])
+        if stored_path is not None:
+            with open(stored_path) as f:
+                merged_dict_xml.update(json.load(f))
+        # write to temporary file first so a killed run never leaves a truncated file behind
+        with open(output_path + ".tmp", 'w') as fp:
+            json.dump(obj=merged_dict_xml, fp=fp, indent=4)
+        os.replace(output_path + ".tmp", output_path)
+        if stored_path is not None and stored_path != output_path:
+            os.remove(stored_path)
+        manifest['accessions'].update({accession_num: filing['file_info']['filing_date']
+                                       for accession_num, filing in journal.items()})
+    manifest['last_sync'] = T1
+    with open(manifest_path + ".tmp", 'w') as fp:
+        json.dump(obj=manifest, fp=fp)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    # every checkpointed filing is now in output file
+    os.remove(journal_path)
+    return len(new_accessions)
+
+
+def sync_filings(T1: str, FILING_TYPE: str, CIK_list: list, OUTPUT_FILE_PATH: str, LOGGING_FILE_PATH: str,
+                 max_workers: int = 8, fetcher=None, CACHE_PATH: str = None, parser: str = "html5",
+                 CATALOG_PATH: str = None):
+    """
+        incremental version of download_filings, fetches only filings newer than each CIK's last sync (see sync_cik);
+        a CIK that fails keeps its checkpointed filings, rerunning picks up where it stopped
+        ----
+        args:
+            T1: str, 'YYYYMMDD'; sync all filings with timestamp before T1
+            same as download_filings otherwise
+        returns:
+            None
+    """
+    logging.basicConfig(filename=f"{LOGGING_FILE_PATH}/download_filings/error.txt",
+                        filemode='a',
+                        level=logging.INFO,
+                        format='%(levelname)s: %(asctime)s - %(message)s',
+                        datefmt='%m/%d/%Y %I:%M:%S')
+    if fetcher is None:
+        fetcher = default_fetcher(max_workers, CACHE_PATH)
+    catalog = filing_catalog.FilingCatalog(CATALOG_PATH) if CATALOG_PATH is not None else None
+    error_lock = threading.Lock()
+
+    def sync_and_save(CIK):
+        logging.info(f"Syncing CIK={CIK}")
+        try:
+            num_fetched = sync_cik(CIK, T1, FILING_TYPE, OUTPUT_FILE_PATH, fetcher, parser)
+            if catalog is not None:
+                catalog.index_file(OUTPUT_FILE_PATH + f"{FILING_TYPE}_{CIK}_{T1}.json", CIK)
+            return num_fetched
         except Exception as e:
+            with error_lock:
+                with open("data/Error_CIK.csv", 'a') as f:
+                    f.write(str(CIK) + "\n")
+            logging.exception(f"ERROR: {CIK}")
+            return 0
+
+    logging.info(f"\nSTARTING SYNC")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        num_fetched = sum(executor.map(sync_and_save, CIK_list))
+    if catalog is not None:
+        catalog.close()
+    logging.info(f"FINISHING SYNC, {num_fetched} new {FILING_TYPE} filing(s)\n")
+
+
+def parse_submission_worker(submission, FILING_TYPE: str, parser: str = "html5") -> dict:
+    """
+        parse a full submission in a worker process of download_filings_pipeline
+        args:
+            submission: str (file path of the submission) or bytes (the submission itself)
+        returns:
+            dict (master_dict_filing)
+    """
+    master_dict_filing = dict()
+    if isinstance(submission, str):
+        with open(submission, 'rb') as f:
+            parse_submission(f, master_dict_filing, FILING_TYPE, parser)
+    else:
+        parse_submission(io.BytesIO(submission), master_dict_filing, FILING_TYPE, parser)
+    return master_dict_filing
+
+
+class PipelineStats(object):
+    """
+        thread-safe counters of download_filings_pipeline's stages, for monitoring throughput and stage depths
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = time.time()
+        self.counts = {'CIK_indexed': 0, 'fetched': 0, 'submitted': 0, 'parsed': 0, 'parse_failed': 0,
+                       'CIK_written': 0, 'CIK_failed': 0}
+
+    def add(self, key, n=1):
+        with self.lock:
+            self.counts[key] += n
+
+    def log(self, queue_depth):
+        with self.lock:
+            counts = dict(self.counts)
+        elapsed = max(time.time() - self.start, 1e-9)
+        parsing = counts['submitted'] - counts['parsed'] - counts['parse_failed']
+        logging.info(f"pipeline: {queue_depth} fetched filing(s) queued, {parsing} parsing; "
+                     f"fetched {counts['fetched']} ({counts['fetched'] / elapsed:.2f}/s), "
+                     f"parsed {counts['parsed']} ({counts['parsed'] / elapsed:.2f}/s), "
+                     f"CIK indexed/written/failed {counts['CIK_indexed']}/{counts['CIK_written']}/"
+                     f"{counts['CIK_failed']}")
+
+
+def download_filings_pipeline(T1: str, FILING_TYPE: str, CIK_list: list, OUTPUT_FILE_PATH: str,
+                              LOGGING_FILE_PATH: str, fetch_workers: int = 8, parse_workers: int = None,
+                              queue_size: int = 64, fetcher=None, CACHE_PATH: str = None, parser: str = "html5",
+                              stats_interval: int = 60, CATALOG_PATH: str = None):
+    """
+        same output as download_filings, but network I/O and parsing run as separate stages:
+            1. fetch threads read every CIK's search result and download its submissions onto a bounded queue
+            2. a pool of parser processes drains the queue (parse_submission_worker)
+            3. a writer thread dumps a CIK's json file once all of its filings are parsed
+        so waiting on Edgar never stalls parsing and vice versa; stage depths and throughput are logged every
+        stats_interval seconds
+        ----
+        args:
+            fetch_workers: int; number of CIKs fetched at the same time
+            parse_workers: int; number of parser processes, defaults to os.cpu_count()
+            queue_size: int; max number of fetched submissions waiting to be parsed
+            same as download_filings otherwise
+        returns:
+            None
+    """
+    logging.basicConfig(filename=f"{LOGGING_FILE_PATH}/download_filings/error.txt",
+                        filemode='a',
+                        level=logging.INFO,
+                        format='%(levelname)s: %(asctime)s - %(message)s',
+                        datefmt='%m/%d/%Y %I:%M:%S')
+    if fetcher is None:
+        fetcher = default_fetcher(fetch_workers, CACHE_PATH)
+    catalog = filing_catalog.FilingCatalog(CATALOG_PATH) if CATALOG_PATH is not None else None
+    parse_workers = parse_workers or os.cpu_count()
+    stats = PipelineStats()
+    raw_queue = queue.Queue(maxsize=queue_size)
+    # cap submissions sent to parser processes, the rest wait in raw_queue
+    parse_slots = threading.BoundedSemaphore(parse_workers * 2)
+    # CIK -> {'master_dict_xml': dict, 'pending': int, 'all_queued': bool}, until CIK is written or fails
+    CIK_state = dict()
+    failed_CIKs = set()
+    state_lock = threading.Lock()
+    writer = ThreadPoolExecutor(max_workers=1)
+
+    def record_error(CIK):
+        with state_lock:
+            if CIK in failed_CIKs:
+                return
+            failed_CIKs.add(CIK)
+            # drop filings parsed so far, remaining ones are ignored once parsed
+            CIK_state.pop(CIK, None)
             with open("data/Error_CIK.csv", 'a') as f:
                 f.write(str(CIK) + "\n")
+        stats.add('CIK_failed')
+
+    def write_CIK(CIK, master_dict_xml):
+        try:
+            with open(OUTPUT_FILE_PATH + f"{FILING_TYPE}_{CIK}_{T1}.json", 'w') as fp:
+                json.dump(obj=master_dict_xml, fp=fp, indent=4)
+            if catalog is not None:
+                catalog.index_file(OUTPUT_FILE_PATH + f"{FILING_TYPE}_{CIK}_{T1}.json", CIK)
+            stats.add('CIK_written')
+        except Exception as e:
             logging.exception(f"ERROR: {CIK}")
-    logging.info(f"FINISHING\n")
+            record_error(CIK)
+
+    def check_complete(CIK):
+        # caller holds state_lock
+        state = CIK_state[CIK]
+        if state['all_queued'] and state['pending'] == 0:
+            del CIK_state[CIK]
+            writer.submit(write_CIK, CIK, state['master_dict_xml'])
+
+    def fetch_CIK(CIK):
+        logging.info(f"Processing CIK={CIK}")
+        try:
+            master_dict_xml = fetch_filing_index(CIK, T1, FILING_TYPE, fetcher)
+            with state_lock:
+                CIK_state[CIK] = {'master_dict_xml': master_dict_xml, 'pending': 0, 'all_queued': False}
+            stats.add('CIK_indexed')
+            for accession_num in master_dict_xml:
+                with state_lock:
+                    if CIK not in CIK_state:  # a filing already failed to parse
+                        return
+                    CIK_state[CIK]['pending'] += 1
+                new_html_text = master_dict_xml[accession_num]['file_info']['filing_href'].replace("-index.htm",
+                                                                                                   ".txt")
+                # cached submission stays on disk until parsed, even if evicted meanwhile (unpinned by on_parsed)
+                submission = None
+                try:
+                    with fetcher.open(new_html_text, pin=True) as f:
+                        # hand over path of cached submission if any, so that parser reads it from disk
+                        submission = f.name if isinstance(getattr(f, 'name', None), str) else f.read()
+                    stats.add('fetched')
+                    # blocks while parsers are behind
+                    raw_queue.put((CIK, accession_num, submission))
+                except Exception:
+                    # never handed over to on_parsed
+                    if isinstance(submission, str):
+                        fetcher.cache.unpin(submission)
+                    raise
+            with state_lock:
+                if CIK in CIK_state:
+                    CIK_state[CIK]['all_queued'] = True
+                    check_complete(CIK)
+        except Exception as e:
+            logging.exception(f"ERROR: {CIK}")
+            record_error(CIK)
+
+    def on_parsed(CIK, accession_num, submission, future):
+        parse_slots.release()
+        if isinstance(submission, str):
+            fetcher.cache.unpin(submission)
+        try:
+            master_dict_filing = future.result()
+        except Exception as e:
+            logging.error(f"ERROR: {CIK}, accession number {accession_num}: {e!r}")
+            stats.add('parse_failed')
+            record_error(CIK)
+            return
+        stats.add('parsed')
+        with state_lock:
+            if CIK not in CIK_state:
+                return
+            CIK_state[CIK]['master_dict_xml'][accession_num]['master_dict_filing'] = master_dict_filing
+            CIK_state[CIK]['pending'] -= 1
+            check_complete(CIK)
+
+    def fetch_all():
+        with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_executor:
+            list(fetch_executor.map(fetch_CIK, CIK_list))
+        raw_queue.put(None)  # tell parser stage every CIK has been fetched
+
+    stop_stats = threading.Event()
+
+    def log_stats():
+        while not stop_stats.wait(stats_interval):
+            stats.log(raw_queue.qsize())
+
+    logging.info(f"\nSTARTING PIPELINE")
+    threading.Thread(target=log_stats, daemon=True).start()
+    fetch_thread = threading.Thread(target=fetch_all)
+    fetch_thread.start()
+    with ProcessPoolExecutor(max_workers=parse_workers) as parse_executor:
+        while True:
+            item = raw_queue.get()
+            if item is None:
+                break
+            CIK, accession_num, submission = item
+            parse_slots.acquire()
+            stats.add('submitted')
+            future = parse_executor.submit(parse_submission_worker, submission, FILING_TYPE, parser)
+            future.add_done_callback(functools.partial(on_parsed, CIK, accession_num, submission))
+    fetch_thread.join()
+    writer.shutdown(wait=True)
+    if catalog is not None:
+        catalog.close()
+    stop_stats.set()
+    stats.log(raw_queue.qsize())
+    logging.info(f"FINISHING PIPELINE\n")
+
+
+def check_text_parity(submission_paths: list, FILING_TYPE: str, sample_size: int = 50, seed: int = 0):
+    """
+        compare normalized text given by the "lxml" parser against the "html5" parser, page by page, on a sample of
+        full submissions saved to local (e.g. bodies stored by SEC_fetch.ResponseCache)
+        args:
+            submission_paths: list; file paths of full submissions (.txt)
+            FILING_TYPE: str; e.g. 8-K
+            sample_size: int; number of submissions to sample, all of them if None
+            seed: int; seed of sampling
+        returns:
+            pd.DataFrame; one row per page with columns submission, document, page, match, diff, plus time spent by
+            each parser in DataFrame.attrs
+    """
+    if sample_size is not None and sample_size < len(submission_paths):
+        submission_paths = random.Random(seed).sample(list(submission_paths), sample_size)
+    rows = list()
+    parse_time = {'html5': 0.0, 'lxml': 0.0}
+    for submission_path in submission_paths:
+        results = dict()
+        for parser in parse_time:
+            master_dict_filing = dict()
+            t0 = time.time()
+            with open(submission_path, 'rb') as f:
+                parse_submission(f, master_dict_filing, FILING_TYPE, parser)
+            parse_time[parser] += time.time() - t0
+            results[parser] = master_dict_filing['filing_documents']
+        for document in results['html5']:
+            html5_pages = results['html5'][document]['normalized_text']
+            lxml_pages = results['lxml'].get(document, dict()).get('normalized_text', dict())
+            for page in html5_pages.keys() | lxml_pages.keys():
+                html5_text, lxml_text = html5_pages.get(page, ""), lxml_pages.get(page, "")
+                diff = "" if html5_text == lxml_text else "\n".join(
+                    difflib.unified_diff(html5_text.split(" "), lxml_text.split(" "), 'html5', 'lxml', lineterm="", n=2))
+                rows.append({'submission': submission_path, 'document': document, 'page': page,
+                             'match': html5_text == lxml_text, 'diff': diff})
+    df = pd.DataFrame(rows, columns=['submission', 'document', 'page', 'match', 'diff'])
+    df.attrs['parse_time'] = parse_time
+    logging.info(f"text parity: {df['match'].sum()}/{len(df)} page(s) match; parse time html5 "
+                 f"{parse_time['html5']:.2f}s, lxml {parse_time['lxml']:.2f}s")
+    return df
+
+
+def filing_pages(filing_dict: dict, document_types: tuple = None, source: str = "") -> list:
+    """
+        pages of a filing's documents, as stored by download_filings
+        args:
+            document_types: tuple; only read documents whose type starts with one of them, e.g. ('8-K', 'EX-99')
+            source: str; logged with documents without text
+        returns:
+            list of tuple (document ("EX-99.1_2"), page ("1"), text ("..."))
+    """
+    document_dict = filing_dict['master_dict_filing']['filing_documents']
+    pages = list()
+    for document in document_dict:
+        # document is keyed by "{type}_{sequence}", e.g. "EX-99.1_2"
+        if document_types is not None and not document.rsplit("_", 1)[0].startswith(document_types):
+            continue
+        if 'normalized_text' in document_dict[document]:
+            pages.extend((document, page, text) for page, text in document_dict[document]['normalized_text'].items())
+        else:
+            logging.info(f"{source}, {document}")
+    return pages
 
 
-def read_filing_text(CIK_list: list, dateb: str, FILING_DATA_PATH: str, FILING_TYPE: str) -> dict:
+def iter_filing_pages(CIK_list: list, dateb: str, FILING_DATA_PATH: str, FILING_TYPE: str, date_from=None,
+                      date_to=None, document_types: list = None, STORE_PATH: str = None):
+    """
+        lazily read every filing's pages for each CIK in CIK_list, one CIK's json file in memory at a time
+        args:
+            see iter_filings
+        yields:
+            tuple (CIK, accession_num, filing_date (Timestamp('2019-12-04 00:00:00')),
+                   list of tuple (document ("EX-99.1_2"), page ("1"), text ("...")))
+    """
+    if STORE_PATH is not None:
+        yield from filing_store.iter_filing_pages(STORE_PATH, CIK_list, date_from, date_to, document_types)
+        return
+    date_from = pd.to_datetime(date_from) if date_from is not None else None
+    date_to = pd.to_datetime(date_to) if date_to is not None else None
+    document_types = tuple(document_types) if document_types is not None else None
+    for CIK in CIK_list:
+        file_name = f"{FILING_TYPE}_{str(CIK)}_{dateb}.json"
+        with open(f"{FILING_DATA_PATH}{file_name}") as f:
+            filing_dicts = json.load(f)
+        for asscession_num, filing_dict in filing_dicts.items():  # iterate through every filing
+            # read date
+            filing_date = pd.to_datetime(filing_dict['file_info']['filing_date'])
+            if (date_from is not None and filing_date < date_from) or (date_to is not None and filing_date > date_to):
+                continue
+            yield CIK, asscession_num, filing_date, filing_pages(filing_dict, document_types,
+                                                                 f"{file_name}, {asscession_num}")
+        # release this CIK's filings before reading the next file
+        del filing_dicts
+
+
+def iter_filings(CIK_list: list, dateb: str, FILING_DATA_PATH: str, FILING_TYPE: str, date_from=None, date_to=None,
+                 document_types: list = None, STORE_PATH: str = None):
+    """
+        lazily read every filing's date and text for each CIK in CIK_list, one CIK's json file in memory at a time
+        args:
+            CIK_list: list
+            dateb: str
+            FILING_DATA_PATH: str; e.g. "/Users/Data/"
+            FILING_TYPE: str; e.g. "8-K", "10-K", etc
+            date_from, date_to: str or datetime; only yield filings with filing date in range (inclusive)
+            document_types: list; only read text of documents whose type starts with one of them, e.g. ['8-K', 'EX-99']
+            STORE_PATH: str; if given, filings are read from the Parquet store of filing_store (see
+                filing_store.convert_json_to_parquet) instead of json files, only rows of CIK_list and the date range
+                and the columns needed are read
+        yields:
+            tuple (CIK, accession_num, filing_date (Timestamp('2019-12-04 00:00:00')), filing_text ("..."))
+    """
+    for CIK, asscession_num, filing_date, pages in iter_filing_pages(CIK_list, dateb, FILING_DATA_PATH, FILING_TYPE,
+                                                                     date_from, date_to, document_types, STORE_PATH):
+        # combine all documents in a single string
+        yield CIK, asscession_num, filing_date, " ".join(text for _, _, text in pages)
+
+
+def read_filing_text(CIK_list: list, dateb: str, FILING_DATA_PATH: str, FILING_TYPE: str,
+                     STORE_PATH: str = None) -> dict:
     """
         returns a dictionary that contains all filings' date and texts for each CIK in CIK_list
         with the following structure:
@@ -306,11 +986,13 @@ def read_filing_text(CIK_list: list, dateb: str, FILING_DATA_PATH: str, FILING_T
                     - asscession_num
                         - filing_date (Timestamp('2019-12-04 00:00:00'))
                         - filing_text ("...")
+        holds every filing of CIK_list in memory, use iter_filings to read one filing at a time instead
         args:
             CIK_list: list
             dateb: str
             FILING_DATA_PATH: str; e.g. "/Users/Data/"
             FILING_TYPE: str; e.g. "8-K", "10-K", etc
+            STORE_PATH: str; read filings from the Parquet store instead of json files, see iter_filings
         return:
             dict (master_filing_text_dict)
 
@@ -323,45 +1005,16 @@ def read_filing_text(CIK_list: list, dateb: str, FILING_DATA_PATH: str, FILING_T
                         level=logging.INFO,
                         format='%(levelname)s: %(asctime)s - %(message)s',
                         datefmt='%m/%d/%Y %I:%M:%S')
-    # list of file path for filings with CIK from CIK_list
-    filing_path_list = [f"{FILING_DATA_PATH}{FILING_TYPE}_{str(CIK)}_{dateb}.json" for CIK in CIK_list]
-    # read every CIK's filings json files into a master dictionary
-    master_filing_dict = dict()
-    for file_path in filing_path_list:
-        file_name = file_path.split("/")[-1]
-        with open(file_path) as f:
-            master_filing_dict[file_name] = json.load(f)
-
-    # read every CIK's filings in text into a master dictionary
+    # read every CIK's filings in text into a master dictionary; files without any filing are skipped
     master_filing_text_dict = dict()
-    # read each filing in a dict of filings for a given CIK
-    for filing_file_name in master_filing_dict:  # iterate through every json file (that contains multiple filings by date)
-        if not master_filing_dict[filing_file_name]:
-            continue  # skip empty files
-        # intialize dict for storing filing date and texts
-        master_filing_text_dict[filing_file_name] = dict()
-        for asscession_num in master_filing_dict[filing_file_name]:  # iterate through every filing
-            # initialize dictionary to store date and texts for a filing
-            master_filing_text_dict[filing_file_name][asscession_num] = dict()
-            # initalize variable to simplify json file dict reference
-            filing_dict = master_filing_dict[filing_file_name][asscession_num]
-            # read date
-            filing_date = pd.to_datetime(filing_dict['file_info']['filing_date'])
-            # read and comebine all documents in a single string
-            document_dict = filing_dict['master_dict_filing']['filing_documents']
-            documents_text = list()
-            for document in document_dict:
-                if 'normalized_text' in document_dict[document]:
-                    documents_text.append(list(document_dict[document]['normalized_text'].values()))
-                else:
-                    logging.info(f"{filing_file_name}, {asscession_num}, {document}")
-                    continue
-            # # flatten out documents_text
-            documents_text = sum(documents_text, [])
-
-            # store date, filing texts
-            master_filing_text_dict[filing_file_name][asscession_num]['filing_date'] = filing_date
-            master_filing_text_dict[filing_file_name][asscession_num]['filing_text'] = " ".join(documents_text)
+    for CIK, asscession_num, filing_date, filing_text in iter_filings(CIK_list, dateb, FILING_DATA_PATH,
+                                                                      FILING_TYPE, STORE_PATH=STORE_PATH):
+        file_name = f"{FILING_TYPE}_{str(CIK)}_{dateb}.json"
+        if file_name not in master_filing_text_dict:
+            # intialize dict for storing filing date and texts
+            master_filing_text_dict[file_name] = dict()
+        # store date, filing texts
+        master_filing_text_dict[file_name][asscession_num] = {'filing_date': filing_date, 'filing_text': filing_text}
 
     return master_filing_text_dict
 
@@ -1,6 +1,16 @@
 import multiprocessing
 import os
+import threading
 from utils import SEC_scraping
+from utils import filing_index
+from utils import token_store
+from utils import document_term
+from utils import filing_catalog
+from utils import scheduling
+from utils import signal_cache
+from utils.keyword_matcher import KeywordMatcher
+from utils.tokenizer import Tokenizer
+from utils.worker_pool import worker, worker_pool
 import pandas as pd
 import numpy as np
 import glob
@@ -8,12 +18,10 @@ import time
 import json
 import logging
 import warnings
+import pickle
 import subprocess
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
 from nltk.tokenize import MWETokenizer
 from datetime import timedelta
-from nltk.stem.wordnet import WordNetLemmatizer
 
 warnings.filterwarnings("ignore")
 
@@ -33,17 +41,102 @@ def run_command(cmd):
         print(path, end="")
 
 
+def setup_worker(backtest_class, model_name_plus, model_name, model_param, catalog_path=None):
+    """
+        state of a process of Backtest.run_backtest_chunked, see worker_pool.init_worker: backtester (tokenizer,
+        multi-word expressions, matcher) is built once per process
+    """
+    backtest = backtest_class(model_name_plus=model_name_plus)
+    backtest.prepare(model_param)
+    return {'backtest': backtest, 'model': (model_name, model_param),
+            'catalog': filing_catalog.FilingCatalog(catalog_path, read_only=True) if catalog_path is not None else None}
+
+
+def read_task(task):
+    """
+        filings of a task, either a CIK json file path, or (file path, start, stop) for a slice of the CIK's filings in
+        catalog (in order of filing date)
+        yields:
+            tuple (CIK, accession_num, filing_date, filing_text), as SEC_scraping.iter_filings
+    """
+    file_path, start, stop = (task, None, None) if isinstance(task, str) else task
+    # e.g. 8-K_1177609_20200101.json
+    FILING_TYPE, CIK, dateb = os.path.basename(file_path)[:-len(".json")].split("_")
+    if start is None:
+        yield from SEC_scraping.iter_filings([int(CIK)], dateb, os.path.join(os.path.dirname(file_path), ""),
+                                             FILING_TYPE)
+        return
+    for accession_num, filing_date, _, _, path, offset, length in worker['catalog'].lookup(CIK)[start:stop]:
+        filing_dict = worker['catalog'].read_filing(path, offset, length)
+        pages = SEC_scraping.filing_pages(filing_dict, source=f"{file_path}, {accession_num}")
+        yield int(CIK), accession_num, pd.to_datetime(filing_date), " ".join(text for _, _, text in pages)
+
+
+def run_chunk(tasks):
+    """
+        run backtest model on every filing of a chunk of tasks, read by the worker itself
+        args:
+            tasks: list of tuple (sector, task), see read_task for task
+        returns:
+            tuple (list of (sector, result of func/func_plus) for results that aren't empty, dict of seconds spent per
+            stage and number of documents)
+    """
+    model_name, model_param = worker['model']
+    backtest = worker['backtest']
+    func = backtest.func_plus if backtest.model_name_plus else backtest.func
+    results = list()
+    timing = {'read': 0.0, 'model': 0.0, 'documents': 0}
+    for sector, task in tasks:
+        filings = read_task(task)
+        while True:
+            t0 = time.perf_counter()
+            filing = next(filings, None)
+            t1 = time.perf_counter()
+            timing['read'] += t1 - t0
+            if filing is None:
+                break
+            CIK, accession_num, filing_date, filing_text = filing
+            result = func((model_name, model_param, (CIK, {'filing_date': filing_date, 'filing_text': filing_text})))
+            timing['model'] += time.perf_counter() - t1
+            timing['documents'] += 1
+            if result:
+                results.append((sector, result))
+    return results, timing
+
+
 class Backtest(object):
 
     def __init__(self, model_name_plus=False):
         # self.result = dict()
         # for debugging deadlock, let's see if it's a difference between list and dict
         self.model_name_plus = model_name_plus
+        # token_store.TokenStore; if set, documents without 'filing_text' are read from it as token ids by accession
+        self.token_store = None
         if self.model_name_plus:
             self.result = list()
         else:
             self.result = dict()
 
+    def __getstate__(self):
+        # sent with every task of run_backtest: results stay in the parent, and the token store is sent as its path
+        # instead of its vocabulary, every process opens it once
+        state = self.__dict__.copy()
+        state['result'] = type(self.result)()
+        if self.token_store is not None:
+            state['token_store'] = (self.token_store.STORE_PATH, self.token_store.tokenizer)
+        return state
+
+    def __setstate__(self, state):
+        if isinstance(state['token_store'], tuple):
+            STORE_PATH, tokenizer = state['token_store']
+            # {(STORE_PATH, tokenizer version): token_store.TokenStore} opened by this process
+            token_stores = worker.setdefault('token_stores', dict())
+            key = (STORE_PATH, tokenizer.version)
+            if key not in token_stores:
+                token_stores[key] = token_store.TokenStore(STORE_PATH, tokenizer)
+            state['token_store'] = token_stores[key]
+        self.__dict__.update(state)
+
     def my_callback(self, result):
 
         # if result not empty
@@ -58,10 +151,18 @@ class Backtest(object):
                 # multiple batches of backtest_model parameter case
                 self.result.append(result)
 
+    def document_text(self, document):
+        """
+            text of a document, or its token ids (np.ndarray) if it is only referenced by accession number
+        """
+        if 'filing_text' in document:
+            return document['filing_text']
+        return self.token_store.filing_ids(document['accession_num'])
+
     def func(self, args):
         (model_name, model_param, CIK_document) = args
         CIK, document = CIK_document
-        document_text = document['filing_text']
+        document_text = self.document_text(document)
         document_date = document['filing_date']
         backtest_model = self.__getattribute__(model_name)
         if backtest_model(model_param, document_text):
@@ -72,20 +173,46 @@ class Backtest(object):
     def func_plus(self, args):
         raise NotImplementedError()
 
+    def prepare(self, model_param):
+        """
+            set up anything a model needs before it runs, e.g. tokenizer of key words
+        """
+        pass
+
     def aggregate_result_plus(self):
         raise NotImplementedError()
 
-    def run_backtest(self, model_name, model_param, CIK_filing_documents):
+    def run_backtest(self, model_name, model_param, CIK_filing_documents, max_in_flight=None):
+        """
+            args:
+                CIK_filing_documents: iterable of (CIK, filing_document), e.g. a generator over
+                    SEC_scraping.iter_filings; it is consumed lazily, with at most max_in_flight documents
+                    sent to the pool at a time (defaults to 4 per cpu)
+        """
+        # bound number of documents held in pool's task queue, so memory doesn't grow with the iterable
+        in_flight = threading.BoundedSemaphore(max_in_flight or os.cpu_count() * 4)
+
+        def callback(result):
+            try:
+                self.my_callback(result)
+            finally:
+                in_flight.release()
+
+        def error_callback(e):
+            logging.error(f"backtest task failed: {e!r}")
+            in_flight.release()
+
         pool = multiprocessing.Pool(os.cpu_count())
         for CIK_document in CIK_filing_documents:
+            in_flight.acquire()
             # calling the right version of multi-processing func, depending on if we want to process
             # single model param or batches of model param
             if self.model_name_plus:
                 pool.apply_async(self.func_plus, args=((model_name, model_param, CIK_document),),
-                                 callback=self.my_callback)
+                                 callback=callback, error_callback=error_callback)
             else:
                 pool.apply_async(self.func, args=((model_name, model_param, CIK_document),),
-                                 callback=self.my_callback)
+                                 callback=callback, error_callback=error_callback)
         pool.close()
         pool.join()
 
@@ -96,6 +223,96 @@ class Backtest(object):
 
         return self.result
 
+    def run_backtest_chunked(self, model_name, model_param, file_paths, chunk_size=8, max_in_flight=None,
+                             catalog_path=None):
+        """
+            same as run_backtest, but work is sent as chunks of CIK json file paths: every process builds its own
+            backtester in an initializer and reads its own filings, so neither self nor filing text is pickled per
+            document, and results of a chunk come back at once
+            args:
+                file_paths: list of str; CIK json files, e.g. ["/Users/Data/8-K_1177609_20200101.json", ...]
+                chunk_size: int; number of files in a task
+                max_in_flight: int; number of chunks sent to the pool at a time, defaults to 2 per cpu
+                catalog_path: str; filing_catalog.FilingCatalog of the files, see run_backtest_sectors
+        """
+        self.result = self.run_backtest_sectors(model_name, model_param, {None: file_paths}, chunk_size,
+                                                max_in_flight, catalog_path)[None]
+        return self.result
+
+    def run_backtest_sectors(self, model_name, model_param, sector_file_paths, chunk_size=8, max_in_flight=None,
+                             catalog_path=None):
+        """
+            run_backtest_chunked for every sector at once: each CIK json file is read once, tagged with its sector,
+            by a single pool that stays busy across sectors
+            files are dispatched largest first (by size, or number of filings in catalog), small files packed into a
+            chunk, so a big CIK doesn't start last and keep a single process busy at the end
+            args:
+                sector_file_paths: dict; {sector: list of CIK json files}
+                catalog_path: str; filing_catalog.FilingCatalog of the files; if given, a CIK with many filings is split
+                    into subtasks of ranges of its filings
+            returns:
+                dict; {sector: result of run_backtest_chunked}
+        """
+        in_flight = threading.BoundedSemaphore(max_in_flight or os.cpu_count() * 2)
+        timing = {'read': 0.0, 'model': 0.0, 'documents': 0, 'collect': 0.0, 'task_bytes': 0, 'tasks': 0}
+        # collects results of a sector
+        sector_backtests = {sector: type(self)(model_name_plus=self.model_name_plus) for sector in sector_file_paths}
+
+        def callback(chunk_result):
+            try:
+                t0 = time.perf_counter()
+                results, chunk_timing = chunk_result
+                for sector, result in results:
+                    sector_backtests[sector].my_callback(result)
+                for stage in chunk_timing:
+                    timing[stage] += chunk_timing[stage]
+                timing['collect'] += time.perf_counter() - t0
+            finally:
+                in_flight.release()
+
+        def error_callback(e):
+            logging.error(f"backtest chunk failed: {e!r}")
+            in_flight.release()
+
+        t0 = time.perf_counter()
+        # estimate cost of every file, split ones costing more than a task should
+        catalog = filing_catalog.FilingCatalog(catalog_path, read_only=True) if catalog_path is not None else None
+        costs = scheduling.file_costs([file_path for file_paths in sector_file_paths.values()
+                                       for file_path in file_paths], catalog)
+        if catalog is not None:
+            catalog.close()
+        target = scheduling.target_cost(sum(costs.values()), os.cpu_count())
+        tasks = list()
+        for sector, file_paths in sector_file_paths.items():
+            for file_path in file_paths:
+                parts = scheduling.num_parts(costs[file_path], target) if catalog_path is not None else 1
+                if parts == 1:
+                    tasks.append(((sector, file_path), costs[file_path]))
+                    continue
+                # costs are numbers of filings with a catalog
+                for start, stop in scheduling.split_range(costs[file_path], parts):
+                    tasks.append(((sector, (file_path, start, stop)), stop - start))
+        pool = worker_pool(setup_worker, (type(self), self.model_name_plus, model_name, model_param, catalog_path))
+        for chunk in scheduling.lpt_chunks(tasks, target, chunk_size):
+            in_flight.acquire()
+            timing['task_bytes'] += len(pickle.dumps(chunk))
+            timing['tasks'] += 1
+            pool.apply_async(run_chunk, args=(chunk,), callback=callback, error_callback=error_callback)
+        pool.close()
+        pool.join()
+        wall = time.perf_counter() - t0
+        # read and model are summed over processes
+        logging.info(f"\t{timing['documents']} documents in {timing['tasks']} tasks "
+                     f"({timing['task_bytes']} bytes pickled), wall {wall:.1f}s, read {timing['read']:.1f}s, "
+                     f"model {timing['model']:.1f}s, collect {timing['collect']:.1f}s")
+
+        res = dict()
+        for sector, sector_backtest in sector_backtests.items():
+            if self.model_name_plus:
+                sector_backtest.aggregate_result_plus()
+            res[sector] = sector_backtest.result
+        return res
+
 
 class My_Backtest(Backtest):
     """
@@ -109,44 +326,141 @@ class My_Backtest(Backtest):
     def __init__(self, model_name_plus=False):
         super(My_Backtest, self).__init__(model_name_plus)
         self.mweTokenizer = MWETokenizer(separator=" ")
+        self.tokenizer = Tokenizer()
+        # KeywordMatcher of every basket of model_param, on terms and on token store ids
+        self.matcher = None
+        self.id_matcher = None
 
     def set_mwe(self, model_param):
         """
             load multi-word expressions
         """
         if self.model_name_plus:
-            # initialize tokenizer that detects multi-word expression
-            for key_word in [val for list_item in model_param.values() for val in list_item]:
-                if " " in key_word:
-                    self.mweTokenizer.add_mwe(tuple(key_word.split(" ")))
+            # compile every basket, multi-word expressions included, into a single matcher
+            self.matcher = KeywordMatcher(model_param)
         else:
             # initialize tokenizer that detects multi-word expression
             for key_word in model_param:
                 if " " in key_word:
                     self.mweTokenizer.add_mwe(tuple(key_word.split(" ")))
 
+    def prepare(self, model_param):
+        self.set_mwe(model_param)
+
+    def set_token_store(self, filing_tokens):
+        """
+            read documents referenced by accession number from token store (see Backtest.document_text)
+        """
+        self.token_store = filing_tokens
+        if self.matcher is not None:
+            self.id_matcher = KeywordMatcher(self.matcher.baskets, term_ids=filing_tokens.term_ids)
+
     def func_plus(self, args):
         """
 
         """
         (model_name, model_param, CIK_document) = args
         CIK, document = CIK_document
-        document_text = document['filing_text']
+        document_text = self.document_text(document)
         document_date = document['filing_date']
         backtest_model = self.__getattribute__(model_name)
         return backtest_model(model_param, document_text, CIK, document_date)
 
+    def func_cached(self, args):
+        """
+            score a document against every basket, for run_backtest_cached
+            returns:
+                tuple (CIK, accession_num, filing_date, list of baskets the document is a signal event of)
+        """
+        (model_name, baskets, quantifier, CIK_document) = args
+        CIK, document = CIK_document
+        document_text = self.document_text(document)
+        backtest_model = self.__getattribute__(model_name)
+        if self.model_name_plus:
+            hits = list(backtest_model(baskets, document_text, CIK, document['filing_date'], quantifier))
+        else:
+            hits = [basket for basket in baskets if backtest_model(baskets[basket], document_text, quantifier)]
+        return CIK, document['accession_num'], document['filing_date'], hits
+
+    def run_backtest_cached(self, model_name, model_param, CIK_filing_documents, cache, quantifier='ANY',
+                            max_in_flight=None):
+        """
+            same as run_backtest, but only documents not scored yet against every basket of model_param (by basket
+            definition, see signal_cache.basket_key) are sent to the pool; result is assembled from cache
+            args:
+                CIK_filing_documents: iterable of (CIK, filing_document); filing_document has keys 'accession_num',
+                    'filing_date' and 'filing_text' (or the accession number only, see Backtest.document_text)
+                cache: signal_cache.SignalCache; built with self.tokenizer.version
+                quantifier: str; 'ANY' or 'ALL', part of every basket's definition
+        """
+        # a single set of key words is scored as a basket of its own
+        baskets = model_param if self.model_name_plus else {model_name: model_param}
+        keys = {basket: signal_cache.basket_key(baskets[basket], quantifier, model_name) for basket in baskets}
+        scored = {basket: cache.scored_accessions(keys[basket]) for basket in baskets}
+        in_flight = threading.BoundedSemaphore(max_in_flight or os.cpu_count() * 4)
+        num_scored = [0]
+
+        def callback(result):
+            try:
+                CIK, accession_num, filing_date, hits = result
+                # every basket is scored at once, whichever were missing
+                cache.add(CIK, accession_num, filing_date, list(keys.values()), [keys[basket] for basket in hits])
+                num_scored[0] += 1
+                if num_scored[0] % 1000 == 0:
+                    cache.commit()
+            finally:
+                in_flight.release()
+
+        def error_callback(e):
+            logging.error(f"backtest task failed: {e!r}")
+            in_flight.release()
+
+        documents = dict()
+        pool = multiprocessing.Pool(os.cpu_count())
+        for CIK, document in CIK_filing_documents:
+            accession_num = document['accession_num']
+            documents[accession_num] = (CIK, document['filing_date'])
+            if all(accession_num in scored[basket] for basket in baskets):
+                continue
+            in_flight.acquire()
+            pool.apply_async(self.func_cached, args=((model_name, baskets, quantifier, (CIK, document)),),
+                             callback=callback, error_callback=error_callback)
+        pool.close()
+        pool.join()
+        cache.commit()
+        logging.info(f"\t{num_scored[0]} of {len(documents)} documents scored, others read from cache")
+
+        res = dict()
+        for basket in baskets:
+            hits = cache.hits(keys[basket])
+            signal_dict = dict()
+            for accession_num in documents:
+                if accession_num in hits:
+                    CIK, filing_date = documents[accession_num]
+                    signal_dict.setdefault(CIK, list()).append(filing_date)
+            if signal_dict:
+                res[basket] = signal_dict
+        self.result = res if self.model_name_plus else res.get(model_name, dict())
+        return self.result
+
     def contains_key_words(self, key_words, text, quantifier='ANY'):
         """
 
         """
-        # tokenize text as English
-        text_tokenized = word_tokenize(text, language='English')
-        # convert to lowercases and remove puncutation
-        text_tokenized = [word.lower() for word in text_tokenized if word.isalpha()]
-        # remvoe English stop words, lematize token
-        wordlemmatizer = WordNetLemmatizer()
-        text_tokenized = [wordlemmatizer.lemmatize(word) for word in text_tokenized if word not in stopwords.words('english')]
+        if isinstance(text, np.ndarray):
+            # token ids from token store, already tokenized; multi-word expressions are joined as mweTokenizer does
+            # (see KeywordMatcher), so a word inside one isn't found on its own
+            baskets = {'key_words': key_words}
+            if self.id_matcher is None or self.id_matcher.baskets != KeywordMatcher.normalize(baskets):
+                self.id_matcher = KeywordMatcher(baskets, term_ids=self.token_store.term_ids)
+            found = self.id_matcher.find(text.tolist())
+            if quantifier.upper() == 'ALL':
+                return all([key_word in found for key_word in key_words])
+            elif quantifier.upper() == 'ANY':
+                return any([key_word in found for key_word in key_words])
+
+        # tokenize text, remove English stop words, lemmatize token
+        text_tokenized = self.tokenizer.tokenize(text)
 
         # if there're multi-word expression in KEY_WORDS, then tokenize the expression
         if self.mweTokenizer.mwes:
@@ -163,37 +477,23 @@ class My_Backtest(Backtest):
         """
 
         """
-        # tokenize text as English
-        text_tokenized = word_tokenize(text, language='English')
-        # convert to lowercases and remove punctuation
-        text_tokenized = [word.lower() for word in text_tokenized if word.isalpha()]
-        # remove English stop words, e.g.
-        wordlemmatizer = WordNetLemmatizer()
-        text_tokenized = [wordlemmatizer.lemmatize(word) for word in text_tokenized if word.lower() not in stopwords.words('english')]
-
-        # if there're multi-word expression in key words, then tokenize the expression
-        if self.mweTokenizer.mwes:
-            text_tokenized = self.mweTokenizer.tokenize(text_tokenized)
-
-        freq_dist = list(pd.Series(text_tokenized, dtype="str").unique())
+        # built once by set_mwe; baskets are compared as the matcher holds them, not as passed
+        if self.matcher is None or self.matcher.baskets != KeywordMatcher.normalize(sub_model_key_words):
+            self.matcher = KeywordMatcher(sub_model_key_words)
+            self.id_matcher = None
+        if isinstance(text, np.ndarray):
+            # token ids from token store, already tokenized
+            if self.id_matcher is None:
+                self.id_matcher = KeywordMatcher(sub_model_key_words, term_ids=self.token_store.term_ids)
+            baskets = self.id_matcher.match(text.tolist(), quantifier)
+        else:
+            # tokenize text, remove English stop words, lemmatize token
+            text_tokenized = self.tokenizer.tokenize(text)
+            # scan tokens once for key words of every basket
+            baskets = self.matcher.match(text_tokenized, quantifier)
 
-        res = dict()
-        for word in freq_dist:
-            # if every sub model has indicated this text contained its keywords, no need to check further
-            if len(res) == len(sub_model_key_words):
-                break
-            for basket in sub_model_key_words:
-                # get keywords specific to a basket
-                key_words = sub_model_key_words[basket]
-                # save to res, if text contains word from keywords
-                if word in key_words:
-                    # add to res
-                    if basket not in res:
-                        res[basket] = dict()
-                    if CIK not in res[basket]:
-                        res[basket][CIK] = list()
-                    res[basket][CIK].append(document_date)
-        return res
+        # e.g. {'B': {1410636: [Timestamp('2019-05-01 00:00:00')]}}
+        return {basket: {CIK: [document_date]} for basket in baskets}
 
     def aggregate_result_plus(self):
         """
@@ -294,10 +594,45 @@ if __name__ == '__main__':
     FILING_TYPE = "8-K"
     FILING_DATA_PATH = f"/Users/codywan/Data/SEC Edgar Scraping/{FILING_TYPE}/"
     DATEB = "20200101"
+    # Parquet store of filings (see filing_store.convert_json_to_parquet); if given, filings are read from it instead
+    # of json files, only rows and columns of the CIKs read
+    STORE_PATH = None
     # construct a list of CIK from all filings
     CIK_list = [int(filing_path.split("/")[-1].split("_")[1]) for filing_path in
                 glob.glob(FILING_DATA_PATH + "*.json")]
     logging.info(f"number of CIK: {len(CIK_list)}")
+    # inverted index of filings (see filing_index.InvertedIndex); if given, key words are looked up in the index
+    # instead of re-tokenizing every filing; filings not in the index yet are added first
+    INDEX_PATH = None
+    # if set, the index of INDEX_PATH is a filing_index.PositionalIndex: key words are matched as phrases on positions
+    # of terms, so baskets of any multi-word expressions (or "carbon NEAR/5 neutral") are evaluated without a rebuild
+    POSITIONAL_INDEX = False
+    # if set, a sector's filings are tokenized once into a document-term matrix (see document_term) and every basket
+    # is evaluated on its columns
+    DOCUMENT_TERM_MATRIX = False
+    # if set, filings are read by pool processes themselves, in chunks of CIK json files (see run_backtest_chunked)
+    CHUNKED = False
+    # filing_catalog.FilingCatalog of FILING_DATA_PATH, if built; chunked runs split CIKs with many filings with it
+    CATALOG_PATH = None
+    # if set, results of every (basket, filing) are kept in signal_cache.SignalCache, and only filings not scored yet
+    # against a basket are tokenized (see run_backtest_cached)
+    SIGNAL_CACHE_PATH = None
+    key_words = [val for list_item in MODEL_PARAM.values() for val in list_item] if MODEL_NAME_PLUS else MODEL_PARAM
+    if INDEX_PATH is not None:
+        if POSITIONAL_INDEX:
+            inverted_index = filing_index.PositionalIndex(INDEX_PATH)
+        else:
+            inverted_index = filing_index.InvertedIndex(INDEX_PATH, mwes=[key_word for key_word in key_words
+                                                                           if " " in key_word])
+        inverted_index.add_filings(SEC_scraping.iter_filings(CIK_list, DATEB, FILING_DATA_PATH, FILING_TYPE,
+                                                             STORE_PATH=STORE_PATH))
+    # token store of filings (see token_store.TokenStore); if given, filings are tokenized once and every backtest
+    # reads their token ids instead of text; filings not in the store yet are added first
+    TOKEN_STORE_PATH = None
+    if TOKEN_STORE_PATH is not None:
+        filing_tokens = token_store.TokenStore(TOKEN_STORE_PATH)
+        filing_tokens.add_filings(SEC_scraping.iter_filing_pages(CIK_list, DATEB, FILING_DATA_PATH, FILING_TYPE,
+                                                                 STORE_PATH=STORE_PATH))
 
     # linking file for CIK and NAICS sector classification code
     ccmlinktable = pd.read_csv("/Users/codywan/Data/WRDS Data/crspa_ccmlinktable.csv").replace("", np.NaN)
@@ -312,7 +647,34 @@ if __name__ == '__main__':
     NAICS_sector_name = list(NAICS_sectors.values())
 
     time_count = list()
-    for NACIS_code, SECTOR in zip(NAICS_sector_code, NAICS_sector_name):
+    # if set, every CIK json file is read once, tagged with its sector, by a single pool for all sectors
+    CROSS_SECTOR = False
+    if CROSS_SECTOR:
+        t0 = time.time()
+        sector_of_code = {code: SECTOR for NACIS_code, SECTOR in zip(NAICS_sector_code, NAICS_sector_name)
+                          for code in NACIS_code}
+        sector_file_paths = {SECTOR: list() for SECTOR in NAICS_sector_name}
+        for CIK in CIK_list:
+            SECTOR = sector_of_code.get(str(CIK_NAICS_mapping.get(CIK, ""))[:2])
+            if SECTOR is not None:
+                sector_file_paths[SECTOR].append(f"{FILING_DATA_PATH}{FILING_TYPE}_{str(CIK)}_{DATEB}.json")
+        my_backtest = My_Backtest(model_name_plus=MODEL_NAME_PLUS)
+        sector_results = my_backtest.run_backtest_sectors(model_name=MODEL_NAME, model_param=MODEL_PARAM,
+                                                          sector_file_paths=sector_file_paths,
+                                                          catalog_path=CATALOG_PATH)
+        for SECTOR in NAICS_sector_name:
+            logging.info(f"{len(sector_file_paths[SECTOR])} CIK(s) for {SECTOR}")
+            My_Backtest.save_to_local(signal_dict=sector_results[SECTOR],
+                                      model_name_plus=MODEL_NAME_PLUS,
+                                      model_name=MODEL,
+                                      model_param=MODEL_PARAM,
+                                      sector=SECTOR
+                                      )
+        elapsed = time.time() - t0
+        time_count.append(elapsed)
+        logging.info(f"all sectors, time elapsed: {str(timedelta(seconds=elapsed))}")
+    # sectors one at a time, unless all were run at once above
+    for NACIS_code, SECTOR in (() if CROSS_SECTOR else zip(NAICS_sector_code, NAICS_sector_name)):
         """ e.g. 
             SECTOR = "Professional, Scientific, and Technical Services"
             NACIS_code = ['54']
@@ -327,29 +689,67 @@ if __name__ == '__main__':
         # print how many CIKs in this sector
         logging.info(f"{len(sector_CIK_list)} CIK(s) for {NACIS_code}, {SECTOR}")
         print(f"{len(sector_CIK_list)} CIK(s) for {NACIS_code}, {SECTOR}")
-        # read filing text
-        master_filing_text_dict = SEC_scraping.read_filing_text(sector_CIK_list, DATEB, FILING_DATA_PATH, FILING_TYPE)
-        logging.info(f"\t{len(master_filing_text_dict)}/{len(sector_CIK_list)} non-empty file read")
-        print(f"\t{len(master_filing_text_dict)}/{len(sector_CIK_list)} non-empty file read")
-
-        CIK_filing_document = list()
-        # iterate through every master filing json file (contains a CIK's all historical filing)
-        for file in master_filing_text_dict:
-            CIK = int(file.split('_')[1])  # extract CIK number
-            for accession_num in master_filing_text_dict[file]:
-                # (CIK, filing_document); filing_document has key 'filing_text', 'filing_date'
-                CIK_filing_document.append((CIK, master_filing_text_dict[file][accession_num]))
-        print(f"\t{len(CIK_filing_document)} documents")
-
-        # initialize backtestor
-        # when model_name_plus is set to True, backtest model runs on batches of model parameters
-        my_backtest = My_Backtest(model_name_plus=MODEL_NAME_PLUS)
-        my_backtest.set_mwe(model_param=MODEL_PARAM)
-        res = my_backtest.run_backtest(
-            model_name=MODEL_NAME,
-            model_param=MODEL_PARAM,
-            CIK_filing_documents=CIK_filing_document
-        )
+        # read filing text lazily, one filing at a time
+        # (CIK, filing_document); filing_document has key 'filing_text', 'filing_date'
+        document_count = [0]
+
+        def CIK_filing_documents():
+            if TOKEN_STORE_PATH is not None:
+                # workers read token ids of a filing from the store by accession number
+                for CIK in sector_CIK_list:
+                    for accession_num, filing_date in filing_tokens.filings(CIK):
+                        document_count[0] += 1
+                        yield CIK, {'filing_date': pd.to_datetime(filing_date), 'accession_num': accession_num}
+                return
+            for CIK, accession_num, filing_date, filing_text in SEC_scraping.iter_filings(
+                    sector_CIK_list, DATEB, FILING_DATA_PATH, FILING_TYPE, STORE_PATH=STORE_PATH):
+                document_count[0] += 1
+                yield CIK, {'filing_date': filing_date, 'filing_text': filing_text, 'accession_num': accession_num}
+
+        if INDEX_PATH is not None:
+            # evaluate key words on postings of the index
+            if MODEL_NAME_PLUS:
+                res = inverted_index.evaluate_baskets(MODEL_PARAM, CIK_list=sector_CIK_list)
+            else:
+                res = inverted_index.evaluate(MODEL_PARAM, CIK_list=sector_CIK_list)
+        elif DOCUMENT_TERM_MATRIX:
+            dtm = document_term.DocumentTermMatrix(
+                SEC_scraping.iter_filings(sector_CIK_list, DATEB, FILING_DATA_PATH, FILING_TYPE, STORE_PATH=STORE_PATH),
+                mwes=[key_word for key_word in key_words if " " in key_word])
+            logging.info(f"\t{dtm.matrix.shape[0]} documents")
+            if MODEL_NAME_PLUS:
+                res = dtm.evaluate_baskets(MODEL_PARAM)
+            else:
+                res = dtm.evaluate(MODEL_PARAM)
+        else:
+            # initialize backtestor
+            # when model_name_plus is set to True, backtest model runs on batches of model parameters
+            my_backtest = My_Backtest(model_name_plus=MODEL_NAME_PLUS)
+            my_backtest.set_mwe(model_param=MODEL_PARAM)
+            if TOKEN_STORE_PATH is not None:
+                my_backtest.set_token_store(filing_tokens)
+            if SIGNAL_CACHE_PATH is not None:
+                res = my_backtest.run_backtest_cached(
+                    model_name=MODEL_NAME,
+                    model_param=MODEL_PARAM,
+                    CIK_filing_documents=CIK_filing_documents(),
+                    cache=signal_cache.SignalCache(SIGNAL_CACHE_PATH, my_backtest.tokenizer.version)
+                )
+            elif CHUNKED:
+                res = my_backtest.run_backtest_chunked(
+                    model_name=MODEL_NAME,
+                    model_param=MODEL_PARAM,
+                    file_paths=[f"{FILING_DATA_PATH}{FILING_TYPE}_{str(CIK)}_{DATEB}.json" for CIK in sector_CIK_list],
+                    catalog_path=CATALOG_PATH
+                )
+            else:
+                res = my_backtest.run_backtest(
+                    model_name=MODEL_NAME,
+                    model_param=MODEL_PARAM,
+                    CIK_filing_documents=CIK_filing_documents()
+                )
+                logging.info(f"\t{document_count[0]} documents")
+                print(f"\t{document_count[0]} documents")
 
         # res := {"A":{CIK_1:[], CIK_2:[]}, "B":{CIK_1:[],} ,...}
         My_Backtest.save_to_local(signal_dict=res,
@@ -0,0 +1,128 @@
+import os
+import csv
+import json
+import glob
+import time
+import logging
+import itertools
+import pandas as pd
+from datetime import timedelta
+from utils import SEC_scraping
+from utils.tokenizer import Tokenizer
+from utils.keyword_matcher import KeywordMatcher
+from utils.worker_pool import worker, worker_pool
+
+
+def setup_worker(baskets, quantifier):
+    """
+        state of a sweeping process, see worker_pool.init_worker
+    """
+    # every basket is compiled once per process, not sent with every filing
+    return {'tokenizer': Tokenizer(), 'matcher': KeywordMatcher(baskets), 'quantifier': quantifier}
+
+
+def match_filing(args):
+    """
+        returns:
+            tuple (CIK, filing_date, list of basket ids hit by filing)
+    """
+    CIK, accession_num, filing_date, filing_text = args
+    return CIK, filing_date, worker['matcher'].match(worker['tokenizer'].tokenize(filing_text), worker['quantifier'])
+
+
+def load_baskets(BASKET_FILE_PATH: str) -> dict:
+    """
+        read baskets from file, either
+            .json: {basket_id: [key words]}
+            .csv: one key word per row, columns 'basket_id', 'key_word'
+        returns:
+            dict; {basket_id: [key words]}
+    """
+    if BASKET_FILE_PATH.endswith(".json"):
+        with open(BASKET_FILE_PATH) as f:
+            return {str(basket_id): list(key_words) for basket_id, key_words in json.load(f).items()}
+    df = pd.read_csv(BASKET_FILE_PATH, dtype=str).dropna()
+    return {basket_id: list(group['key_word']) for basket_id, group in df.groupby('basket_id', sort=False)}
+
+
+def key_word_combinations(key_words: list, sizes=(1, 2)) -> dict:
+    """
+        every combination of key words as a basket, e.g. ['a', 'b'] -> {'a': ['a'], 'b': ['b'], 'a+b': ['a', 'b']}
+        args:
+            sizes: iterable of int; numbers of key words in a basket
+    """
+    return {"+".join(combination): list(combination) for size in sizes
+            for combination in itertools.combinations(key_words, size)}
+
+
+def sweep_baskets(baskets: dict, filings, OUTPUT_PATH: str, quantifier: str = 'ANY',
+                  processes: int = None) -> pd.DataFrame:
+    """
+        evaluate every basket in a single pass over filings, each filing is tokenized once for all baskets
+        writes:
+            {OUTPUT_PATH}/signal.csv: one row per signal event, columns basket_id, CIK, date
+            {OUTPUT_PATH}/basket_counts.csv: number of signal events and CIKs of every basket
+        args:
+            baskets: dict; {basket_id: [key words]}, see load_baskets and key_word_combinations
+            filings: iterable of (CIK, accession_num, filing_date, filing_text), e.g. SEC_scraping.iter_filings
+            OUTPUT_PATH: str; directory of output
+        returns:
+            pd.DataFrame; basket_counts.csv
+    """
+    os.makedirs(OUTPUT_PATH, exist_ok=True)
+    num_events = dict.fromkeys(baskets, 0)
+    CIKs = {basket_id: set() for basket_id in baskets}
+    num_filings = 0
+    with worker_pool(setup_worker, (baskets, quantifier), processes) as pool, \
+            open(os.path.join(OUTPUT_PATH, "signal.csv"), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['basket_id', 'CIK', 'date'])
+        for CIK, filing_date, basket_ids in pool.imap(match_filing, filings, chunksize=16):
+            num_filings += 1
+            date = pd.to_datetime(filing_date).strftime('%Y-%m-%d')
+            for basket_id in basket_ids:
+                writer.writerow([basket_id, CIK, date])
+                num_events[basket_id] += 1
+                CIKs[basket_id].add(CIK)
+            if num_filings % 10000 == 0:
+                logging.info(f"swept {num_filings} filing(s)")
+    logging.info(f"swept {len(baskets)} basket(s) over {num_filings} filing(s)")
+    df = pd.DataFrame({'basket_id': list(baskets),
+                       'num_events': [num_events[basket_id] for basket_id in baskets],
+                       'num_CIK': [len(CIKs[basket_id]) for basket_id in baskets]})
+    df.to_csv(os.path.join(OUTPUT_PATH, "basket_counts.csv"), index=False)
+    return df
+
+
+if __name__ == "__main__":
+    MODEL = "key_word_sweep"
+    # file of baskets (see load_baskets); if None, every pair of KEY_WORDS is a basket
+    BASKET_FILE_PATH = None
+    KEY_WORDS = ['carbon neutral', 'carbon footprint', 'clean water', 'waste management', 'pollution mitigation',
+                 'climate change', 'global warming', 'corporate social responsibility', 'diverse workforce',
+                 'labor standard', 'customer privacy', 'community impact', 'executive compensation', 'sustainability']
+    QUANTIFIER = 'ANY'
+
+    if not os.path.exists(f"backtests/{MODEL}/"):
+        os.mkdir(f"backtests/{MODEL}/")
+    logging.basicConfig(filename=f"backtests/{MODEL}/backtest_log.txt",
+                        filemode='a',
+                        level=logging.INFO,
+                        format='%(levelname)s: %(asctime)s - %(message)s',
+                        datefmt='%m/%d/%Y %I:%M:%S')
+
+    # filing json file hyper-parameters
+    FILING_TYPE = "8-K"
+    FILING_DATA_PATH = f"/Users/codywan/Data/SEC Edgar Scraping/{FILING_TYPE}/"
+    DATEB = "20200101"
+    CIK_list = [int(filing_path.split("/")[-1].split("_")[1]) for filing_path in
+                glob.glob(FILING_DATA_PATH + "*.json")]
+
+    baskets = load_baskets(BASKET_FILE_PATH) if BASKET_FILE_PATH is not None else \
+        key_word_combinations(KEY_WORDS, sizes=(1, 2))
+    logging.info(f"{len(baskets)} basket(s), {len(CIK_list)} CIK(s)")
+    t0 = time.time()
+    basket_counts = sweep_baskets(baskets, SEC_scraping.iter_filings(CIK_list, DATEB, FILING_DATA_PATH, FILING_TYPE),
+                                  f"backtests/{MODEL}/", quantifier=QUANTIFIER)
+    logging.info(f"top baskets:\n{basket_counts.sort_values('num_events', ascending=False).head(20)}")
+    logging.info(f"'{MODEL}' completed, total time elapsed: {str(timedelta(seconds=time.time() - t0))}")
@@ -0,0 +1,159 @@
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from array import array
+from nltk.tokenize import MWETokenizer
+from utils.tokenizer import Tokenizer
+from utils.worker_pool import worker, worker_pool
+
+
+def setup_worker(tokenizer, mwes):
+    """
+        state of a counting process, see worker_pool.init_worker
+    """
+    return {'tokenizer': tokenizer,
+            'mweTokenizer': MWETokenizer([tuple(mwe.split(" ")) for mwe in mwes], separator=" ")}
+
+
+def filing_term_counts(args):
+    """
+        term counts of a filing, tokenized the same way as My_Backtest.contains_key_words: multi-word expressions are
+        joined first, so words inside one aren't counted on their own
+        returns:
+            tuple (CIK, accession_num, filing_date, {term: count})
+    """
+    CIK, accession_num, filing_date, filing_text = args
+    tokens = worker['tokenizer'].tokenize(filing_text)
+    if worker['mweTokenizer'].mwes:
+        tokens = worker['mweTokenizer'].tokenize(tokens)
+    counts = dict()
+    for token in tokens:
+        counts[token] = counts.get(token, 0) + 1
+    return CIK, accession_num, filing_date, counts
+
+
+class DocumentTermMatrix(object):
+    """
+        filing x term sparse (CSR) matrix of term counts, built once per sector, so any number of keyword baskets is
+        evaluated as column selections instead of re-tokenizing filings per basket
+            ANY: row-wise max over basket's columns > 0
+            ALL: row-wise count of basket's columns present == basket size
+        args:
+            filings: iterable of (CIK, accession_num, filing_date, filing_text), e.g. SEC_scraping.iter_filings
+            mwes: list; multi-word expressions to count as terms (e.g. 'climate change'), only these can be queried;
+                the multi-word key words of every basket to be evaluated, as My_Backtest joins all of them
+            tokenizer: Tokenizer; Tokenizer() if None
+            processes: int; number of tokenizer processes, defaults to os.cpu_count()
+    """
+
+    def __init__(self, filings=(), mwes: list = None, tokenizer: Tokenizer = None, processes: int = None):
+        self.mwes = sorted(set(mwes or []))
+        self.vocab = list()
+        self.term_ids = dict()
+        rows = list()
+        indptr = array('q', [0])
+        indices = array('q')
+        data = array('I')
+        with worker_pool(setup_worker, (tokenizer or Tokenizer(), self.mwes), processes) as pool:
+            for CIK, accession_num, filing_date, counts in pool.imap(filing_term_counts, filings, chunksize=16):
+                rows.append((int(CIK), accession_num, pd.to_datetime(filing_date)))
+                for term, count in counts.items():
+                    if term not in self.term_ids:
+                        self.term_ids[term] = len(self.vocab)
+                        self.vocab.append(term)
+                    indices.append(self.term_ids[term])
+                    data.append(count)
+                indptr.append(len(indices))
+        self.filings = pd.DataFrame(rows, columns=['cik', 'accession', 'filing_date'])
+        self.matrix = sp.csr_matrix((np.frombuffer(data, dtype=np.uint32) if data else np.zeros(0, np.uint32),
+                                     np.frombuffer(indices, dtype=np.int64) if indices else np.zeros(0, np.int64),
+                                     np.frombuffer(indptr, dtype=np.int64)),
+                                    shape=(len(rows), len(self.vocab)))
+        logging.info(f"document-term matrix of {self.matrix.shape[0]} filing(s), {self.matrix.shape[1]} term(s)")
+
+    @classmethod
+    def from_filing_text(cls, master_filing_text_dict: dict, **kwargs):
+        """
+            build from the dictionary returned by SEC_scraping.read_filing_text
+        """
+        def filings():
+            for file_name in master_filing_text_dict:
+                CIK = int(file_name.split("_")[1])
+                for accession_num, filing in master_filing_text_dict[file_name].items():
+                    yield CIK, accession_num, filing['filing_date'], filing['filing_text']
+
+        return cls(filings(), **kwargs)
+
+    def save(self, path: str):
+        """
+            save to directory path, to be loaded by DocumentTermMatrix.load
+        """
+        os.makedirs(path, exist_ok=True)
+        sp.save_npz(os.path.join(path, "matrix.npz"), self.matrix)
+        self.filings.to_csv(os.path.join(path, "filings.csv"), index=False)
+        with open(os.path.join(path, "vocab.json"), 'w') as f:
+            json.dump({'mwes': self.mwes, 'vocab': self.vocab}, f)
+
+    @classmethod
+    def load(cls, path: str):
+        dtm = cls.__new__(cls)
+        dtm.matrix = sp.load_npz(os.path.join(path, "matrix.npz")).tocsr()
+        dtm.filings = pd.read_csv(os.path.join(path, "filings.csv"), parse_dates=['filing_date'])
+        with open(os.path.join(path, "vocab.json")) as f:
+            vocab = json.load(f)
+        dtm.mwes = vocab['mwes']
+        dtm.vocab = vocab['vocab']
+        dtm.term_ids = {term: term_id for term_id, term in enumerate(dtm.vocab)}
+        return dtm
+
+    def matching_rows(self, key_words: list, quantifier: str = 'ANY') -> np.ndarray:
+        """
+            returns:
+                np.ndarray; indices of rows (filings) containing any/all key_words
+        """
+        key_words = sorted(set(key_words))
+        for key_word in key_words:
+            if " " in key_word and key_word not in self.mwes:
+                raise ValueError(f"'{key_word}' is not a multi-word expression of the matrix, rebuild it with it in "
+                                 f"mwes")
+        columns = [self.term_ids[key_word] for key_word in key_words if key_word in self.term_ids]
+        if quantifier.upper() == 'ALL':
+            if not columns or len(columns) < len(key_words):
+                return np.zeros(0, dtype=np.int64)  # some key word is in no filing
+            hits = np.asarray((self.matrix[:, columns] > 0).sum(axis=1)).ravel() == len(columns)
+        elif quantifier.upper() == 'ANY':
+            if not columns:
+                return np.zeros(0, dtype=np.int64)
+            hits = np.asarray(self.matrix[:, columns].max(axis=1).todense()).ravel() > 0
+        else:
+            raise ValueError(f"unknown quantifier {quantifier}")
+        return np.flatnonzero(hits)
+
+    def evaluate(self, key_words: list, quantifier: str = 'ANY', CIK_list: list = None) -> dict:
+        """
+            args:
+                CIK_list: list; only return filings of these CIKs, every CIK if None
+            returns:
+                dict; {CIK: [filing_date]} of filings containing any/all key_words, as returned by
+                My_Backtest.run_backtest
+        """
+        matched = self.filings.iloc[self.matching_rows(key_words, quantifier)]
+        if CIK_list is not None:
+            matched = matched[matched['cik'].isin([int(CIK) for CIK in CIK_list])]
+        return {CIK: list(group['filing_date']) for CIK, group in matched.groupby('cik', sort=False)}
+
+    def evaluate_baskets(self, baskets: dict, quantifier: str = 'ANY', CIK_list: list = None) -> dict:
+        """
+            returns:
+                dict; {basket: {CIK: [filing_date]}} for baskets with any signal event, as returned by
+                My_Backtest.run_backtest for contains_key_words_plus
+        """
+        res = dict()
+        for basket in baskets:
+            signal_dict = self.evaluate(baskets[basket], quantifier, CIK_list)
+            if signal_dict:
+                res[basket] = signal_dict
+        return res
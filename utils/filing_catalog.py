@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import sqlite3
+import logging
+import threading
+from glob import glob
+from pathlib import Path
+
+# 8-K item descriptions listed in sec-header, e.g. "ITEM INFORMATION: Regulation FD Disclosure"
+ITEM_PATTERN = re.compile(r"ITEM INFORMATION:\s*(.*?)\s*(?=ITEM INFORMATION:|FILED AS OF DATE:|$)")
+WHITESPACE = re.compile(r"\s*")
+
+
+def scan_filings(raw: bytes):
+    """
+        scan a CIK's json file (as written by SEC_scraping.download_filings) for the byte range of every filing
+        args:
+            raw: bytes; content of the file
+        yields:
+            tuple (accession_num, filing_dict, offset, length); raw[offset:offset + length] is filing_dict in json
+    """
+    # latin-1 maps every byte to one character, so string positions are byte offsets; structural characters of
+    # json are ascii, so scanning is not affected
+    text = raw.decode('latin-1')
+    decoder = json.JSONDecoder()
+    pos = WHITESPACE.match(text, 0).end()
+    if text[pos] != '{':
+        raise ValueError("expected a json object of filings keyed by accession number")
+    pos = WHITESPACE.match(text, pos + 1).end()
+    if text[pos] == '}':
+        return
+    while True:
+        accession_num, pos = decoder.raw_decode(text, pos)
+        pos = WHITESPACE.match(text, pos).end()
+        pos = WHITESPACE.match(text, pos + 1).end()  # skip ":"
+        filing_dict, end = decoder.raw_decode(text, pos)
+        yield accession_num, filing_dict, pos, end - pos
+        pos = WHITESPACE.match(text, end).end()
+        if text[pos] != ',':
+            break
+        pos = WHITESPACE.match(text, pos + 1).end()
+
+
+def item_codes(filing_dict: dict) -> str:
+    """
+        items reported by a filing, as listed in its sec-header, separated by "; "
+    """
+    try:
+        sec_header_text = filing_dict['master_dict_filing']['sec_header_content']['sec_header_text']
+    except (KeyError, TypeError):
+        return ""
+    return "; ".join(ITEM_PATTERN.findall(sec_header_text))
+
+
+class FilingCatalog(object):
+    """
+        SQLite catalog of filings stored in json files: (cik, accession, filing_date, form, items, path, offset, length)
+        indexed on (cik, filing_date) and accession, so a single filing is looked up in O(log n) and read from its
+        file without parsing the rest of the CIK's filings
+        args:
+            CATALOG_PATH: str; file path of the catalog, e.g. "/Users/Data/SEC Edgar Scraping/8-K/catalog.sqlite"
+            read_only: bool; open an existing catalog for lookups only, e.g. once per backtest process
+    """
+
+    def __init__(self, CATALOG_PATH: str, read_only: bool = False):
+        self.CATALOG_PATH = CATALOG_PATH
+        # may be shared by download threads
+        self.lock = threading.Lock()
+        if read_only:
+            self.db = sqlite3.connect(f"{Path(CATALOG_PATH).absolute().as_uri()}?mode=ro", uri=True,
+                                      check_same_thread=False)
+            return
+        self.db = sqlite3.connect(CATALOG_PATH, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS filings (accession TEXT PRIMARY KEY, cik INTEGER NOT NULL, "
+                        "filing_date TEXT NOT NULL, form TEXT, items TEXT, path TEXT NOT NULL, "
+                        "offset INTEGER NOT NULL, length INTEGER NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS filings_cik_date ON filings (cik, filing_date)")
+        self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def index_file(self, file_path: str, CIK=None) -> int:
+        """
+            add (or refresh) every filing of a CIK's json file to catalog
+            args:
+                file_path: str; e.g. "/Users/Data/8-K_1177609_20200101.json"
+                CIK: CIK number, read from file name if None
+            returns:
+                int; number of filings indexed
+        """
+        if CIK is None:
+            CIK = int(os.path.basename(file_path).split("_")[1])
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        rows = [(accession_num, int(CIK), filing_dict['file_info']['filing_date'],
+                 filing_dict['file_info']['filing_type'], item_codes(filing_dict), os.path.abspath(file_path), offset,
+                 length)
+                for accession_num, filing_dict, offset, length in scan_filings(raw)]
+        with self.lock:
+            # file replaces whatever was indexed for this CIK before
+            self.db.execute("DELETE FROM filings WHERE cik = ?", (int(CIK),))
+            self.db.executemany("INSERT OR REPLACE INTO filings VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.commit()
+        return len(rows)
+
+    def backfill(self, FILING_DATA_PATH: str, FILING_TYPE: str, dateb: str):
+        """
+            index every existing json file under FILING_DATA_PATH
+        """
+        file_paths = sorted(glob(f"{FILING_DATA_PATH}{FILING_TYPE}_*_{dateb}.json"))
+        num_filings = 0
+        for i, file_path in enumerate(file_paths):
+            try:
+                num_filings += self.index_file(file_path)
+            except Exception as e:
+                logging.exception(f"ERROR: indexing {file_path}")
+            if (i + 1) % 1000 == 0:
+                logging.info(f"indexed {i + 1}/{len(file_paths)} file(s)")
+        logging.info(f"indexed {num_filings} filing(s) of {len(file_paths)} file(s) into {self.CATALOG_PATH}")
+
+    def lookup(self, CIK, filing_date: str = None) -> list:
+        """
+            returns:
+                list of tuple (accession, filing_date, form, items, path, offset, length) of a CIK's filings, on
+                filing_date ('YYYY-MM-DD') if given
+        """
+        query = "SELECT accession, filing_date, form, items, path, offset, length FROM filings WHERE cik = ?"
+        params = [int(CIK)]
+        if filing_date is not None:
+            query += " AND filing_date = ?"
+            params.append(str(filing_date)[:10])
+        with self.lock:
+            return self.db.execute(query + " ORDER BY filing_date, accession", params).fetchall()
+
+    def count_filings(self, CIK) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM filings WHERE cik = ?", (int(CIK),)).fetchone()[0]
+
+    def lookup_accession(self, accession_num: str):
+        """
+            returns:
+                tuple (cik, filing_date, form, items, path, offset, length), or None if not in catalog
+        """
+        with self.lock:
+            return self.db.execute("SELECT cik, filing_date, form, items, path, offset, length FROM filings "
+                                   "WHERE accession = ?", (accession_num,)).fetchone()
+
+    @staticmethod
+    def read_filing(path: str, offset: int, length: int) -> dict:
+        """
+            read a single filing from its json file, only its bytes are read
+        """
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length).decode('utf-8'))
+
+    def iter_filings_on(self, CIK, filing_dates):
+        """
+            read a CIK's filings with a filing date in filing_dates
+            yields:
+                tuple (accession_num, filing_dict)
+        """
+        for filing_date in sorted(set(str(date)[:10] for date in filing_dates)):
+            for accession_num, _, _, _, path, offset, length in self.lookup(CIK, filing_date):
+                yield accession_num, self.read_filing(path, offset, length)
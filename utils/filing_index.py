@@ -0,0 +1,387 @@
+import re
+import json
+import bisect
+import sqlite3
+import logging
+import pandas as pd
+from array import array
+from nltk.tokenize import MWETokenizer
+from utils.tokenizer import Tokenizer
+from utils.worker_pool import worker, ingest
+
+
+def setup_worker(mwes):
+    """
+        state of an indexing process, see worker_pool.init_worker
+    """
+    return {'tokenizer': Tokenizer(),
+            'mweTokenizer': MWETokenizer([tuple(mwe.split(" ")) for mwe in mwes], separator=" ")}
+
+
+def tokenize(filing_text: str) -> list:
+    """
+        tokenize a filing the same way as My_Backtest.contains_key_words, before multi-word expressions are merged
+    """
+    return worker['tokenizer'].tokenize(filing_text)
+
+
+def filing_terms(args):
+    """
+        distinct terms of a filing, tokenized the same way as My_Backtest.contains_key_words
+        args:
+            args: tuple (CIK, accession_num, filing_date, filing_text), as yielded by SEC_scraping.iter_filings
+        returns:
+            tuple (CIK, accession_num, filing_date, set of terms)
+    """
+    CIK, accession_num, filing_date, filing_text = args
+    text_tokenized = tokenize(filing_text)
+    # tokenize multi-word expressions
+    if worker['mweTokenizer'].mwes:
+        text_tokenized = worker['mweTokenizer'].tokenize(text_tokenized)
+    return CIK, accession_num, filing_date, set(text_tokenized)
+
+
+def filing_positions(args):
+    """
+        positions of every term in a filing's token stream (see tokenize)
+        returns:
+            tuple (CIK, accession_num, filing_date, {term: bytes of array('I') of positions})
+    """
+    CIK, accession_num, filing_date, filing_text = args
+    positions = dict()
+    for position, term in enumerate(tokenize(filing_text)):
+        if term not in positions:
+            positions[term] = array('I')
+        positions[term].append(position)
+    return CIK, accession_num, filing_date, {term: positions[term].tobytes() for term in positions}
+
+
+class InvertedIndex(object):
+    """
+        persistent inverted index from lemmatized term (or multi-word expression) to the filings containing it, stored
+        in SQLite; built once from filings and updated incrementally, so a keyword basket is evaluated as set
+        operations on postings instead of re-tokenizing every filing
+        args:
+            INDEX_PATH: str; file path of the index, e.g. "/Users/Data/SEC Edgar Scraping/8-K/index.sqlite"
+            mwes: list; multi-word expressions to index as single terms (e.g. 'climate change'), only needed when
+                building; an index keeps the multi-word expressions it was first built with and rejects queries
+                of baskets with other ones (see check_mwes)
+        an InvertedIndex and a PositionalIndex may share INDEX_PATH (and its terms), each has its own table of filings
+    """
+    # filings indexed, with a filing_id referred to by postings
+    FILINGS_TABLE = 'filings'
+
+    def __init__(self, INDEX_PATH: str, mwes: list = None):
+        self.INDEX_PATH = INDEX_PATH
+        self.db = sqlite3.connect(INDEX_PATH)
+        self.create_tables()
+        self.db.execute("CREATE TABLE IF NOT EXISTS postings (term_id INTEGER, filing_id INTEGER, "
+                        "PRIMARY KEY (term_id, filing_id)) WITHOUT ROWID")
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'mwes'").fetchone()
+        if row is None:
+            self.mwes = sorted(set(mwes or []))
+            self.db.execute("INSERT INTO meta VALUES ('mwes', ?)", (json.dumps(self.mwes),))
+        else:
+            self.mwes = json.loads(row[0])
+            if mwes and set(mwes) != set(self.mwes):
+                logging.warning(f"{INDEX_PATH} was built with multi-word expressions {self.mwes}, not "
+                                f"{sorted(set(mwes))}, rebuild index to query baskets of them")
+        self.db.commit()
+
+    def create_tables(self):
+        """
+            tables shared by every index of INDEX_PATH (meta, terms) and the table of filings of this one; loads terms
+        """
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.execute(f"CREATE TABLE IF NOT EXISTS {self.FILINGS_TABLE} (filing_id INTEGER PRIMARY KEY, "
+                        f"accession TEXT UNIQUE, cik INTEGER NOT NULL, filing_date TEXT NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS terms (term_id INTEGER PRIMARY KEY, term TEXT UNIQUE)")
+        self.tokenizer_version = Tokenizer().version
+        self.db.execute("INSERT OR IGNORE INTO meta VALUES ('tokenizer_version', ?)", (self.tokenizer_version,))
+        built_version = self.db.execute("SELECT value FROM meta WHERE key = 'tokenizer_version'").fetchone()[0]
+        if built_version != self.tokenizer_version:
+            # postings of another tokenizer would neither match queries nor mix with new ones
+            raise ValueError(f"{self.INDEX_PATH} was built with tokenizer version {built_version}, now "
+                             f"{self.tokenizer_version}, rebuild index")
+        self.db.commit()
+        self.term_ids = dict(self.db.execute("SELECT term, term_id FROM terms"))
+
+    def indexed_accessions(self) -> set:
+        return {accession_num for (accession_num,) in self.db.execute(f"SELECT accession FROM {self.FILINGS_TABLE}")}
+
+    def term_id(self, term: str) -> int:
+        if term not in self.term_ids:
+            # terms are shared with the other index of INDEX_PATH, which may have added it since it was loaded
+            self.db.execute("INSERT OR IGNORE INTO terms (term) VALUES (?)", (term,))
+            self.term_ids[term] = self.db.execute("SELECT term_id FROM terms WHERE term = ?", (term,)).fetchone()[0]
+        return self.term_ids[term]
+
+    def add_filing(self, CIK, accession_num: str, filing_date) -> int:
+        """
+            returns:
+                int; filing_id of a filing added to the table of filings
+        """
+        return self.db.execute(f"INSERT INTO {self.FILINGS_TABLE} (accession, cik, filing_date) VALUES (?, ?, ?)",
+                               (accession_num, int(CIK), pd.to_datetime(filing_date).strftime('%Y-%m-%d'))).lastrowid
+
+    def store_terms(self, result):
+        CIK, accession_num, filing_date, terms = result
+        filing_id = self.add_filing(CIK, accession_num, filing_date)
+        self.db.executemany("INSERT INTO postings VALUES (?, ?)", ((self.term_id(term), filing_id) for term in terms))
+
+    def add_filings(self, filings, processes: int = None, commit_every: int = 1000) -> int:
+        """
+            tokenize and index filings not in index yet
+            args:
+                filings: iterable of (CIK, accession_num, filing_date, filing_text), e.g. SEC_scraping.iter_filings
+                processes: int; number of tokenizer processes, defaults to os.cpu_count()
+                commit_every: int; number of filings indexed between commits
+            returns:
+                int; number of filings added
+        """
+        return ingest(filings, filing_terms, self.store_terms, self.db.commit, setup_worker, (self.mwes,),
+                      stored=self.indexed_accessions(), processes=processes, commit_every=commit_every,
+                      target=self.INDEX_PATH)
+
+    def check_mwes(self, mwes):
+        """
+            postings are of the token stream with self.mwes joined, e.g. 'change' isn't posted for 'climate change'; a
+            query gives the same result as My_Backtest.contains_key_words only if that joins the same expressions
+            args:
+                mwes: iterable of multi-word expressions joined by My_Backtest, i.e. those of its key words
+        """
+        if set(mwes) != set(self.mwes):
+            raise ValueError(f"{self.INDEX_PATH} was built with multi-word expressions {self.mwes}, not "
+                             f"{sorted(set(mwes))}, rebuild index with mwes of these key words")
+
+    def matching_filings(self, key_words: list, quantifier: str = 'ANY', min_occurrences: int = 1) -> list:
+        """
+            returns:
+                list of tuple (CIK, filing_date) of filings containing any/all key_words
+        """
+        if min_occurrences > 1:
+            raise ValueError("occurrences are not indexed, use PositionalIndex")
+        key_words = sorted(set(key_words))
+        for key_word in key_words:
+            if " " in key_word and key_word not in self.mwes:
+                raise ValueError(f"'{key_word}' is not a multi-word expression of {self.INDEX_PATH}, rebuild index "
+                                 f"with it in mwes")
+        term_ids = [self.term_ids[key_word] for key_word in key_words if key_word in self.term_ids]
+        if quantifier.upper() == 'ALL':
+            if len(term_ids) < len(key_words):
+                return list()  # some key word is in no filing
+            having = f"HAVING COUNT(*) = {len(term_ids)}"
+        elif quantifier.upper() == 'ANY':
+            having = ""
+        else:
+            raise ValueError(f"unknown quantifier {quantifier}")
+        if not term_ids:
+            return list()
+        query = (f"SELECT cik, filing_date FROM {self.FILINGS_TABLE} WHERE filing_id IN "
+                 f"(SELECT filing_id FROM postings WHERE term_id IN ({','.join('?' * len(term_ids))}) "
+                 f"GROUP BY filing_id {having})")
+        return self.db.execute(query, term_ids).fetchall()
+
+    def evaluate(self, key_words: list, quantifier: str = 'ANY', CIK_list: list = None,
+                 min_occurrences: int = 1, mwes: list = None) -> dict:
+        """
+            index-backed equivalent of running My_Backtest.contains_key_words over every indexed filing
+            args:
+                key_words: list; e.g. ['climate change', 'sustainability']
+                quantifier: str; 'ANY' or 'ALL'
+                CIK_list: list; only return filings of these CIKs (e.g. a sector), every CIK if None
+                min_occurrences: int; times a key word has to occur in a filing (PositionalIndex only)
+                mwes: list; multi-word expressions My_Backtest joins, those of key_words if None (see check_mwes)
+            returns:
+                dict; {CIK: [filing_date]}, as expected by My_Backtest.save_to_local
+        """
+        self.check_mwes(mwes if mwes is not None else [key_word for key_word in key_words if " " in key_word])
+        CIK_set = set(int(CIK) for CIK in CIK_list) if CIK_list is not None else None
+        res = dict()
+        for CIK, filing_date in self.matching_filings(key_words, quantifier, min_occurrences):
+            if CIK_set is not None and CIK not in CIK_set:
+                continue
+            if CIK not in res:
+                res[CIK] = list()
+            res[CIK].append(pd.to_datetime(filing_date))
+        return res
+
+    def evaluate_baskets(self, baskets: dict, quantifier: str = 'ANY', CIK_list: list = None,
+                         min_occurrences: int = 1) -> dict:
+        """
+            index-backed equivalent of My_Backtest.contains_key_words_plus
+            args:
+                baskets: dict; {basket_name: key_words}, e.g. MODEL_PARAM of backtest_signal
+            returns:
+                dict; {basket_name: {CIK: [filing_date]}}, baskets without any signal are left out
+        """
+        # My_Backtest joins multi-word key words of every basket, see KeywordMatcher
+        mwes = [key_word for key_words in baskets.values() for key_word in key_words if " " in key_word]
+        res = dict()
+        for basket in baskets:
+            signal_dict = self.evaluate(baskets[basket], quantifier, CIK_list, min_occurrences, mwes)
+            if signal_dict:
+                res[basket] = signal_dict
+        return res
+
+
+# proximity query, e.g. "carbon NEAR/5 neutral": "carbon" within 5 tokens of "neutral"
+NEAR_PATTERN = re.compile(r"^\s*(\S+)\s+NEAR/(\d+)\s+(\S+)\s*$")
+
+
+def count_phrase(term_positions: list) -> int:
+    """
+        number of times terms occur next to each other, in order
+        args:
+            term_positions: list of array of positions, one per term of the phrase
+    """
+    starts = set(term_positions[0])
+    for offset, positions in enumerate(term_positions[1:], start=1):
+        starts &= {position - offset for position in positions}
+        if not starts:
+            break
+    return len(starts)
+
+
+def count_near(positions_a, positions_b, k: int) -> int:
+    """
+        number of occurrences of a with an occurrence of b within k tokens (before or after); an occurrence isn't near
+        itself when a and b are the same term (occurrences of different terms never share a position)
+    """
+    positions_b = sorted(positions_b)
+    count = 0
+    for position in positions_a:
+        i = bisect.bisect_left(positions_b, position - k)
+        if i < len(positions_b) and positions_b[i] == position:
+            i += 1
+        if i < len(positions_b) and positions_b[i] <= position + k:
+            count += 1
+    return count
+
+
+class PositionalIndex(InvertedIndex):
+    """
+        inverted index that also stores positions of every term in a filing, so phrase and proximity queries are
+        answered from the index without touching raw text, whatever the list of phrases:
+            - "sustainability": term
+            - "climate change": exact phrase
+            - "carbon NEAR/5 neutral": "carbon" within 5 tokens of "neutral"
+        each optionally required to occur at least min_occurrences times in a filing
+        positions are of the token stream of filing_index.tokenize, i.e. after stop words are removed (same stream
+        My_Backtest's multi-word expressions are matched on)
+        args:
+            INDEX_PATH: str; file path of the index
+    """
+    # filings indexed, with a filing_id referred to by positions
+    FILINGS_TABLE = 'positional_filings'
+
+    def __init__(self, INDEX_PATH: str):
+        self.INDEX_PATH = INDEX_PATH
+        self.db = sqlite3.connect(INDEX_PATH)
+        self.create_tables()
+        self.db.execute("CREATE TABLE IF NOT EXISTS positions (term_id INTEGER, filing_id INTEGER, positions BLOB, "
+                        "PRIMARY KEY (term_id, filing_id)) WITHOUT ROWID")
+        # positions are of the token stream before multi-word expressions are merged
+        self.mwes = list()
+        self.db.commit()
+
+    def check_mwes(self, mwes):
+        """
+            phrases are matched on positions of the unmerged stream, so any multi-word expressions can be queried
+        """
+        pass
+
+    def store_positions(self, result):
+        CIK, accession_num, filing_date, positions = result
+        filing_id = self.add_filing(CIK, accession_num, filing_date)
+        self.db.executemany("INSERT INTO positions VALUES (?, ?, ?)",
+                            ((self.term_id(term), filing_id, positions[term]) for term in positions))
+
+    def add_filings(self, filings, processes: int = None, commit_every: int = 1000) -> int:
+        """
+            tokenize and index positions of filings not in index yet, see InvertedIndex.add_filings
+        """
+        return ingest(filings, filing_positions, self.store_positions, self.db.commit, setup_worker, ([],),
+                      stored=self.indexed_accessions(), processes=processes, commit_every=commit_every,
+                      target=self.INDEX_PATH)
+
+    def term_filings(self, term: str) -> set:
+        if term not in self.term_ids:
+            return set()
+        return {filing_id for (filing_id,) in
+                self.db.execute("SELECT filing_id FROM positions WHERE term_id = ?", (self.term_ids[term],))}
+
+    def term_positions(self, term: str, filing_ids: set) -> dict:
+        """
+            returns:
+                dict; {filing_id: array of positions} of term in filing_ids
+        """
+        res = dict()
+        filing_ids = sorted(filing_ids)
+        # stay below SQLite's limit on number of query parameters
+        for i in range(0, len(filing_ids), 500):
+            chunk = filing_ids[i:i + 500]
+            for filing_id, blob in self.db.execute(
+                    f"SELECT filing_id, positions FROM positions WHERE term_id = ? AND filing_id IN "
+                    f"({','.join('?' * len(chunk))})", [self.term_ids[term]] + chunk):
+                positions = array('I')
+                positions.frombytes(blob)
+                res[filing_id] = positions
+        return res
+
+    def query_counts(self, query: str) -> dict:
+        """
+            returns:
+                dict; {filing_id: number of occurrences} of a term, phrase or proximity query
+        """
+        match = NEAR_PATTERN.match(query)
+        terms = [match.group(1), match.group(3)] if match else query.split()
+        if any(term not in self.term_ids for term in terms):
+            return dict()
+        # only filings containing every term can match
+        candidates = None
+        for term in set(terms):
+            candidates = self.term_filings(term) if candidates is None else candidates & self.term_filings(term)
+            if not candidates:
+                return dict()
+        positions = {term: self.term_positions(term, candidates) for term in set(terms)}
+        if match:
+            k = int(match.group(2))
+            counts = {filing_id: count_near(positions[terms[0]][filing_id], positions[terms[1]][filing_id], k)
+                      for filing_id in candidates}
+        elif len(terms) == 1:
+            counts = {filing_id: len(positions[terms[0]][filing_id]) for filing_id in candidates}
+        else:
+            counts = {filing_id: count_phrase([positions[term][filing_id] for term in terms])
+                      for filing_id in candidates}
+        return {filing_id: count for filing_id, count in counts.items() if count > 0}
+
+    def matching_filings(self, key_words: list, quantifier: str = 'ANY', min_occurrences: int = 1) -> list:
+        """
+            args:
+                key_words: list of queries, e.g. ['climate change', 'carbon NEAR/5 neutral']
+            returns:
+                list of tuple (CIK, filing_date) of filings matching any/all queries, each at least min_occurrences
+                times
+        """
+        if quantifier.upper() not in ('ANY', 'ALL'):
+            raise ValueError(f"unknown quantifier {quantifier}")
+        matched = None
+        for key_word in sorted(set(key_words)):
+            filing_ids = {filing_id for filing_id, count in self.query_counts(key_word).items()
+                          if count >= min_occurrences}
+            if matched is None:
+                matched = filing_ids
+            elif quantifier.upper() == 'ALL':
+                matched &= filing_ids
+            else:
+                matched |= filing_ids
+        if not matched:
+            return list()
+        res = list()
+        matched = sorted(matched)
+        for i in range(0, len(matched), 500):
+            chunk = matched[i:i + 500]
+            res.extend(self.db.execute(f"SELECT cik, filing_date FROM {self.FILINGS_TABLE} WHERE filing_id IN "
+                                       f"({','.join('?' * len(chunk))})", chunk).fetchall())
+        return res
@@ -0,0 +1,176 @@
+import os
+import json
+import logging
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+from glob import glob
+
+# one row per page of a filing document; partitioned by filing_year (hive style, i.e. filing_year=2019/) and sorted
+# by cik within every file, so filters on date and CIK skip partitions and row groups
+SCHEMA = pa.schema([
+    ('cik', pa.int64()),
+    ('accession', pa.string()),
+    ('filing_date', pa.date32()),
+    ('document', pa.string()),
+    ('page', pa.int32()),
+    ('text', pa.string()),
+    ('filing_year', pa.int32()),
+])
+
+
+def filings_to_rows(CIK, master_dict_xml: dict) -> list:
+    """
+        flatten a CIK's filings, as stored in 8-K_{CIK}_{T1}.json by SEC_scraping.download_filings, to rows of SCHEMA
+        args:
+            CIK: CIK number
+            master_dict_xml: dict; filings keyed by accession number
+        returns:
+            list of dict
+    """
+    rows = list()
+    for accession_num, filing_dict in master_dict_xml.items():
+        filing_date = pd.to_datetime(filing_dict['file_info']['filing_date']).date()
+        document_dict = filing_dict['master_dict_filing']['filing_documents']
+        for document in document_dict:
+            if 'normalized_text' not in document_dict[document]:
+                logging.info(f"{CIK}, {accession_num}, {document}")
+                continue
+            for page, text in document_dict[document]['normalized_text'].items():
+                rows.append({'cik': int(CIK), 'accession': accession_num, 'filing_date': filing_date,
+                             'document': document, 'page': int(page), 'text': text,
+                             'filing_year': filing_date.year})
+    return rows
+
+
+def write_filings(STORE_PATH: str, rows: list):
+    """
+        append rows of SCHEMA to the store
+        args:
+            STORE_PATH: str; root directory of the store, e.g. "/Users/Data/SEC Edgar Store/8-K/"
+            rows: list of dict (see filings_to_rows)
+    """
+    if not rows:
+        return
+    df = pd.DataFrame(rows, columns=SCHEMA.names).sort_values(['cik', 'filing_date', 'accession', 'document', 'page'])
+    table = pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False)
+    pq.write_to_dataset(table, root_path=STORE_PATH, partition_cols=['filing_year'])
+
+
+def stored_accessions(STORE_PATH: str) -> set:
+    """
+        accession numbers of filings in the store, only the accession column is read
+    """
+    if not glob(os.path.join(STORE_PATH, "**", "*.parquet"), recursive=True):
+        return set()
+    return set(read_filing_pages(STORE_PATH, columns=['accession'])['accession'])
+
+
+def convert_json_to_parquet(FILING_DATA_PATH: str, FILING_TYPE: str, dateb: str, STORE_PATH: str,
+                            CIK_list: list = None, batch_size: int = 500000):
+    """
+        one-shot conversion of json files written by SEC_scraping.download_filings into the store
+        filings already in the store are skipped, so conversion can be run again (e.g. after new filings are
+        downloaded, or if it was interrupted) without duplicating rows
+        args:
+            FILING_DATA_PATH: str; e.g. "/Users/Data/"
+            FILING_TYPE: str; e.g. "8-K"
+            dateb: str; T1 of json files, e.g. "20200101"
+            STORE_PATH: str; root directory of the store
+            CIK_list: list; CIKs to convert, every json file under FILING_DATA_PATH if None
+            batch_size: int; number of pages buffered before writing, bounds memory used by conversion
+        returns:
+            None
+    """
+    if CIK_list is None:
+        file_paths = sorted(glob(f"{FILING_DATA_PATH}{FILING_TYPE}_*_{dateb}.json"))
+    else:
+        file_paths = [f"{FILING_DATA_PATH}{FILING_TYPE}_{str(CIK)}_{dateb}.json" for CIK in CIK_list]
+    os.makedirs(STORE_PATH, exist_ok=True)
+    stored = stored_accessions(STORE_PATH)
+    rows = list()
+    for i, file_path in enumerate(file_paths):
+        CIK = int(os.path.basename(file_path).split("_")[1])
+        with open(file_path) as f:
+            master_dict_xml = json.load(f)
+        rows.extend(filings_to_rows(CIK, {accession_num: filing_dict for accession_num, filing_dict in
+                                          master_dict_xml.items() if accession_num not in stored}))
+        if len(rows) >= batch_size:
+            write_filings(STORE_PATH, rows)
+            logging.info(f"converted {i + 1}/{len(file_paths)} file(s)")
+            rows = list()
+    write_filings(STORE_PATH, rows)
+    logging.info(f"converted {len(file_paths)} file(s) to {STORE_PATH}")
+
+
+def filter_expression(CIK_list: list = None, date_from=None, date_to=None):
+    """
+        dataset filter on CIK and filing date (inclusive), None if no filter
+    """
+    expression = None
+
+    def combine(condition):
+        return condition if expression is None else expression & condition
+
+    if CIK_list is not None:
+        expression = combine(ds.field('cik').isin([int(CIK) for CIK in CIK_list]))
+    if date_from is not None:
+        date_from = pd.to_datetime(date_from).date()
+        # partition field prunes whole directories, filing_date prunes row groups/rows
+        expression = combine((ds.field('filing_year') >= date_from.year) & (ds.field('filing_date') >= date_from))
+    if date_to is not None:
+        date_to = pd.to_datetime(date_to).date()
+        expression = combine((ds.field('filing_year') <= date_to.year) & (ds.field('filing_date') <= date_to))
+    return expression
+
+
+def read_filing_pages(STORE_PATH: str, columns: list = None, CIK_list: list = None, date_from=None,
+                      date_to=None) -> pd.DataFrame:
+    """
+        read pages from the store, only columns and rows requested are read from disk
+        args:
+            STORE_PATH: str; root directory of the store
+            columns: list; subset of SCHEMA's columns, e.g. ['cik', 'filing_date'], all of them if None
+            CIK_list: list; CIKs to read, e.g. CIKs of a sector
+            date_from, date_to: str or datetime; range of filing date (inclusive)
+        returns:
+            pd.DataFrame; one row per page
+    """
+    dataset = ds.dataset(STORE_PATH, schema=SCHEMA, format='parquet',
+                         partitioning=ds.partitioning(pa.schema([('filing_year', pa.int32())]), flavor='hive'))
+    table = dataset.to_table(columns=columns, filter=filter_expression(CIK_list, date_from, date_to))
+    return table.to_pandas()
+
+
+def iter_filing_pages(STORE_PATH: str, CIK_list: list, date_from=None, date_to=None, document_types: list = None,
+                      batch_size: int = 100):
+    """
+        store-backed equivalent of SEC_scraping.iter_filing_pages: only pages of CIK_list within the date range are
+        read, batch_size CIKs at a time
+        args:
+            document_types: list; only yield documents whose type starts with one of them, e.g. ['8-K', 'EX-99']
+        yields:
+            tuple (CIK, accession_num, filing_date (Timestamp('2019-12-04 00:00:00')),
+                   list of tuple (document ("EX-99.1_2"), page ("1"), text ("...")))
+            CIKs in order of CIK_list, filings of a CIK by filing date
+    """
+    document_types = tuple(document_types) if document_types is not None else None
+    CIK_list = list(CIK_list)
+    for i in range(0, len(CIK_list), batch_size):
+        batch = CIK_list[i:i + batch_size]
+        df = read_filing_pages(STORE_PATH, columns=['cik', 'accession', 'filing_date', 'document', 'page', 'text'],
+                               CIK_list=batch, date_from=date_from, date_to=date_to)
+        if document_types is not None:
+            # document is keyed by "{type}_{sequence}", e.g. "EX-99.1_2"
+            df = df[df['document'].map(lambda document: document.rsplit("_", 1)[0].startswith(document_types))]
+        # documents in order of sequence, as in the submission
+        df['sequence'] = pd.to_numeric(df['document'].str.rsplit("_", n=1).str[-1], errors='coerce')
+        df = df.sort_values(['filing_date', 'accession', 'sequence', 'page'])
+        filings = {int(CIK): list() for CIK in batch}
+        for (CIK, accession_num), pages in df.groupby(['cik', 'accession'], sort=False):
+            filings[CIK].append((accession_num, pd.to_datetime(pages['filing_date'].iloc[0]),
+                                 list(zip(pages['document'], pages['page'].astype(str), pages['text']))))
+        for CIK in batch:
+            for accession_num, filing_date, pages in filings.get(int(CIK), list()):
+                yield CIK, accession_num, filing_date, pages
@@ -0,0 +1,135 @@
+from collections import deque
+
+
+class KeywordMatcher(object):
+    """
+        trie over tokens of every key word (multi-word expressions included) of every basket, so a token stream is
+        scanned once for all baskets, however many there are
+        by default key words are found as MWETokenizer (with every multi-word key word as expression) followed by a
+        lookup of its tokens would find them: the trie is walked from each position, without failure links, so
+        multi-word expressions are joined greedily, leftmost and longest first, and words inside a joined expression
+        don't occur on their own, e.g. 'change' isn't found in 'climate change'
+        with overlapping, the trie's failure links (Aho-Corasick) find every occurrence in a single pass instead
+        args:
+            baskets: dict; {basket_name: [key words]}, e.g. {'B': ['artificial intelligence', 'big data']}
+            term_ids: dict; {term: id}, e.g. TokenStore.term_ids, to match token ids instead of terms; key words with
+                a term not in term_ids can't occur and are left out
+            overlapping: bool; find every occurrence of every key word instead, nested and overlapping ones included
+    """
+
+    def __init__(self, baskets: dict, term_ids: dict = None, overlapping: bool = False):
+        self.baskets = self.normalize(baskets)
+        self.overlapping = overlapping
+        self.key_words = sorted(set(key_word for key_words in self.baskets.values() for key_word in key_words))
+        # baskets each key word is in, and number of distinct key words of each basket
+        self.key_word_baskets = {key_word: list() for key_word in self.key_words}
+        for basket, key_words in self.baskets.items():
+            for key_word in set(key_words):
+                self.key_word_baskets[key_word].append(basket)
+        self.basket_sizes = {basket: len(set(key_words)) for basket, key_words in self.baskets.items()}
+        # state 0 is the root; goto[state] maps a token to the next state, output[state] lists key words ending there
+        self.goto = [dict()]
+        self.fail = [0]
+        self.output = [list()]
+        # multi-word key word spelled by the path from the root to a state, for greedy matching
+        self.expression = [None]
+        for key_word in self.key_words:
+            terms = key_word.split(" ")
+            if term_ids is not None:
+                if any(term not in term_ids for term in terms):
+                    continue
+                terms = [term_ids[term] for term in terms]
+            state = 0
+            for term in terms:
+                if term not in self.goto[state]:
+                    self.goto.append(dict())
+                    self.fail.append(0)
+                    self.output.append(list())
+                    self.expression.append(None)
+                    self.goto[state][term] = len(self.goto) - 1
+                state = self.goto[state][term]
+            self.output[state].append(key_word)
+            if len(terms) > 1:
+                self.expression[state] = key_word
+        # breadth first, so fail state of a state's parent is set before the state's
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for term, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and term not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(term, 0)
+                # key words ending at the fail state end here too
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    @staticmethod
+    def normalize(baskets: dict) -> dict:
+        """
+            baskets as held by a matcher, to tell if a matcher was built for baskets
+        """
+        return {basket: list(key_words) for basket, key_words in baskets.items()}
+
+    def find(self, tokens) -> set:
+        """
+            key words occurring in tokens
+            args:
+                tokens: iterable of terms, or of ids if built with term_ids (e.g. ids.tolist() of a np.ndarray)
+        """
+        if not self.overlapping:
+            return self.find_greedy(tokens)
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for token in tokens:
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            if output[state]:
+                found.update(output[state])
+                if len(found) == len(self.key_words):
+                    break
+        return found
+
+    def find_greedy(self, tokens) -> set:
+        """
+            key words occurring in tokens once multi-word expressions are joined as MWETokenizer.tokenize does
+        """
+        goto, output, expression = self.goto, self.output, self.expression
+        tokens = tokens if isinstance(tokens, list) else list(tokens)
+        found = set()
+        i = 0
+        while i < len(tokens):
+            # longest expression starting at i
+            state, j, end = 0, i, None
+            while j < len(tokens) and tokens[j] in goto[state]:
+                state = goto[state][tokens[j]]
+                j += 1
+                if expression[state] is not None:
+                    end, key_word = j, expression[state]
+            if end is not None:
+                found.add(key_word)
+                i = end
+                continue
+            # a single token; outputs of a state next to the root are key words of that single term only
+            state = goto[0].get(tokens[i], 0)
+            if output[state]:
+                found.update(output[state])
+            i += 1
+        return found
+
+    def match(self, tokens, quantifier: str = 'ANY') -> list:
+        """
+            baskets with any/all of their key words occurring in tokens
+        """
+        if quantifier.upper() not in ('ANY', 'ALL'):
+            raise ValueError(f"unknown quantifier {quantifier}")
+        # only baskets of key words found are visited, cost doesn't grow with number of baskets
+        hits = dict()
+        for key_word in self.find(tokens):
+            for basket in self.key_word_baskets[key_word]:
+                hits[basket] = hits.get(basket, 0) + 1
+        if quantifier.upper() == 'ALL':
+            return [basket for basket in hits if hits[basket] == self.basket_sizes[basket]]
+        return list(hits)
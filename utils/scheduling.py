@@ -0,0 +1,64 @@
+import os
+import math
+
+
+def file_costs(file_paths: list, catalog=None) -> dict:
+    """
+        estimated cost of backtesting every CIK json file: its number of filings if a filing_catalog.FilingCatalog is
+        given, its size in bytes otherwise
+        returns:
+            dict; {file_path: cost}
+    """
+    costs = dict()
+    for file_path in file_paths:
+        if catalog is not None:
+            # e.g. 8-K_1177609_20200101.json
+            costs[file_path] = catalog.count_filings(int(os.path.basename(file_path).split("_")[1]))
+        else:
+            costs[file_path] = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+    return costs
+
+
+def target_cost(total_cost: float, processes: int, granularity: int = 4) -> float:
+    """
+        cost of a task so that every process gets about granularity tasks; with no task costing more than this,
+        largest-first dispatch keeps wall time close to total_cost / processes
+    """
+    return max(total_cost / (processes * granularity), 1)
+
+
+def num_parts(cost: float, target: float) -> int:
+    """
+        number of subtasks a task of cost should be split into
+    """
+    return max(1, math.ceil(cost / target))
+
+
+def split_range(n: int, parts: int) -> list:
+    """
+        split range(n) into parts contiguous (start, stop) of about equal size
+    """
+    bounds = [round(i * n / parts) for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(parts) if bounds[i] < bounds[i + 1]]
+
+
+def lpt_chunks(tasks: list, target: float, chunk_size: int) -> list:
+    """
+        order tasks largest first (longest processing time first), packing small tasks together so that a chunk
+        costs up to target and holds up to chunk_size tasks
+        args:
+            tasks: list of tuple (task, cost)
+        returns:
+            list of list of task, most costly chunk first
+    """
+    chunks = list()
+    chunk, chunk_cost = list(), 0
+    for task, cost in sorted(tasks, key=lambda task_cost: -task_cost[1]):
+        if chunk and (chunk_cost + cost > target or len(chunk) >= chunk_size):
+            chunks.append((chunk, chunk_cost))
+            chunk, chunk_cost = list(), 0
+        chunk.append(task)
+        chunk_cost += cost
+    if chunk:
+        chunks.append((chunk, chunk_cost))
+    return [chunk for chunk, _ in sorted(chunks, key=lambda chunk_cost: -chunk_cost[1])]
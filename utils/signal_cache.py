@@ -0,0 +1,70 @@
+import json
+import sqlite3
+import hashlib
+import pandas as pd
+
+
+def basket_key(key_words: list, quantifier: str = 'ANY', model_name: str = 'contains_key_words') -> str:
+    """
+        hash of a basket's definition; the basket's name is not part of it, so renaming a basket keeps its results
+        args:
+            model_name: str; My_Backtest model that scores the basket
+    """
+    definition = json.dumps({'key_words': sorted(set(key_words)), 'quantifier': quantifier.upper(),
+                             'model_name': model_name})
+    return hashlib.sha1(definition.encode('utf-8')).hexdigest()
+
+
+class SignalCache(object):
+    """
+        persistent memo of whether a filing is a signal event of a basket, keyed by (basket_key, accession, tokenizer
+        version), so changing or adding a basket only scores filings against baskets not seen before
+        args:
+            CACHE_PATH: str; file path of the cache, e.g. "backtests/key_word_search/signal_cache.sqlite"
+            tokenizer_version: str; Tokenizer.version results were computed with, results of other versions are ignored
+    """
+
+    def __init__(self, CACHE_PATH: str, tokenizer_version: str):
+        self.CACHE_PATH = CACHE_PATH
+        self.tokenizer_version = tokenizer_version
+        # written by the result thread of a pool
+        self.db = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS filings (accession TEXT PRIMARY KEY, cik INTEGER NOT NULL, "
+                        "filing_date TEXT NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS signals (basket TEXT, accession TEXT, version TEXT, "
+                        "hit INTEGER NOT NULL, PRIMARY KEY (basket, version, accession)) WITHOUT ROWID")
+        self.db.commit()
+
+    def scored_accessions(self, basket: str) -> set:
+        """
+            accession numbers of filings already scored against basket (a basket_key)
+        """
+        return {accession_num for (accession_num,) in
+                self.db.execute("SELECT accession FROM signals WHERE basket = ? AND version = ?",
+                                (basket, self.tokenizer_version))}
+
+    def add(self, CIK, accession_num: str, filing_date, scored: list, hits: list):
+        """
+            store results of a filing
+            args:
+                scored: list; basket keys the filing was scored against
+                hits: list; basket keys of scored the filing is a signal event of
+        """
+        self.db.execute("INSERT OR REPLACE INTO filings VALUES (?, ?, ?)",
+                        (accession_num, int(CIK), pd.to_datetime(filing_date).strftime('%Y-%m-%d')))
+        self.db.executemany("INSERT OR REPLACE INTO signals VALUES (?, ?, ?, ?)",
+                            ((basket, accession_num, self.tokenizer_version, int(basket in hits))
+                             for basket in scored))
+
+    def commit(self):
+        self.db.commit()
+
+    def hits(self, basket: str) -> dict:
+        """
+            returns:
+                dict; {accession_num: (CIK, filing_date)} of signal events of basket (a basket_key)
+        """
+        return {accession_num: (CIK, pd.to_datetime(filing_date)) for accession_num, CIK, filing_date in
+                self.db.execute("SELECT signals.accession, cik, filing_date FROM signals JOIN filings "
+                                "ON signals.accession = filings.accession WHERE basket = ? AND version = ? AND hit = 1",
+                                (basket, self.tokenizer_version))}
@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from array import array
+from utils.tokenizer import Tokenizer
+from utils.worker_pool import worker, ingest
+
+
+def tokenize_filing(args):
+    """
+        args:
+            args: tuple (CIK, accession_num, filing_date, pages), as yielded by SEC_scraping.iter_filing_pages
+        returns:
+            tuple (CIK, accession_num, filing_date, list of tuple (document, page, tokens))
+    """
+    CIK, accession_num, filing_date, pages = args
+    texts = [text for _, _, text in pages]
+    return CIK, accession_num, filing_date, [(document, page, tokens) for (document, page, _), tokens in
+                                            zip(pages, worker['tokenizer'].tokenize_many(texts))]
+
+
+class TokenStore(object):
+    """
+        tokens of every page of filings, tokenized once and stored as uint32 ids of a global vocabulary in a single
+        memory-mapped file, so models read token ids of a page without re-tokenizing its text
+            {STORE_PATH}/{tokenizer version}/tokens.bin: ids of every page, pages of a filing are contiguous
+            {STORE_PATH}/{tokenizer version}/index.sqlite: vocabulary and (accession, document, page) -> offset, length
+        a store is specific to a tokenizer version, changing the tokenizer starts a new store
+        args:
+            STORE_PATH: str; root directory of the store, e.g. "/Users/Data/SEC Edgar Tokens/8-K/"
+            tokenizer: Tokenizer; tokenizer the store is built with, Tokenizer() if None
+    """
+
+    def __init__(self, STORE_PATH: str, tokenizer: Tokenizer = None):
+        self.STORE_PATH = STORE_PATH
+        self.tokenizer = tokenizer or Tokenizer()
+        self.path = os.path.join(STORE_PATH, self.tokenizer.version)
+        os.makedirs(self.path, exist_ok=True)
+        self.tokens_path = os.path.join(self.path, "tokens.bin")
+        self._db = None
+        self._tokens = None
+        self.vocab = [term for (term,) in self.db.execute("SELECT term FROM vocab ORDER BY term_id")]
+        self.term_ids = {term: term_id for term_id, term in enumerate(self.vocab)}
+
+    def __getstate__(self):
+        # sqlite connections and memory maps are opened again in pool processes
+        state = self.__dict__.copy()
+        state['_db'] = None
+        state['_tokens'] = None
+        return state
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = sqlite3.connect(os.path.join(self.path, "index.sqlite"))
+            self._db.execute("CREATE TABLE IF NOT EXISTS vocab (term_id INTEGER PRIMARY KEY, term TEXT UNIQUE)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS pages (accession TEXT, document TEXT, page TEXT, "
+                             "cik INTEGER NOT NULL, filing_date TEXT NOT NULL, offset INTEGER NOT NULL, "
+                             "length INTEGER NOT NULL, PRIMARY KEY (accession, document, page))")
+            self._db.execute("CREATE INDEX IF NOT EXISTS pages_cik_date ON pages (cik, filing_date)")
+            self._db.commit()
+        return self._db
+
+    @property
+    def tokens(self) -> np.ndarray:
+        """
+            ids of every page, memory-mapped read-only; mapped again if the store has grown
+        """
+        size = os.path.getsize(self.tokens_path) // 4 if os.path.exists(self.tokens_path) else 0
+        if self._tokens is None or len(self._tokens) != size:
+            if size == 0:
+                self._tokens = np.zeros(0, dtype=np.uint32)
+            else:
+                self._tokens = np.memmap(self.tokens_path, dtype=np.uint32, mode='r', shape=(size,))
+        return self._tokens
+
+    def stored_accessions(self) -> set:
+        return {accession_num for (accession_num,) in self.db.execute("SELECT DISTINCT accession FROM pages")}
+
+    def term_id(self, term: str) -> int:
+        if term not in self.term_ids:
+            self.term_ids[term] = len(self.vocab)
+            self.vocab.append(term)
+            self.db.execute("INSERT INTO vocab VALUES (?, ?)", (self.term_ids[term], term))
+        return self.term_ids[term]
+
+    def add_filings(self, filings, processes: int = None, commit_every: int = 1000) -> int:
+        """
+            tokenize and store pages of filings not in store yet
+            args:
+                filings: iterable of (CIK, accession_num, filing_date, pages), e.g. SEC_scraping.iter_filing_pages
+                processes: int; number of tokenizer processes, defaults to os.cpu_count()
+                commit_every: int; number of filings stored between commits
+            returns:
+                int; number of filings added
+        """
+        offset = len(self.tokens)
+        with open(self.tokens_path, 'ab') as f:
+            def store(result):
+                nonlocal offset
+                CIK, accession_num, filing_date, pages = result
+                filing_date = pd.to_datetime(filing_date).strftime('%Y-%m-%d')
+                rows = list()
+                for document, page, tokens in pages:
+                    ids = array('I', [self.term_id(term) for term in tokens])
+                    f.write(ids.tobytes())
+                    rows.append((accession_num, document, str(page), int(CIK), filing_date, offset, len(ids)))
+                    offset += len(ids)
+                self.db.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+            def commit():
+                # ids are on disk before the pages pointing to them
+                f.flush()
+                self.db.commit()
+
+            return ingest(filings, tokenize_filing, store, commit, dict, ({'tokenizer': self.tokenizer},),
+                          stored=self.stored_accessions(), processes=processes, commit_every=commit_every,
+                          target=self.path)
+
+    def filings(self, CIK) -> list:
+        """
+            returns:
+                list of tuple (accession_num, filing_date) of a CIK's filings in store, by filing date
+        """
+        return self.db.execute("SELECT DISTINCT accession, filing_date FROM pages WHERE cik = ? ORDER BY filing_date",
+                               (int(CIK),)).fetchall()
+
+    def filing_pages(self, accession_num: str) -> dict:
+        """
+            returns:
+                dict; {(document, page): np.ndarray of ids} of a filing, every array a view of the memory map
+        """
+        tokens = self.tokens
+        return {(document, page): tokens[offset:offset + length] for document, page, offset, length in
+                self.db.execute("SELECT document, page, offset, length FROM pages WHERE accession = ? "
+                                "ORDER BY offset", (accession_num,))}
+
+    def filing_ids(self, accession_num: str):
+        """
+            returns:
+                np.ndarray; ids of every page of a filing in order (a view of the memory map), None if not in store
+        """
+        start, end = self.db.execute("SELECT MIN(offset), MAX(offset + length) FROM pages WHERE accession = ?",
+                                     (accession_num,)).fetchone()
+        if start is None:
+            return None
+        return self.tokens[start:end]
+
+    def dictionary_ids(self, dictionary) -> np.ndarray:
+        """
+            map from store ids to ids of a gensim Dictionary, -1 for terms not in dictionary
+        """
+        return np.array([dictionary.token2id.get(term, -1) for term in self.vocab], dtype=np.int64)
+
+    @staticmethod
+    def doc2bow(ids: np.ndarray, dictionary_ids: np.ndarray) -> list:
+        """
+            bag of words of ids, same as dictionary.doc2bow of the page's tokens
+            args:
+                dictionary_ids: np.ndarray; see dictionary_ids
+        """
+        ids = dictionary_ids[ids]
+        bow_ids, counts = np.unique(ids[ids >= 0], return_counts=True)
+        return list(zip(bow_ids.tolist(), counts.tolist()))
@@ -1,48 +1,201 @@
 import multiprocessing
 import os
-import unicodedata
-import pickle
+import hashlib
+import itertools
 import logging
 import numpy as np
 import pandas as pd
 import json
 import gensim
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem.wordnet import WordNetLemmatizer
-from nltk.stem.porter import PorterStemmer
-from gensim.test.utils import common_texts
+from array import array
 from gensim import corpora, models
 from gensim.corpora.dictionary import Dictionary
 from pathlib import Path
+from utils import filing_catalog
+from utils import scheduling
+from utils.tokenizer import Tokenizer
+from utils.token_store import TokenStore
+from utils.worker_pool import worker, worker_pool
 
+tokenizer = Tokenizer(normalize=True)
 
-logging.basicConfig(filename=f"../logs/LDA/logs.txt",
-                    filemode='a',
-                    level=logging.INFO,
-                    format='%(levelname)s: %(asctime)s - %(message)s',
-                    datefmt='%m/%d/%Y %I:%M:%S')
 
-wordlemmatizer = WordNetLemmatizer()
+def setup_catalog_worker(catalog_path=None):
+    """
+    state of a process reading filings, see worker_pool.init_worker: the filing catalog, opened once per process,
+    read-only
+    """
+    return {'catalog': filing_catalog.FilingCatalog(catalog_path, read_only=True) if catalog_path is not None else None}
 
 
-class my_LDA(object):
+def setup_lda_worker(model_path, dictionary_ids_path=None, catalog_path=None):
+    """
+    state of a process of backtest_LDA_multicore.backtest_LDA: model and dictionary are loaded once per process, the
+    model's arrays memory-mapped read-only so every process shares the same pages
+    model_path: directory of topic_model.model and dictionary.dict; LdaModel.save stores expElogbeta in its own .npy,
+        which is what gets memory-mapped
+    dictionary_ids_path: .npy of map from token store ids to dictionary ids, see backtest_LDA
+    catalog_path: filing catalog of backtest_LDA_multicore, see setup_catalog_worker
+    """
+    state = setup_catalog_worker(catalog_path)
+    state['lda_model'] = gensim.models.LdaModel.load(f'{model_path}/topic_model.model', mmap='r')
+    # a Dictionary is pickled dicts, it has no arrays to memory-map
+    state['dictionary'] = Dictionary.load(f'{model_path}/dictionary.dict')
+    state['dictionary_ids'] = np.load(dictionary_ids_path, mmap_mode='r') if dictionary_ids_path is not None else None
+    return state
+
+
+def tokenize_to_ids(text):
+    """
+    tokenize text to ids of a vocabulary local to this process; terms first seen since last call are returned with
+    them, so the parent maps local ids to its own vocabulary without receiving every token as a string
+    returns:
+        tuple (pid, first local id of new terms, new terms, np.ndarray of local ids)
+    """
+    # vocabulary local to this process
+    term_ids = worker.setdefault('term_ids', dict())
+    first_new_id = len(term_ids)
+    new_terms = list()
+    ids = array('I')
+    for term in tokenizer.tokenize(text):
+        if term not in term_ids:
+            term_ids[term] = len(term_ids)
+            new_terms.append(term)
+        ids.append(term_ids[term])
+    return os.getpid(), first_new_id, new_terms, np.frombuffer(ids, dtype=np.uint32)
+
+
+class LowCorpus(object):
+    """
+    documents tokenized by my_LDA.text_to_low in streaming mode, one document per line of tokens separated by " ",
+    read from disk on every iteration
+    num_docs: number of documents, if known when the file was written; counted from the file otherwise
+    """
+    def __init__(self, path, num_docs=None):
+        self.path = path
+        self.num_docs = num_docs
+
+    def __iter__(self):
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                yield line.split()
+
+    def __len__(self):
+        if self.num_docs is None:
+            with open(self.path, encoding='utf-8') as f:
+                self.num_docs = sum(1 for _ in f)
+        return self.num_docs
+
+    def __bool__(self):
+        # without reading the file
+        return os.path.getsize(self.path) > 0
+
+
+class IdCorpus(object):
+    """
+    documents as token ids of a shared vocabulary, every document a slice of a single uint32 buffer:
+    document i is buffer[offsets[i]:offsets[i + 1]]; about 4 bytes a token instead of a python str in a list
+    """
     def __init__(self):
+        self.vocab = list()
+        self.term_ids = dict()
+        self.buffer = array('I')
+        self.offsets = array('Q', [0])
+        # {pid: np.ndarray}; maps ids local to a pool process to ids of vocab
+        self.local_ids = dict()
+
+    def term_id(self, term):
+        if term not in self.term_ids:
+            self.term_ids[term] = len(self.vocab)
+            self.vocab.append(term)
+        return self.term_ids[term]
+
+    def add_local(self, pid, first_new_id, new_terms, ids):
+        """
+        map a result of tokenize_to_ids to ids of vocab
+        returns:
+            np.ndarray of ids
+        """
+        local_ids = self.local_ids.get(pid, np.zeros(0, dtype=np.uint32))
+        if new_terms:
+            # results of a process arrive in the order the process produced them
+            if len(local_ids) != first_new_id:
+                raise RuntimeError(f"terms of process {pid} received out of order")
+            local_ids = np.concatenate([local_ids, np.array([self.term_id(term) for term in new_terms],
+                                                            dtype=np.uint32)])
+            self.local_ids[pid] = local_ids
+        return local_ids[ids]
+
+    def append(self, ids):
+        self.buffer.extend(array('I', ids.tobytes()) if isinstance(ids, np.ndarray) else ids)
+        self.offsets.append(len(self.buffer))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def iter_ids(self):
+        buffer = np.frombuffer(self.buffer, dtype=np.uint32)
+        for i in range(len(self)):
+            yield buffer[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self):
+        # documents as lists of terms, like low_corpus of lists
+        vocab = self.vocab
+        for ids in self.iter_ids():
+            yield [vocab[term_id] for term_id in ids.tolist()]
+
+    def dictionary(self):
+        """
+        gensim Dictionary of the corpus, counted from ids (same as Dictionary(documents as lists of terms))
+        """
+        dfs = np.zeros(len(self.vocab), dtype=np.int64)
+        cfs = np.zeros(len(self.vocab), dtype=np.int64)
+        num_nnz = 0
+        for ids in self.iter_ids():
+            doc_ids, counts = np.unique(ids, return_counts=True)
+            dfs[doc_ids] += 1
+            cfs[doc_ids] += counts
+            num_nnz += len(doc_ids)
+        dictionary = Dictionary()
+        dictionary.token2id = dict(self.term_ids)
+        dictionary.id2token = dict(enumerate(self.vocab))
+        dictionary.dfs = dict(enumerate(dfs.tolist()))
+        dictionary.cfs = dict(enumerate(cfs.tolist()))
+        dictionary.num_docs = len(self)
+        dictionary.num_pos = len(self.buffer)
+        dictionary.num_nnz = num_nnz
+        return dictionary
+
+    def dictionary_ids(self, dictionary):
+        """
+        map from ids of vocab to ids of dictionary (e.g. after filter_extremes), -1 for terms not in dictionary
+        """
+        return np.array([dictionary.token2id.get(term, -1) for term in self.vocab], dtype=np.int64)
+
+
+class my_LDA(object):
+    def __init__(self, corpus_path=None, batch_size=10000, compact=False):
+        """
+        corpus_path: directory; if given (and not compact), runs in streaming mode: tokenized documents are written to
+            {corpus_path}/low_corpus.txt and bag of words to {corpus_path}/corpus.mm as they are produced, and both are
+            read back from disk, so memory doesn't grow with the corpus
+        batch_size: number of texts tokenized at a time in streaming and compact mode
+        compact: if set, low_corpus is an IdCorpus, workers return token ids instead of lists of str, and dictionary
+            and bag of words are counted from ids; bag of words is serialized one document at a time to
+            {corpus_path}/corpus.mm (data/LDA/my_LDA/corpus.mm if corpus_path is None) and read back from disk
+        """
         self.low_corpus = list()
         self.bow_corpus = list()
         self.dictionary = None
+        self.corpus_path = corpus_path
+        self.batch_size = batch_size
+        self.compact = compact
+        if corpus_path is not None:
+            os.makedirs(corpus_path, exist_ok=True)
 
     @classmethod
     def tokenize_text(cls, text):
-        text = unicodedata.normalize("NFKD", text).replace("\n", " ").replace("\t", "").replace("  ", " ")
-        # tokenize text as English
-        text_tokenized = word_tokenize(text, language='English')
-        # convert to lowercases and remove puncutation
-        text_tokenized = [word.lower() for word in text_tokenized if word.isalpha()]
-        # lemmatize token
-        text_tokenized = [wordlemmatizer.lemmatize(word) for word in text_tokenized if
-                          word not in stopwords.words('english')]
-        return text_tokenized
+        return tokenizer.tokenize(text)
 
     def callback(self, text_tokenized):
         if len(text_tokenized) > 10:
@@ -55,12 +208,57 @@ class my_LDA(object):
             text: list of string
         """
         logging.info('running text_to_low')
+        if self.compact:
+            self.compact_text_to_low(texts)
+            return
+        if self.corpus_path is not None:
+            self.stream_text_to_low(texts)
+            return
         pool = multiprocessing.Pool(os.cpu_count())
         for text in texts:
             pool.apply_async(self.tokenize_text, args=(text,), callback=self.callback)
         pool.close()
         pool.join()
 
+    def compact_text_to_low(self, texts):
+        """
+        text_to_low in compact mode, see IdCorpus
+        """
+        texts = iter(texts)
+        self.low_corpus = IdCorpus()
+        with multiprocessing.Pool(os.cpu_count()) as pool:
+            while True:
+                batch = list(itertools.islice(texts, self.batch_size))
+                if not batch:
+                    break
+                for pid, first_new_id, new_terms, ids in pool.imap_unordered(tokenize_to_ids, batch, chunksize=64):
+                    # local ids are mapped even if the document is dropped, new terms may be first seen in it
+                    ids = self.low_corpus.add_local(pid, first_new_id, new_terms, ids)
+                    if len(ids) > 10:
+                        self.low_corpus.append(ids)
+        logging.info(f'{len(self.low_corpus)} documents, {len(self.low_corpus.buffer)} tokens, '
+                     f'{len(self.low_corpus.vocab)} terms')
+
+    def stream_text_to_low(self, texts):
+        """
+        text_to_low in streaming mode, texts may be any iterable (e.g. a generator over SEC_scraping.iter_filings);
+        at most batch_size texts are held in memory
+        """
+        texts = iter(texts)
+        num_documents = 0
+        with multiprocessing.Pool(os.cpu_count()) as pool, \
+                open(f"{self.corpus_path}/low_corpus.txt", 'w', encoding='utf-8') as f:
+            while True:
+                batch = list(itertools.islice(texts, self.batch_size))
+                if not batch:
+                    break
+                for text_tokenized in pool.imap(self.tokenize_text, batch, chunksize=64):
+                    if len(text_tokenized) > 10:
+                        f.write(" ".join(text_tokenized) + "\n")
+                        num_documents += 1
+        logging.info(f'{num_documents} documents written to {self.corpus_path}/low_corpus.txt')
+        self.low_corpus = LowCorpus(f"{self.corpus_path}/low_corpus.txt", num_documents)
+
     def low_to_bow(self):
         """
         list of words to bag of words
@@ -68,8 +266,24 @@ class my_LDA(object):
         logging.info('running low_to_bow')
         if not self.low_corpus:
             raise ValueError("Run text_to_low First")
+        if isinstance(self.low_corpus, IdCorpus):
+            self.dictionary = self.low_corpus.dictionary()
+            self.dictionary.filter_extremes(no_below=15, no_above=0.9)
+            dictionary_ids = self.low_corpus.dictionary_ids(self.dictionary)
+            corpus_path = self.corpus_path if self.corpus_path is not None else "data/LDA/my_LDA"
+            os.makedirs(corpus_path, exist_ok=True)
+            corpora.MmCorpus.serialize(f"{corpus_path}/corpus.mm",
+                                       (TokenStore.doc2bow(ids, dictionary_ids) for ids in self.low_corpus.iter_ids()))
+            self.bow_corpus = corpora.MmCorpus(f"{corpus_path}/corpus.mm")
+            return
         self.dictionary = Dictionary(self.low_corpus)
         self.dictionary.filter_extremes(no_below=15, no_above=0.9)
+        if isinstance(self.low_corpus, LowCorpus):
+            # bag of words serialized one document at a time, LdaMulticore streams it from disk
+            corpora.MmCorpus.serialize(f"{self.corpus_path}/corpus.mm",
+                                       (self.dictionary.doc2bow(doc) for doc in self.low_corpus))
+            self.bow_corpus = corpora.MmCorpus(f"{self.corpus_path}/corpus.mm")
+            return
         self.bow_corpus = [self.dictionary.doc2bow(doc) for doc in self.low_corpus]
 
     def run_lda(self):
@@ -82,77 +296,368 @@ class my_LDA(object):
                                         workers=os.cpu_count())
         lda_model.save("data/LDA/my_LDA/topic_model.model")
         self.dictionary.save("data/LDA/my_LDA/dictionary.dict")
-        corpora.MmCorpus.serialize("data/LDA/my_LDA/corpus.mm", self.bow_corpus)
+        # in streaming and compact mode, bag of words is already serialized by low_to_bow
+        if not isinstance(self.bow_corpus, corpora.MmCorpus):
+            corpora.MmCorpus.serialize("data/LDA/my_LDA/corpus.mm", self.bow_corpus)
+
+
+def model_version(model_path):
+    """
+    version of the model saved in model_path, a hash of topic_model.model and its separately saved arrays
+    """
+    sha1 = hashlib.sha1()
+    for file_path in sorted(Path(model_path).glob("topic_model.model*")):
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(block)
+    return sha1.hexdigest()[:16]
+
+
+class TopicCache(object):
+    """
+    topic distribution of every page of filings scored by a model, so LDA signals with any threshold, topic or rule
+    are computed from a matrix instead of reading, tokenizing and inferring filings again
+        {cache_path}/{model version}/topics.npy: float32 pages x topics
+        {cache_path}/{model version}/keys.csv: (accession, document, page, cik, filing_date) of every row of topics
+        {cache_path}/{model version}/filings.csv: (accession, cik, filing_date) of every filing scored, including
+            filings without a page long enough to have a row
+    cache_path: directory of the cache
+    model_path: directory of the model, see model_version
+    """
+    KEY_COLUMNS = ['accession', 'document', 'page', 'cik', 'filing_date']
+    FILING_COLUMNS = ['accession', 'cik', 'filing_date']
+
+    def __init__(self, cache_path, model_path):
+        self.path = f"{cache_path}/{model_version(model_path)}"
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.exists(f"{self.path}/topics.npy"):
+            self.topics = np.load(f"{self.path}/topics.npy")
+            self.keys = pd.read_csv(f"{self.path}/keys.csv", dtype={'accession': str, 'document': str, 'page': str,
+                                                                    'cik': int, 'filing_date': str})
+        else:
+            self.topics = None
+            self.keys = pd.DataFrame(columns=self.KEY_COLUMNS)
+        if os.path.exists(f"{self.path}/filings.csv"):
+            self.filings = pd.read_csv(f"{self.path}/filings.csv", dtype={'accession': str, 'cik': int,
+                                                                          'filing_date': str})
+        else:
+            self.filings = pd.DataFrame(columns=self.FILING_COLUMNS)
+        self.new_keys = list()
+        self.new_topics = list()
+        self.new_filings = list()
+
+    def scored_dates(self):
+        """
+        (cik, filing_date) of filings already scored
+        """
+        return set(zip(self.filings['cik'], self.filings['filing_date']))
+
+    def add(self, keys, topics, filings):
+        """
+        keys: list of (accession, document, page, cik, filing_date), one per row of topics
+        filings: list of (accession, cik, filing_date) of every filing scored, with or without rows
+        """
+        self.new_keys.extend(keys)
+        self.new_topics.append(topics)
+        self.new_filings.extend(filings)
+
+    def save(self):
+        if not self.new_filings:
+            return
+        topics = [self.topics] if self.topics is not None else list()
+        topics = np.concatenate(topics + self.new_topics).astype(np.float32)
+        keys = pd.concat([self.keys, pd.DataFrame(self.new_keys, columns=self.KEY_COLUMNS)], ignore_index=True)
+        # a page scored twice keeps its first row
+        unique = ~keys.duplicated(['accession', 'document', 'page']).values
+        self.topics = topics[unique]
+        self.keys = keys[unique].reset_index(drop=True)
+        self.filings = pd.concat([self.filings, pd.DataFrame(self.new_filings, columns=self.FILING_COLUMNS)],
+                                 ignore_index=True).drop_duplicates('accession', ignore_index=True)
+        self.new_keys, self.new_topics, self.new_filings = list(), list(), list()
+        np.save(f"{self.path}/topics.npy", self.topics)
+        self.keys.to_csv(f"{self.path}/keys.csv", index=False)
+        self.filings.to_csv(f"{self.path}/filings.csv", index=False)
+
+    def signals(self, BUY_SIGNAL, threshold=0.75, topic=None, rule='any'):
+        """
+        filings on signal dates significant by topic model, computed on the matrix
+        threshold: probability of topic a page has to exceed
+        topic: index of topic, the most probable topic of each page if None
+        rule: how pages make a filing significant
+            'any': any page exceeds threshold (as backtest_LDA)
+            'majority': more than half of pages exceed threshold
+            'mean': mean probability over pages exceeds threshold
+        returns:
+            dict; {cik: [filing_date]}
+        """
+        if self.topics is None or not len(self.keys):
+            return dict()
+        scores = self.topics.max(axis=1) if topic is None else self.topics[:, topic]
+        # rows of filings on signal dates
+        selected = set((int(cik), date) for cik in BUY_SIGNAL for date in BUY_SIGNAL[cik])
+        rows = np.fromiter(((cik, date) in selected for cik, date in zip(self.keys['cik'], self.keys['filing_date'])),
+                           dtype=bool, count=len(self.keys))
+        filings, codes = np.unique(self.keys['accession'].values[rows], return_inverse=True)
+        scores = scores[rows]
+        num_pages = np.bincount(codes, minlength=len(filings))
+        if rule == 'any':
+            significant = np.bincount(codes, weights=scores > threshold, minlength=len(filings)) > 0
+        elif rule == 'majority':
+            significant = np.bincount(codes, weights=scores > threshold, minlength=len(filings)) > num_pages / 2
+        elif rule == 'mean':
+            significant = np.bincount(codes, weights=scores, minlength=len(filings)) / num_pages > threshold
+        else:
+            raise ValueError(f"unknown rule {rule}")
+        filing_keys = self.keys[rows].drop_duplicates('accession').set_index('accession').loc[filings[significant]]
+        signal_dict = dict()
+        for cik, date in zip(filing_keys['cik'], filing_keys['filing_date']):
+            signal_dict.setdefault(cik, list()).append(date)
+        return signal_dict
 
 
 class backtest_LDA_multicore(object):
-    def __init__(self, filing_file_path, backtest_LDA_path, sector_name):
+    def __init__(self, filing_file_path, backtest_LDA_path, sector_name, catalog_path=None, token_store_path=None):
         self.LDA_signal_dict = dict()
         self.backtest_LDA_path = backtest_LDA_path
         self.sector_name = sector_name
         self.filing_file_path = filing_file_path
+        # if given, filings on signal dates are looked up in filing_catalog.FilingCatalog and read on their own,
+        # instead of parsing a cik's whole json file
+        self.catalog_path = catalog_path
+        # if given, token ids of pages are read from token_store.TokenStore (built with my_LDA's tokenizer) instead of
+        # tokenizing their text
+        self.token_store = TokenStore(token_store_path, tokenizer) if token_store_path is not None else None
+
+    def __getstate__(self):
+        # sent with every task: results stay in the parent, token store is opened again by every process
+        state = self.__dict__.copy()
+        state['LDA_signal_dict'] = dict()
+        if self.token_store is not None:
+            state['token_store'] = None
+            state['token_store_path'] = self.token_store.STORE_PATH
+        return state
+
+    def filing_token_store(self):
+        if self.token_store is None and getattr(self, 'token_store_path', None) is not None:
+            # unpickled in a pool process
+            # {token_store_path: TokenStore} opened by this process
+            token_stores = worker.setdefault('token_stores', dict())
+            if self.token_store_path not in token_stores:
+                token_stores[self.token_store_path] = TokenStore(self.token_store_path, tokenizer)
+            return token_stores[self.token_store_path]
+        return self.token_store
 
     def callback(self, res):
         cik, signal_list = res
-        self.LDA_signal_dict[cik] = signal_list
+        # a cik with many signal dates is split into several tasks
+        self.LDA_signal_dict.setdefault(cik, list()).extend(signal_list)
 
-    def func_multicore(self, signal_dates, cik, lda_model, dictionary):
+    @staticmethod
+    def error_callback(e):
+        # signals of a failed task are missing from signal.csv
+        logging.error(f"backtest_LDA task failed: {e!r}")
+
+    def signal_filings(self, signal_dates, cik):
         """
-        apply LDA to selected filings of a cik
+        filings of a cik on signal dates, as tuple (accession number, filing)
         """
-        signal_list = list()
-        count = 0
-        count_LDA = 0
+        if self.catalog_path is not None:
+            # connection is opened once by every pool process, sqlite connections can't be pickled
+            if worker.get('catalog') is None:
+                worker.update(setup_catalog_worker(self.catalog_path))
+            return list(worker['catalog'].iter_filings_on(cik, signal_dates))
         # read master file that contains all filings for this cik
         with open(f"{self.filing_file_path}/8-K_{cik}_20200101.json") as f:
             filing_text = json.load(f)
+        # only read filing with a date match
+        return [(a_num, filing_text[a_num]) for a_num in filing_text
+                if filing_text[a_num]['file_info']['filing_date'] in signal_dates]
 
-        # iterate filing
-        for a_num in filing_text:
-            # only read filing with a date match
-            date = filing_text[a_num]['file_info']['filing_date']
-            if not (date in signal_dates):
+    def page_bows(self, a_num, filing, dictionary, dictionary_ids=None):
+        """
+        bag of words of every page of a filing with at least 50 tokens, as tuple (document, page, bow), produced lazily
+        so pages after a signal page aren't tokenized
+        """
+        # token ids of this filing's pages, if tokenized before
+        filing_tokens = self.filing_token_store()
+        page_ids = filing_tokens.filing_pages(a_num) if filing_tokens is not None else dict()
+        # iterate document (8_K_1, EXE_2 etc.) in filing
+        for document in filing['master_dict_filing']['filing_documents']:
+            document_dict = filing['master_dict_filing']['filing_documents'][document]
+            try:
+                normalized_text = document_dict['normalized_text']
+            except KeyError as e:
+                logging.error(e)
                 continue
-            else:
-                count += 1  # count # of signal filings for this cik
-                LDA_flag = False  # if set to true, then this filing is identified a signal by LDA
-                # iterate document (8_K_1, EXE_2 etc.) in filing
-                for document in filing_text[a_num]['master_dict_filing']['filing_documents']:
-                    document_dict = filing_text[a_num]['master_dict_filing']['filing_documents'][document]
-                    try:
-                        normalized_text = document_dict['normalized_text']
-                    except KeyError as e:
-                        logging.error(e)
+            # iterate each page in a document
+            for page in normalized_text:
+                if (document, page) in page_ids:
+                    ids = page_ids[(document, page)]
+                    if len(ids) < 50:
+                        continue
+                    yield document, page, TokenStore.doc2bow(ids, dictionary_ids)
+                else:
+                    low_corpus = my_LDA.tokenize_text(normalized_text[page])
+                    if len(low_corpus) < 50:
                         continue
-                    # iterate each page in a document
-                    for page in normalized_text:
-                        text = normalized_text[page]
-                        low_corpus = my_LDA.tokenize_text(text)
-                        if len(low_corpus) < 50:
-                            continue
-                        for index, score in sorted(lda_model[dictionary.doc2bow(low_corpus)],
-                                                   key=lambda topic: -1 * topic[1]):
-                            if score > 0.75:
-                                # topic model significant
-                                LDA_flag = True
-                            break  # check topic with highest probability
-                        # break # check 1 page (in a document)
-                    # break # check 1 document (in a filing)
-                if LDA_flag:
-                    count_LDA += 1
-                    signal_list.append(date)
-
-        logging.info(f"\t{cik}: {np.round(count_LDA / count * 100, 2)}%")
+                    yield document, page, dictionary.doc2bow(low_corpus)
+
+    @staticmethod
+    def has_topic_page(bows, lda_model, threshold=0.75, batch_size=32):
+        """
+        if the most probable topic of any page is more probable than threshold
+        pages are inferred batch_size at a time by a single call of lda_model.inference, stops at the first batch
+        with such a page
+        """
+        bows = iter(bows)
+        while True:
+            batch = list(itertools.islice(bows, batch_size))
+            if not batch:
+                return False
+            gamma, _ = lda_model.inference(batch)
+            # normalized gamma is the topic distribution of a page, as in lda_model[bow]
+            if (gamma.max(axis=1) / gamma.sum(axis=1) > threshold).any():
+                return True
+
+    def func_multicore(self, signal_dates, cik, lda_model=None, dictionary=None, dictionary_ids=None):
+        """
+        apply LDA to selected filings of a cik
+        lda_model, dictionary, dictionary_ids: the ones loaded by setup_lda_worker if None
+        dictionary_ids: map from token store ids to dictionary ids (see TokenStore.dictionary_ids)
+        """
+        if lda_model is None:
+            lda_model, dictionary, dictionary_ids = worker['lda_model'], worker['dictionary'], worker['dictionary_ids']
+        signal_list = list()
+        count = 0
+        count_LDA = 0
+
+        # iterate filing
+        for a_num, filing in self.signal_filings(signal_dates, cik):
+            date = filing['file_info']['filing_date']
+            count += 1  # count # of signal filings for this cik
+            # topic model significant on any page
+            bows = (bow for _, _, bow in self.page_bows(a_num, filing, dictionary, dictionary_ids))
+            if self.has_topic_page(bows, lda_model):
+                count_LDA += 1
+                signal_list.append(date)
+
+        if count:
+            logging.info(f"\t{cik}: {np.round(count_LDA / count * 100, 2)}%")
+        else:
+            logging.info(f"\t{cik}: no filing on {len(signal_dates)} signal date(s)")
         return cik, signal_list
 
-    def backtest_LDA(self, BUY_SIGNAL, lda_model, dictionary):
+    def signal_tasks(self, BUY_SIGNAL, processes):
+        """
+        tasks of (cik, signal dates), largest first
+        cost of a cik is its number of distinct signal dates (signal.csv repeats a date for every filing on it); with a
+        catalog, ciks with many dates are split into subtasks of ranges of dates, so a big cik doesn't start last and
+        keep a single process busy at the end. without one, every subtask would parse the cik's whole json file again,
+        so ciks are not split
+        """
+        # a date in two subtasks would have its filings scored twice
+        BUY_SIGNAL = {cik: sorted(set(BUY_SIGNAL[cik])) for cik in BUY_SIGNAL}
+        target = scheduling.target_cost(sum(len(BUY_SIGNAL[cik]) for cik in BUY_SIGNAL), processes)
+        tasks = list()
+        for cik, signal_dates in BUY_SIGNAL.items():
+            parts = scheduling.num_parts(len(signal_dates), target) if self.catalog_path is not None else 1
+            for start, stop in scheduling.split_range(len(signal_dates), parts):
+                tasks.append((cik, signal_dates[start:stop]))
+        return sorted(tasks, key=lambda task: -len(task[1]))
+
+    def model_pool(self, processes, model_path, dictionary_ids=None):
+        """
+        pool whose processes load the model of model_path once, see setup_lda_worker
+        dictionary_ids: map from token store ids to dictionary ids, saved next to the model for processes to map
+        """
+        dictionary_ids_path = None
+        if dictionary_ids is not None:
+            dictionary_ids_path = f"{model_path}/dictionary_ids.npy"
+            np.save(dictionary_ids_path, dictionary_ids)
+        return worker_pool(setup_lda_worker, (model_path, dictionary_ids_path, self.catalog_path), processes)
+
+    def page_topics_multicore(self, signal_dates, cik):
+        """
+        topic distribution of every page (with at least 50 tokens) of selected filings of a cik, for TopicCache
+        returns:
+            tuple (list of (accession, document, page, cik, filing_date), np.ndarray float32 of pages x topics,
+            list of (accession, cik, filing_date) of filings scored)
+        """
+        keys = list()
+        bows = list()
+        filings = list()
+        for a_num, filing in self.signal_filings(signal_dates, cik):
+            date = filing['file_info']['filing_date']
+            filings.append((a_num, int(cik), date))
+            for document, page, bow in self.page_bows(a_num, filing, worker['dictionary'], worker['dictionary_ids']):
+                keys.append((a_num, document, str(page), int(cik), date))
+                bows.append(bow)
+        topics = np.zeros((0, worker['lda_model'].num_topics), dtype=np.float32)
+        if bows:
+            gamma, _ = worker['lda_model'].inference(bows)
+            topics = (gamma / gamma.sum(axis=1, keepdims=True)).astype(np.float32)
+        return keys, topics, filings
+
+    def build_topic_cache(self, BUY_SIGNAL, model_path, cache):
+        """
+        add topic distributions of pages of filings on signal dates, not in cache yet, to cache
+        cache: TopicCache of the model of model_path
+        """
+        cached = cache.scored_dates()
+        BUY_SIGNAL = {cik: [date for date in BUY_SIGNAL[cik] if (int(cik), date) not in cached]
+                      for cik in BUY_SIGNAL}
+        BUY_SIGNAL = {cik: dates for cik, dates in BUY_SIGNAL.items() if dates}
+        if not BUY_SIGNAL:
+            # every filing scored already, no need to load the model
+            return
+        dictionary_ids = None
+        if self.token_store is not None:
+            dictionary_ids = self.token_store.dictionary_ids(Dictionary.load(f'{model_path}/dictionary.dict'))
+        processes = os.cpu_count() - 1
+        pool = self.model_pool(processes, model_path, dictionary_ids)
+        try:
+            for cik, signal_dates in self.signal_tasks(BUY_SIGNAL, processes):
+                pool.apply_async(self.page_topics_multicore, args=(signal_dates, cik),
+                                 callback=lambda res: cache.add(*res), error_callback=self.error_callback)
+            pool.close()
+            pool.join()
+        finally:
+            # whatever completed is kept; filings of failed tasks aren't in cache and are scored on the next run
+            pool.terminate()
+            cache.save()
+
+    def backtest_LDA_cached(self, BUY_SIGNAL, cache, threshold=0.75, topic=None, rule='any'):
+        """
+        backtest_LDA from topic distributions in cache (see TopicCache.signals), without reading or tokenizing filings
+        """
+        self.LDA_signal_dict = cache.signals(BUY_SIGNAL, threshold, topic, rule)
+        df = pd.DataFrame.from_dict(self.LDA_signal_dict, orient='index').T
+        if not df.empty:
+            df.to_csv(f"{self.backtest_LDA_path}/{self.sector_name}/signal.csv", index=False)
+
+    def backtest_LDA(self, BUY_SIGNAL, lda_model=None, dictionary=None, model_path=None):
         """
         apply LDA on filings
+        model_path: directory of topic_model.model and dictionary.dict; if given, every process loads them once, the
+            model memory-mapped (see setup_lda_worker), instead of lda_model and dictionary being pickled with every
+            task
         """
-        pool = multiprocessing.Pool(os.cpu_count()-1)
-        for cik in BUY_SIGNAL:
-            pool.apply_async(self.func_multicore, args=(BUY_SIGNAL[cik], cik, lda_model, dictionary),
-                             callback=self.callback)
+        if model_path is None and (lda_model is None or dictionary is None):
+            raise ValueError("either model_path, or both lda_model and dictionary, must be given")
+        if self.token_store is not None and dictionary is None:
+            dictionary = Dictionary.load(f'{model_path}/dictionary.dict')
+        dictionary_ids = self.token_store.dictionary_ids(dictionary) if self.token_store is not None else None
+        processes = os.cpu_count() - 1
+        tasks = self.signal_tasks(BUY_SIGNAL, processes)
+        if model_path is not None:
+            pool = self.model_pool(processes, model_path, dictionary_ids)
+            # model is in every process already
+            lda_model, dictionary, dictionary_ids = None, None, None
+        else:
+            pool = worker_pool(setup_catalog_worker, (self.catalog_path,), processes)
+        for cik, signal_dates in tasks:
+            pool.apply_async(self.func_multicore, args=(signal_dates, cik, lda_model, dictionary, dictionary_ids),
+                             callback=self.callback, error_callback=self.error_callback)
         pool.close()
         pool.join()
 
@@ -162,11 +667,14 @@ class backtest_LDA_multicore(object):
 
 
 if __name__ == "__main__":
+    logging.basicConfig(filename=f"../logs/LDA/logs.txt",
+                        filemode='a',
+                        level=logging.INFO,
+                        format='%(levelname)s: %(asctime)s - %(message)s',
+                        datefmt='%m/%d/%Y %I:%M:%S')
     # load fitted lda model from local
+    # processes of backtest_LDA load it themselves, memory-mapped
     path = "../data/LDA/lda_model"
-    lda_model = gensim.models.LdaModel.load(f'{path}/topic_model.model')
-    dictionary = gensim.corpora.Dictionary.load(f'{path}/dictionary.dict')
-    bow_corpus = gensim.corpora.MmCorpus(f'{path}/corpus.mm')
 
     # generate pair of NAICS sector code and name, needed as index to iterate filings
     with open("../data/industry_classification_and_portfolio/NACIS_sectors.json", "r") as f:
@@ -180,6 +688,16 @@ if __name__ == "__main__":
     # file paths
     filing_file_path = "/Users/codywan/Data/SEC Edgar Scraping/8-K"
     backtest_LDA_path = "/backtests/LDA"
+    # filing_catalog.FilingCatalog of filing_file_path, if built (see FilingCatalog.backfill)
+    catalog_path = None
+    # token_store.TokenStore of filings tokenized by my_LDA.tokenize_text, if built, i.e.
+    # TokenStore(token_store_path, tokenizer).add_filings(SEC_scraping.iter_filing_pages(...))
+    token_store_path = None
+    # directory of TopicCache; if set, topic distributions of pages are computed once per model and signals of
+    # THRESHOLD, TOPIC (most probable topic if None) and RULE ('any', 'majority', 'mean') are read from it
+    topic_cache_path = None
+    THRESHOLD, TOPIC, RULE = 0.75, None, 'any'
+    topic_cache = TopicCache(topic_cache_path, path) if topic_cache_path is not None else None
     for sector_name in NACIS_sector_name:
         file_path = f"{repository_path}/{sector_name}/signal.csv"
         if not Path(file_path).is_file():
@@ -197,6 +715,13 @@ if __name__ == "__main__":
 
         ba_lda = backtest_LDA_multicore(filing_file_path=filing_file_path,
                                         backtest_LDA_path=backtest_LDA_path,
-                                        sector_name=sector_name)
-        ba_lda.backtest_LDA(BUY_SIGNAL=BUY_SIGNAL, lda_model=lda_model, dictionary=dictionary)
+                                        sector_name=sector_name,
+                                        catalog_path=catalog_path,
+                                        token_store_path=token_store_path)
+        if topic_cache is not None:
+            ba_lda.build_topic_cache(BUY_SIGNAL=BUY_SIGNAL, model_path=path, cache=topic_cache)
+            ba_lda.backtest_LDA_cached(BUY_SIGNAL=BUY_SIGNAL, cache=topic_cache, threshold=THRESHOLD, topic=TOPIC,
+                                       rule=RULE)
+        else:
+            ba_lda.backtest_LDA(BUY_SIGNAL=BUY_SIGNAL, model_path=path)
         # break # check 1 sector
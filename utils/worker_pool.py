@@ -0,0 +1,57 @@
+import os
+import logging
+import multiprocessing
+
+# state of a pool process (tokenizer, matcher, model, ...), set up once by init_worker and read by every task the
+# process runs, e.g. worker['tokenizer']; also holds whatever a process opens lazily (e.g. worker['token_stores'])
+worker = dict()
+
+
+def init_worker(setup, *args):
+    """
+        pool initializer: keep setup(*args), a dict, as state of the process, so it is built once per process instead
+        of being sent with every task
+        args:
+            setup: module-level function returning the state; dict to pass state as it is
+    """
+    worker.clear()
+    worker.update(setup(*args))
+
+
+def worker_pool(setup=dict, args: tuple = (), processes: int = None):
+    """
+        multiprocessing.Pool whose processes are set up by setup(*args), see init_worker
+        args:
+            processes: int; number of processes, defaults to os.cpu_count()
+    """
+    return multiprocessing.Pool(processes or os.cpu_count(), initializer=init_worker, initargs=(setup,) + tuple(args))
+
+
+def ingest(filings, func, store, commit, setup=dict, args: tuple = (), stored: set = frozenset(),
+           processes: int = None, commit_every: int = 1000, chunksize: int = 16, target: str = "") -> int:
+    """
+        run func on every filing not stored yet in a worker_pool, storing results in the parent as they come, e.g.
+        to build an index or a token store
+        args:
+            filings: iterable of tuples whose second item is an accession number, e.g. SEC_scraping.iter_filings
+            func: module-level function of a filing, run by pool processes
+            store: function of a result of func, e.g. inserting its rows
+            commit: function making stored results durable, called every commit_every filings and at the end
+            setup, args: set up every pool process, see init_worker
+            stored: set; accession numbers of filings already stored, skipped
+            target: str; where filings are stored, for logging
+        returns:
+            int; number of filings stored
+    """
+    new_filings = (filing for filing in filings if filing[1] not in stored)
+    num_added = 0
+    with worker_pool(setup, args, processes) as pool:
+        for result in pool.imap_unordered(func, new_filings, chunksize=chunksize):
+            store(result)
+            num_added += 1
+            if num_added % commit_every == 0:
+                commit()
+                logging.info(f"stored {num_added} filing(s) into {target}")
+    commit()
+    logging.info(f"stored {num_added} new filing(s) into {target}")
+    return num_added